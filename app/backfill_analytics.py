@@ -0,0 +1,23 @@
+# Rebuild the submission analytics rollups from the raw submissions collection.
+# Run with: python backfill_analytics.py (preferably while no workers are running,
+# since verdicts recorded during the rebuild may be overwritten)
+import asyncio
+
+from core.db import database
+from database.mongodb import get_submissions_collection
+from services.analytics import get_submission_analytics, rebuild_rollups
+
+
+async def main():
+    database.connect()
+    try:
+        analytics = get_submission_analytics()
+        await analytics.create_indexes()
+        summary = await rebuild_rollups(get_submissions_collection(), analytics)
+        print(f"Rebuilt {summary['rollups']} rollups ({summary['distinct_user_entries']} distinct user entries)")
+    finally:
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,12 +1,180 @@
-from pydantic import BaseSettings
+import os
+from typing import Dict, List, Optional
+from pydantic import BaseSettings, Field, root_validator
 
 class Settings(BaseSettings):
-    DATABASE_URL: str
-    MONGO_URL: str
-    SECRET_KEY: str
+    # Async SQLAlchemy URL; the sync engine uses the matching sync driver (aiomysql -> pymysql).
+    # When unset, it is built from the MYSQL_* variables if MYSQL_HOST is given.
+    DATABASE_URL: str = "mysql+aiomysql://root@localhost:3306/coding_platform"
+    MYSQL_USER: Optional[str] = None
+    MYSQL_PASSWORD: Optional[str] = None
+    MYSQL_HOST: Optional[str] = None
+    MYSQL_PORT: str = "3306"
+    MYSQL_DATABASE: Optional[str] = None
+
+    # SQL connection pools, one per engine and uvicorn worker; see GET /admin/stats/db
+    DB_POOL_SIZE: int = 10
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 10.0  # seconds to wait for a free connection
+    DB_POOL_RECYCLE: int = 1800  # seconds; below MySQL's wait_timeout
+    DB_POOL_PRE_PING: bool = True
+    DB_CONNECT_TIMEOUT: int = 10
+    DB_ECHO: bool = False
+
+    MONGO_URL: str = Field("mongodb://localhost:27017", env=["MONGO_URL", "MONGO_URI"])
+    MONGO_DB_NAME: str = "code_platform"
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_SERVER_SELECTION_TIMEOUT: float = 5.0
+    SECRET_KEY: str = Field(..., env=["SECRET_KEY", "JWT_SECRET_KEY"])
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
 
+    # Password hashing: bcrypt cost, worker processes (default: one per core) and how many
+    # hash/verify operations may be queued or running before requests get a 429
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: Optional[int] = None
+    PASSWORD_HASH_MAX_PENDING: int = 64
+
+    # Admission control. Token buckets refill at RATE tokens/second up to BURST (rate 0 disables a rule).
+    # ADMISSION_BACKEND "memory" (one node) or "mongo" (shared by every API/worker process)
+    ADMISSION_BACKEND: str = "memory"
+    SUBMIT_RATE_PER_USER: float = 0.5
+    SUBMIT_BURST_PER_USER: float = 10
+    SUBMIT_RATE_PER_IP: float = 2.0
+    SUBMIT_BURST_PER_IP: float = 30
+    LOGIN_RATE_PER_IP: float = 1.0
+    LOGIN_BURST_PER_IP: float = 20
+    LOGIN_RATE_PER_ACCOUNT: float = 0.1
+    LOGIN_BURST_PER_ACCOUNT: float = 5
+    SUBMISSION_MAX_BACKLOG: int = 5000  # queued + running jobs before new submissions get 429
+    SUBMISSION_SHED_RETRY_AFTER: float = 5.0
+    SUBMISSION_BACKLOG_TTL: float = 3600.0  # a job lost with its process stops counting in the backlog after this long
+    EXECUTION_MAX_CONCURRENCY: int = 50  # executions running at once across all workers (0: unlimited)
+    EXECUTION_SLOT_LEASE_SECONDS: float = 300.0  # a crashed worker's slot is reclaimed after this long
+    TRUST_FORWARDED_FOR: bool = False  # use X-Forwarded-For for per-IP limits (behind a trusted proxy)
+
+    # Per-process caches of verified tokens (kept until their exp) and user rows
+    AUTH_TOKEN_CACHE_SIZE: int = 100000
+    AUTH_USER_CACHE_SIZE: int = 100000
+    AUTH_USER_CACHE_TTL: float = 60.0  # seconds another process may serve a changed user
+
+    # Leaderboard: penalty seconds per rejected attempt before a solve, and how often each
+    # process reads the solves recorded by other processes
+    LEADERBOARD_WRONG_ATTEMPT_PENALTY: float = 1200.0
+    LEADERBOARD_SYNC_INTERVAL: float = 1.0
+
+    # Code similarity: winnowing k-gram size (tokens) and window, the share of a challenge's submissions
+    # a fingerprint may appear in before it is ignored as boilerplate, and batch scan processes
+    SIMILARITY_K: int = 8
+    SIMILARITY_WINDOW: int = 4
+    SIMILARITY_COMMON_RATIO: float = 0.5
+    SIMILARITY_WORKERS: Optional[int] = None  # defaults to the number of CPU cores
+
+    # Prometheus metrics on GET /metrics (per process), and a log line with the time spent per
+    # stage for requests slower than SLOW_REQUEST_SECONDS (0: off)
+    METRICS_ENABLED: bool = True
+    SLOW_REQUEST_SECONDS: float = 0.0
+    WORKER_METRICS_PORT: int = 0  # worker.py serves its metrics on this port (0: off)
+
+    # Judge0 (RapidAPI)
+    JUDGE0_URL: str = "https://judge0-ce.p.rapidapi.com"
+    JUDGE0_API_KEY: Optional[str] = Field(None, env=["JUDGE0_API_KEY", "RAPIDAPI_KEY"])
+    JUDGE0_BATCH_SIZE: int = 20  # Judge0's default MAX_SUBMISSION_BATCH_SIZE
+    JUDGE0_MAX_IN_FLIGHT: int = 50  # programs executing on Judge0 at once, keeps us inside the RapidAPI quota
+    JUDGE0_MAX_CONNECTIONS: int = 20
+    JUDGE0_TIMEOUT: float = 10.0
+    JUDGE0_POLL_INITIAL: float = 0.05
+    JUDGE0_POLL_MAX: float = 2.0
+    JUDGE0_POLL_TIMEOUT: float = 60.0
+    JUDGE0_MAX_RETRIES: int = 3
+    # Judge0 PUTs each finished submission to JUDGE0_CALLBACK_URL (the public URL of
+    # /internal/judge0/callback) when it and JUDGE0_CALLBACK_SECRET are set; results without a
+    # callback after JUDGE0_CALLBACK_TIMEOUT seconds are polled for instead
+    JUDGE0_CALLBACK_URL: Optional[str] = None
+    JUDGE0_CALLBACK_SECRET: Optional[str] = None
+    JUDGE0_CALLBACK_TIMEOUT: float = 15.0
+
+    # Execution backend: "judge0" (RapidAPI) or "local" (rlimited subprocesses on this machine)
+    EXECUTOR_BACKEND: str = "judge0"
+    LOCAL_EXECUTOR_WORKERS: Optional[int] = None  # defaults to the number of CPU cores
+    LOCAL_EXECUTOR_TIME_LIMIT: float = 5.0  # seconds, used when the challenge sets none
+    LOCAL_EXECUTOR_MEMORY_LIMIT: int = 256  # MB, used when the challenge sets none
+    LOCAL_EXECUTOR_OUTPUT_LIMIT_KB: int = 16384
+    LOCAL_PYTHON_WARM_POOL: bool = True  # fork Python runs from a pre-booted interpreter per local worker
+    # Unprivileged account compilers and programs run as (the service then needs root, or CAP_SETUID,
+    # CAP_SETGID and CAP_CHOWN). Unset, they run as the service's own user and are NOT isolated from it.
+    LOCAL_EXECUTOR_USER: Optional[str] = None
+
+    # Memoized verdicts of graded submissions: in-memory LRU, optionally backed by Mongo
+    VERDICT_CACHE_SIZE: int = 10000
+    VERDICT_CACHE_MONGO: bool = False
+
+    # Challenge catalog cache: "local" version counter (one process) or "mongo" (shared by all workers)
+    CATALOG_CACHE_BACKEND: str = "local"
+    CATALOG_VERSION_CHECK_INTERVAL: float = 1.0  # seconds between reads of the shared version
+    CATALOG_CACHE_MAX_ENTRIES: int = 1000  # cached pages and challenge details
+
+    # S3 bucket holding hidden test cases. S3_BACKEND=local keeps objects under S3_LOCAL_ROOT instead of AWS
+    AWS_BUCKET_NAME: str = "your-s3-bucket"
+    S3_BACKEND: str = "aws"
+    S3_LOCAL_ROOT: str = "/tmp/coding-platform-s3"
+
+    # Bulk test case import: files uploaded at once, and multipart part size/concurrency per file
+    TEST_CASE_IMPORT_UPLOAD_WORKERS: int = 8
+    TEST_CASE_IMPORT_PART_SIZE: int = 8 * 1024 ** 2
+    TEST_CASE_IMPORT_PART_CONCURRENCY: int = 4
+
+    # On-disk LRU cache of hidden test case files downloaded from S3. The directory is kept private to the
+    # service's user (mode 0700), which keeps it from local-mode submissions only when they run as
+    # LOCAL_EXECUTOR_USER; Judge0 runs them on other machines.
+    HIDDEN_CASE_CACHE_DIR: str = os.path.join(os.path.expanduser("~"), ".cache", "coding-platform", "hidden-cases")
+    HIDDEN_CASE_CACHE_MAX_BYTES: int = 2 * 1024 ** 3
+    HIDDEN_CASE_REVALIDATE_SECONDS: float = 300.0  # re-check a cached file's ETag after this long
+    HIDDEN_CASE_PREFETCH_WORKERS: int = 8  # parallel downloads when a challenge's cases are first fetched
+
+    # Submission bodies (source, stdin, outputs) longer than SUBMISSION_INLINE_MAX_CHARS are stored once per
+    # content in the submission_blobs collection, compressed, and in S3 from SUBMISSION_BLOB_S3_MIN_BYTES
+    # (compressed); the submission keeps a reference and the first SUBMISSION_PREVIEW_CHARS characters
+    SUBMISSION_INLINE_MAX_CHARS: int = 256
+    SUBMISSION_BLOB_S3_MIN_BYTES: int = 1024 ** 2
+    SUBMISSION_PREVIEW_CHARS: int = 200
+
+    # Submission pipeline: "memory" runs an asyncio queue inside the API process,
+    # "kafka" publishes jobs to KAFKA_TOPIC for workers started with `python worker.py`
+    SUBMISSION_QUEUE_BACKEND: str = "memory"
+    SUBMISSION_QUEUE_MAXSIZE: int = 10000
+    SUBMISSION_WORKERS: int = 4
+    RUN_WORKERS_IN_APP: bool = True
+    KAFKA_BROKER_URL: str = "localhost:9092"
+    KAFKA_TOPIC: str = "code-submissions"
+    KAFKA_GROUP_ID: str = "submission-workers"
+
+    # Scheduling of the memory queue. Priority classes, highest first: "run" (custom stdin),
+    # "contest" or "practice" (graded submissions, as SUBMIT_PRIORITY_CLASS says) and "rejudge".
+    # Users take turns within a class. A class in SCHEDULER_SHARES runs on at most that share of
+    # the SUBMISSION_WORKERS; a class whose oldest job waited SCHEDULER_STARVATION_SECONDS goes
+    # ahead of the higher ones (0: strict priority)
+    SCHEDULER_PRIORITIES: List[str] = ["run", "contest", "practice", "rejudge"]
+    SCHEDULER_SHARES: Dict[str, float] = {"practice": 0.75, "rejudge": 0.25}
+    SCHEDULER_STARVATION_SECONDS: float = 30.0
+    SUBMIT_PRIORITY_CLASS: str = "contest"
+
+    # Events between processes (Judge0 callbacks, submission status pushed to clients): "memory"
+    # stays in this process, "kafka" fans out through KAFKA_EVENTS_TOPIC to every API and worker process
+    PUBSUB_BACKEND: str = "memory"
+    PUBSUB_SUBSCRIBER_BUFFER: int = 100  # messages queued per subscriber before new ones are dropped
+    KAFKA_EVENTS_TOPIC: str = "submission-events"
+    SSE_HEARTBEAT_SECONDS: float = 15.0
+
+    @root_validator(pre=True)
+    def database_url_from_mysql_vars(cls, values):
+        if not values.get("DATABASE_URL") and values.get("MYSQL_HOST"):
+            values["DATABASE_URL"] = "mysql+aiomysql://{}:{}@{}:{}/{}".format(
+                values.get("MYSQL_USER") or "root", values.get("MYSQL_PASSWORD") or "",
+                values["MYSQL_HOST"], values.get("MYSQL_PORT") or "3306", values.get("MYSQL_DATABASE") or ""
+            )
+        return values
+
     class Config:
         env_file = ".env"
 
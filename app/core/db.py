@@ -1,10 +1,166 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
-from sqlalchemy.orm import sessionmaker
+# The application's single connection layer: the SQLAlchemy engines (async for request
+# handlers, sync for code running in threads) and the Motor client. Nothing connects at
+# import time; the FastAPI lifespan (or worker.py) calls connect() on startup and
+# disconnect() on shutdown. Pool sizing comes from the DB_* / MONGO_* settings, and
+# pool_stats() reports checkout waits and saturation for sizing pools per uvicorn worker.
+# Every SQL query and Mongo command is timed into core.metrics.
+import threading
+import time
+from typing import Optional
+
 from motor.motor_asyncio import AsyncIOMotorClient
-from .config import settings
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+from core import metrics
+from core.config import settings
+
+# Async drivers and the sync driver used for the same database
+SYNC_DRIVERS = {"mysql+aiomysql": "mysql+pymysql", "mysql+asyncmy": "mysql+pymysql",
+                "postgresql+asyncpg": "postgresql+psycopg2", "sqlite+aiosqlite": "sqlite"}
+
+
+def sync_url(url: str) -> str:
+    parsed = make_url(url)
+    return parsed.set(drivername=SYNC_DRIVERS.get(parsed.drivername, parsed.drivername)).render_as_string(hide_password=False)
+
+
+class PoolMetrics:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def observe(self, seconds: float, timed_out: bool = False):
+        with self._lock:
+            if timed_out:
+                self.timeouts += 1
+            else:
+                self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+
+
+# Times how long each checkout waits for a free (or new) connection. Pools are recreated
+# with the same class on dispose, so the metrics live on a per-engine subclass.
+class InstrumentedPoolMixin:
+    metrics: PoolMetrics
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        self.metrics.observe(time.perf_counter() - start)
+        return connection
+
+
+def instrumented(pool_class):
+    return type(f"Instrumented{pool_class.__name__}", (InstrumentedPoolMixin, pool_class), {"metrics": PoolMetrics()})
+
+
+def _pool_stats(engine) -> dict:
+    pool = engine.pool
+    metrics = pool.metrics
+    capacity = settings.DB_POOL_SIZE + max(settings.DB_MAX_OVERFLOW, 0)
+    checked_out = pool.checkedout()
+    return {
+        "size": pool.size(),
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "checked_out": checked_out,
+        "overflow": max(pool.overflow(), 0),
+        "saturation": checked_out / capacity if capacity else 0.0,
+        "checkouts": metrics.checkouts,
+        "timeouts": metrics.timeouts,
+        "checkout_wait_seconds_avg": metrics.wait_seconds_total / metrics.checkouts if metrics.checkouts else 0.0,
+        "checkout_wait_seconds_max": metrics.wait_seconds_max,
+    }
+
+
+class Database:
+    def __init__(self):
+        self.engine = None
+        self.sync_engine = None
+        self.mongo_client: Optional[AsyncIOMotorClient] = None
+        self._async_sessions = None
+        self._sync_sessions = None
+
+    @property
+    def connected(self) -> bool:
+        return self.engine is not None
+
+    def _pool_options(self) -> dict:
+        return {
+            "pool_size": settings.DB_POOL_SIZE,
+            "max_overflow": settings.DB_MAX_OVERFLOW,
+            "pool_timeout": settings.DB_POOL_TIMEOUT,
+            "pool_recycle": settings.DB_POOL_RECYCLE,
+            "pool_pre_ping": settings.DB_POOL_PRE_PING,
+            "echo": settings.DB_ECHO,
+        }
+
+    def connect(self):
+        if self.connected:
+            return
+        connect_args = {"connect_timeout": settings.DB_CONNECT_TIMEOUT} if settings.DATABASE_URL.startswith("mysql") else {}
+        self.engine = create_async_engine(
+            settings.DATABASE_URL, poolclass=instrumented(AsyncAdaptedQueuePool),
+            connect_args=connect_args, **self._pool_options()
+        )
+        self.sync_engine = create_engine(
+            sync_url(settings.DATABASE_URL), poolclass=instrumented(QueuePool),
+            connect_args=connect_args, **self._pool_options()
+        )
+        metrics.instrument_engine(self.engine.sync_engine)
+        metrics.instrument_engine(self.sync_engine)
+        metrics.registry.gauge("db_pool_checked_out", "SQL connections in use (async engine)",
+                               lambda: self.engine.pool.checkedout() if self.connected else 0)
+        self._async_sessions = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self._sync_sessions = sessionmaker(bind=self.sync_engine, autocommit=False, autoflush=False)
+        self.mongo_client = AsyncIOMotorClient(
+            settings.MONGO_URL,
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            serverSelectionTimeoutMS=int(settings.MONGO_SERVER_SELECTION_TIMEOUT * 1000),
+            event_listeners=[metrics.MongoCommandListener()],
+        )
+
+    async def disconnect(self):
+        if self.engine is not None:
+            await self.engine.dispose()
+            self.sync_engine.dispose()
+            self.engine = self.sync_engine = None
+        if self.mongo_client is not None:
+            self.mongo_client.close()
+            self.mongo_client = None
+
+    def _require(self):
+        if not self.connected:
+            raise RuntimeError("Database is not connected; call database.connect() at startup")
+
+    def session(self) -> Session:
+        self._require()
+        return self._sync_sessions()
+
+    def async_session(self) -> AsyncSession:
+        self._require()
+        return self._async_sessions()
+
+    @property
+    def mongo(self):
+        self._require()
+        return self.mongo_client[settings.MONGO_DB_NAME]
+
+    def pool_stats(self) -> dict:
+        if not self.connected:
+            return {"connected": False}
+        return {"connected": True, "async": _pool_stats(self.engine.sync_engine), "sync": _pool_stats(self.sync_engine)}
 
-engine = create_async_engine(settings.DATABASE_URL, echo=True)
-SessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
 
-mongo_client = AsyncIOMotorClient(settings.MONGO_URL)
-mongo_db = mongo_client["submission_db"]
+database = Database()
@@ -0,0 +1,268 @@
+# In-process Prometheus metrics for the hot paths, rendered in the text exposition format
+# on GET /metrics. Every uvicorn worker (and worker.py) keeps its own; scrape each process.
+#
+# The middleware in main.py times requests per route template. Inside a request or a worker
+# job, a span is a timed stage: SQL queries and Mongo commands (hooks installed by core.db),
+# Judge0 calls and polling sleeps, S3 operations, thread pool waits. Spans feed the
+# app_span_seconds histogram and the breakdown of the current request, which the slow
+# request log (SLOW_REQUEST_SECONDS) prints.
+import asyncio
+import contextlib
+import contextvars
+import logging
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+from pymongo import monitoring
+from sqlalchemy import event
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple, **extra) -> str:
+    pairs = list(zip(names, values)) + list(extra.items())
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self._values: Dict[Tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *values, amount: float = 1):
+        with self._lock:
+            self._values[values] = self._values.get(values, 0) + amount
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} counter"
+        with self._lock:
+            series = sorted(self._values.items())
+        for values, value in series:
+            yield f"{self.name}{_format_labels(self.labels, values)} {_format_value(value)}"
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name, self.help, self.labels, self.buckets = name, help, labels, buckets
+        # Per label values: observations per bucket (the last one past every bound), sum
+        self._series: Dict[Tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *values):
+        with self._lock:
+            series = self._series.get(values)
+            if series is None:
+                series = self._series[values] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][bisect_left(self.buckets, value)] += 1
+            series[1] += value
+
+    def render(self) -> Iterator[str]:
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} histogram"
+        with self._lock:
+            series = sorted((values, (list(counts), total)) for values, (counts, total) in self._series.items())
+        for values, (counts, total) in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else _format_value(bound)
+                yield f"{self.name}_bucket{_format_labels(self.labels, values, le=le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, values)} {_format_value(total)}"
+            yield f"{self.name}_count{_format_labels(self.labels, values)} {cumulative}"
+
+
+# Read when scraped: `read` returns the current value
+class Gauge:
+    def __init__(self, name: str, help: str, read: Callable[[], float]):
+        self.name, self.help, self.read = name, help, read
+
+    def render(self) -> Iterator[str]:
+        try:
+            value = self.read()
+        except Exception:
+            logger.exception("Reading gauge %s failed", self.name)
+            return
+        yield f"# HELP {self.name} {self.help}"
+        yield f"# TYPE {self.name} gauge"
+        yield f"{self.name} {_format_value(value)}"
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+
+    def counter(self, name: str, help: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._metrics.setdefault(name, Counter(name, help, labels))
+
+    def histogram(self, name: str, help: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = LATENCY_BUCKETS) -> Histogram:
+        return self._metrics.setdefault(name, Histogram(name, help, labels, buckets))
+
+    # Registering a gauge again replaces it, so a restarted lifespan points it at the new objects
+    def gauge(self, name: str, help: str, read: Callable[[], float]) -> Gauge:
+        gauge = self._metrics[name] = Gauge(name, help, read)
+        return gauge
+
+    def render(self) -> str:
+        return "\n".join(line for metric in list(self._metrics.values()) for line in metric.render()) + "\n"
+
+
+registry = Registry()
+
+REQUEST_SECONDS = registry.histogram("http_request_duration_seconds", "HTTP request latency per route",
+                                     ("method", "route", "status"))
+REQUEST_QUERIES = registry.histogram("http_request_db_queries", "SQL queries run by one HTTP request",
+                                     ("method", "route"), COUNT_BUCKETS)
+SLOW_REQUESTS = registry.counter("http_slow_requests_total", "Requests slower than SLOW_REQUEST_SECONDS",
+                                 ("method", "route"))
+SPAN_SECONDS = registry.histogram("app_span_seconds", "Time spent per stage (SQL, Mongo, Judge0, S3, thread pool)",
+                                  ("span",))
+JOB_SECONDS = registry.histogram("submission_job_duration_seconds", "Evaluation time of a submission job",
+                                 ("mode", "status"))
+QUEUE_WAIT_SECONDS = registry.histogram("submission_queue_wait_seconds",
+                                        "Time from publishing a job to a worker taking it, per priority class",
+                                        ("priority",))
+
+
+# Time spent per stage within one request or job; spans in threads add to it too
+class Breakdown:
+    def __init__(self):
+        self.stages: Dict[str, list] = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage: str, seconds: float):
+        with self._lock:
+            entry = self.stages.setdefault(stage, [0, 0.0])
+            entry[0] += 1
+            entry[1] += seconds
+
+    def count(self, stage: str) -> int:
+        return self.stages.get(stage, (0, 0.0))[0]
+
+    def __str__(self) -> str:
+        with self._lock:
+            stages = sorted(self.stages.items(), key=lambda item: -item[1][1])
+        return " ".join(f"{stage}={count}x{seconds * 1000:.1f}ms" for stage, (count, seconds) in stages) or "-"
+
+
+_breakdown: contextvars.ContextVar[Optional[Breakdown]] = contextvars.ContextVar("metrics_breakdown", default=None)
+
+
+# Collect the spans of the enclosed request or job into a fresh Breakdown
+@contextlib.contextmanager
+def tracking() -> Iterator[Breakdown]:
+    breakdown = Breakdown()
+    token = _breakdown.set(breakdown)
+    try:
+        yield breakdown
+    finally:
+        _breakdown.reset(token)
+
+
+def record(stage: str, seconds: float):
+    SPAN_SECONDS.observe(seconds, stage)
+    breakdown = _breakdown.get()
+    if breakdown is not None:
+        breakdown.add(stage, seconds)
+
+
+# Time the enclosed block as one `stage`; usable in sync and async code
+@contextlib.contextmanager
+def span(stage: str):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - started)
+
+
+# asyncio.to_thread that also records how long the call waited for a free thread
+async def to_thread(stage: str, fn, *args, **kwargs):
+    submitted = time.perf_counter()
+
+    def run():
+        record("threadpool.wait", time.perf_counter() - submitted)
+        with span(stage):
+            return fn(*args, **kwargs)
+
+    return await asyncio.to_thread(run)
+
+
+def observe_request(method: str, route: str, status: int, seconds: float, breakdown: Breakdown):
+    REQUEST_SECONDS.observe(seconds, method, route, status)
+    REQUEST_QUERIES.observe(breakdown.count("db.query"), method, route)
+    if settings.SLOW_REQUEST_SECONDS > 0 and seconds >= settings.SLOW_REQUEST_SECONDS:
+        SLOW_REQUESTS.inc(method, route)
+        logger.warning("Slow request %s %s -> %s in %.1fms: %s", method, route, status, seconds * 1000, breakdown)
+
+
+# SQL queries as "db.query" spans; install on every engine (the sync_engine of an async one)
+def instrument_engine(engine):
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._metrics_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, "_metrics_started", None)
+    if started is not None:
+        record("db.query", time.perf_counter() - started)
+
+
+# Mongo commands as "mongo.<command>" spans. Motor runs pymongo in threads with a copy of the
+# caller's context, so they land in the breakdown of the request that issued them.
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record(f"mongo.{event.command_name}", event.duration_micros / 1e6)
+
+
+# Gauges of this process's evaluation pipeline: the queue, a WorkerPool and AdmissionControl
+def watch_pipeline(queue, pool=None, admission=None):
+    registry.gauge("submission_queue_depth", "Jobs waiting in the submission queue", queue.depth)
+    if pool is not None:
+        registry.gauge("submission_workers_busy", "Workers of this process evaluating a job", lambda: pool.busy)
+    if admission is not None:
+        registry.gauge("executions_in_flight", "Executions running in this process", lambda: admission.executing)
+
+
+# Plain HTTP endpoint answering every request with the metrics, for processes without the API (worker.py)
+async def serve(port: int) -> asyncio.AbstractServer:
+    async def handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            await reader.readuntil(b"\r\n\r\n")
+            body = registry.render().encode()
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Type: text/plain; version=0.0.4\r\n"
+                         b"Content-Length: %d\r\nConnection: close\r\n\r\n" % len(body) + body)
+            await writer.drain()
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    return await asyncio.start_server(handle, "0.0.0.0", port)
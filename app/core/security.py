@@ -0,0 +1,144 @@
+# Access tokens and the authenticated-user dependencies every router uses.
+# Authenticating a request must stay cheap (clients poll submission status), so both
+# halves of the work are cached per process: verified tokens until their `exp`, and
+# user rows for AUTH_USER_CACHE_TTL seconds. A cached user is dropped as soon as its row
+# is updated or deleted through the ORM in this process; other processes see the change
+# once their entry expires.
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Hashable, Optional
+
+from fastapi import Depends, HTTPException
+from fastapi.security import OAuth2PasswordBearer
+from jose import JWTError, jwt
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from database.mysql_db import get_db
+from models import User
+
+oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login", auto_error=False)
+
+CREDENTIALS_ERROR = HTTPException(
+    status_code=401, detail="Could not validate credentials", headers={"WWW-Authenticate": "Bearer"}
+)
+
+
+def create_access_token(user_id: int) -> str:
+    expiration = datetime.utcnow() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    return jwt.encode({"sub": str(user_id), "exp": expiration}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+
+
+# The parts of a User row a request needs; detached from any session, so it can be cached
+class CurrentUser:
+    __slots__ = ("id", "username", "email", "is_admin")
+
+    def __init__(self, id: int, username: Optional[str], email: Optional[str], is_admin: bool = False):
+        self.id = id
+        self.username = username
+        self.email = email
+        self.is_admin = is_admin
+
+    @classmethod
+    def from_row(cls, user: User) -> "CurrentUser":
+        return cls(user.id, user.username, user.email, bool(user.is_admin))
+
+
+# Bounded LRU whose entries expire at a per-entry wall-clock time
+class TTLCache:
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidations": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries), "max_entries": self.max_entries}
+
+    def get(self, key: Hashable):
+        item = self._entries.get(key)
+        if item is None:
+            self.counters["misses"] += 1
+            return None
+        value, expires_at = item
+        if expires_at <= time.time():
+            self._entries.pop(key, None)
+            self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            return None
+        self._entries.move_to_end(key)
+        self.counters["hits"] += 1
+        return value
+
+    def put(self, key: Hashable, value, expires_at: float):
+        self._entries[key] = (value, expires_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    def invalidate(self, key: Hashable):
+        if self._entries.pop(key, None) is not None:
+            self.counters["invalidations"] += 1
+
+    def clear(self):
+        self._entries.clear()
+
+
+# token -> user id, until the token's exp
+token_cache = TTLCache(settings.AUTH_TOKEN_CACHE_SIZE)
+# user id -> CurrentUser
+user_cache = TTLCache(settings.AUTH_USER_CACHE_SIZE)
+
+
+def auth_cache_stats() -> dict:
+    return {"tokens": token_cache.stats(), "users": user_cache.stats()}
+
+
+def invalidate_user(user_id: int):
+    user_cache.invalidate(user_id)
+
+
+@event.listens_for(User, "after_update")
+@event.listens_for(User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate_user(target.id)
+
+
+# User id of a valid token; the signature and exp are only checked the first time it is seen
+def verify_token(token: str) -> int:
+    user_id = token_cache.get(token)
+    if user_id is not None:
+        return user_id
+    try:
+        claims = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM], options={"require_exp": True})
+        user_id = int(claims["sub"])
+    except (JWTError, KeyError, TypeError, ValueError):
+        raise CREDENTIALS_ERROR
+    token_cache.put(token, user_id, float(claims["exp"]))
+    return user_id
+
+
+# Dependency: the user the bearer token belongs to, or 401
+async def get_current_user(
+    token: Optional[str] = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+) -> CurrentUser:
+    if not token:
+        raise CREDENTIALS_ERROR
+    user_id = verify_token(token)
+    user = user_cache.get(user_id)
+    if user is None:
+        row = await db.get(User, user_id)
+        if row is None:
+            raise CREDENTIALS_ERROR
+        user = CurrentUser.from_row(row)
+        user_cache.put(user_id, user, time.time() + settings.AUTH_USER_CACHE_TTL)
+    return user
+
+
+# Dependency: the current user if they are an admin, else 403
+async def get_current_admin(user: CurrentUser = Depends(get_current_user)) -> CurrentUser:
+    if not user.is_admin:
+        raise HTTPException(status_code=403, detail="Admin access required")
+    return user
@@ -0,0 +1,98 @@
+# Content-addressed storage for submission bodies (source code, stdin, program output).
+# A blob's id is the SHA-256 of its text, so identical solutions and outputs are stored
+# once however many submissions refer to them. Blobs are zlib-compressed when that saves
+# space; compressed blobs of at least SUBMISSION_BLOB_S3_MIN_BYTES go to S3 (under
+# submission_blobs/) and only their metadata stays in the `submission_blobs` collection.
+# Blobs are immutable and never deleted.
+import asyncio
+import hashlib
+import zlib
+from typing import Dict, Iterable, Optional
+
+from core.config import settings
+from services.s3 import get_s3_client
+
+S3_PREFIX = "submission_blobs/"
+# Larger blobs are compressed and decompressed in a worker thread
+THREAD_MIN_BYTES = 64 * 1024
+
+# Per process, shared by every BlobStore; see GET /admin/stats/submission-blobs
+counters = {"puts": 0, "deduplicated": 0, "reads": 0, "bytes_in": 0, "bytes_stored": 0, "s3_objects": 0}
+
+
+def _encode(data: bytes) -> tuple:
+    compressed = zlib.compress(data, 6)
+    return ("zlib", compressed) if len(compressed) < len(data) else ("raw", data)
+
+
+def _decode(codec: str, data: bytes) -> str:
+    return (zlib.decompress(data) if codec == "zlib" else data).decode("utf-8")
+
+
+class BlobStore:
+    def __init__(self, collection, s3=None, bucket: Optional[str] = None,
+                 s3_min_bytes: int = settings.SUBMISSION_BLOB_S3_MIN_BYTES):
+        self.collection = collection
+        self._s3 = s3
+        self.bucket = bucket or settings.AWS_BUCKET_NAME
+        self.s3_min_bytes = s3_min_bytes
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            self._s3 = get_s3_client()
+        return self._s3
+
+    # Store `text` (once per content) and return its id
+    async def put(self, text: str) -> str:
+        data = text.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        counters["puts"] += 1
+        counters["bytes_in"] += len(data)
+        codec, stored = await asyncio.to_thread(_encode, data) if len(data) >= THREAD_MIN_BYTES else _encode(data)
+        blob = {"codec": codec, "size": len(data), "stored_size": len(stored)}
+        if len(stored) >= self.s3_min_bytes:
+            if await self.collection.find_one({"_id": digest}, {"_id": 1}):
+                counters["deduplicated"] += 1
+                return digest
+            await asyncio.to_thread(self.s3.put_object, Bucket=self.bucket, Key=S3_PREFIX + digest, Body=stored)
+            counters["s3_objects"] += 1
+            blob["location"] = "s3"
+        else:
+            blob["data"] = stored
+        result = await self.collection.update_one({"_id": digest}, {"$setOnInsert": blob}, upsert=True)
+        if result.upserted_id is None:
+            counters["deduplicated"] += 1
+        else:
+            counters["bytes_stored"] += len(stored)
+        return digest
+
+    async def _read(self, doc: dict) -> str:
+        if doc.get("location") == "s3":
+            def download() -> str:
+                body = self.s3.get_object(Bucket=self.bucket, Key=S3_PREFIX + doc["_id"])["Body"]
+                try:
+                    return _decode(doc["codec"], body.read())
+                finally:
+                    body.close()
+            return await asyncio.to_thread(download)
+        if doc["stored_size"] >= THREAD_MIN_BYTES:
+            return await asyncio.to_thread(_decode, doc["codec"], doc["data"])
+        return _decode(doc["codec"], doc["data"])
+
+    async def get(self, digest: str) -> Optional[str]:
+        return (await self.get_many([digest])).get(digest)
+
+    # Texts of several blobs at once (missing ones are left out)
+    async def get_many(self, digests: Iterable[str]) -> Dict[str, str]:
+        digests = list(set(digests))
+        if not digests:
+            return {}
+        docs = await self.collection.find({"_id": {"$in": digests}}).to_list(None)
+        counters["reads"] += len(docs)
+        texts = await asyncio.gather(*(self._read(doc) for doc in docs))
+        return {doc["_id"]: text for doc, text in zip(docs, texts)}
+
+
+def blob_stats() -> dict:
+    return dict(counters)
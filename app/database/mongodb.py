@@ -1,8 +1,9 @@
-from motor.motor_asyncio import AsyncIOMotorClient
+from core.db import database
 
-# Replace with your actual URI
-MONGO_URI = "mongodb://localhost:27017"
-MONGO_DB_NAME = "yourdbname"
+# The application database on the shared Motor client (connected in the app lifespan)
+def get_mongo_db():
+    return database.mongo
 
-client = AsyncIOMotorClient(MONGO_URI)
-mongodb = client[MONGO_DB_NAME]
+# Dependency to get the submissions collection
+def get_submissions_collection():
+    return get_mongo_db()["submissions"]
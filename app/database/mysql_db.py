@@ -1,32 +1,15 @@
-import os
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker, declarative_base
-from dotenv import load_dotenv
+from sqlalchemy.orm import Session, declarative_base
 
-# Load environment variables from the .env file
-load_dotenv()
-
-# Fetch the credentials from environment variables
-MYSQL_USER = os.getenv("MYSQL_USER")
-MYSQL_PASSWORD = os.getenv("MYSQL_PASSWORD")
-MYSQL_HOST = os.getenv("MYSQL_HOST")
-MYSQL_PORT = os.getenv("MYSQL_PORT")
-MYSQL_DATABASE = os.getenv("MYSQL_DATABASE")
-
-# Construct the MySQL connection URL
-MYSQL_DATABASE_URL = f"mysql+mysqlconnector://{MYSQL_USER}:{MYSQL_PASSWORD}@{MYSQL_HOST}:{MYSQL_PORT}/{MYSQL_DATABASE}"
-
-# Create the database engine and session
-engine = create_engine(MYSQL_DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+from core.db import database
 
 # Base class for models
 Base = declarative_base()
 
-# Dependency to get the database session
-def get_db():
-    db = SessionLocal()
-    try:
+# A session on the shared sync engine, for code running in worker threads (the evaluator)
+def SessionLocal() -> Session:
+    return database.session()
+
+# Dependency to get the database session; every SQL route runs on the async engine
+async def get_db():
+    async with database.async_session() as db:
         yield db
-    finally:
-        db.close()
@@ -0,0 +1,258 @@
+# All reads and writes of the Mongo `submissions` collection go through this repository,
+# so the fields, indexes and projections stay in one place.
+#
+# Bodies (BODY_FIELDS) longer than SUBMISSION_INLINE_MAX_CHARS are not stored in the
+# document: it holds their content-addressed blob id (database.blobs) under "blobs" and
+# their first SUBMISSION_PREVIEW_CHARS characters under "previews". Reads put the text
+# back only for the fields they return. Older documents with inline bodies read as before.
+import asyncio
+import base64
+import time
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from bson.objectid import ObjectId
+from fastapi import Depends
+from pymongo import ASCENDING, DESCENDING
+
+from core.config import settings
+from database.blobs import BlobStore
+from database.mongodb import get_submissions_collection
+
+# Large fields left out of history pages unless explicitly requested
+HEAVY_FIELDS = ("source_code", "stdin", "stdout", "stderr", "compile_output", "test_results")
+
+# Text fields moved to blobs when long
+BODY_FIELDS = ("source_code", "stdin", "stdout", "stderr", "compile_output")
+
+# Fields returned by the lightweight status endpoint
+STATUS_FIELDS = {"status": 1, "status_id": 1, "time": 1, "memory": 1, "passed": 1, "total": 1, "error": 1}
+
+INDEXES = (
+    [("user_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("challenge_id", ASCENDING), ("status", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("challenge_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)],
+    [("challenge_id", ASCENDING), ("_id", ASCENDING)],
+)
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+# History pages are ordered by (created_at, _id) descending; the cursor is the position
+# of the last entry of a page
+def encode_cursor(doc: dict) -> str:
+    raw = f"{doc['created_at']!r}:{doc['_id']}"
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor: str) -> Tuple[float, ObjectId]:
+    try:
+        created_at, submission_id = base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8").split(":")
+        return float(created_at), ObjectId(submission_id)
+    except Exception:
+        raise InvalidCursor("Invalid cursor")
+
+
+# Parse the `include` query parameter ("source_code,stdout") of history endpoints
+def parse_include(include: Optional[str]) -> List[str]:
+    fields = [field.strip() for field in (include or "").split(",") if field.strip()]
+    unknown = [field for field in fields if field not in HEAVY_FIELDS]
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(HEAVY_FIELDS)}")
+    return fields
+
+
+# JSON-friendly copy of a submission document
+def serialize(doc: dict) -> dict:
+    doc = dict(doc)
+    doc["submission_id"] = str(doc.pop("_id"))
+    return doc
+
+
+class SubmissionRepository:
+    def __init__(self, collection, blobs: Optional[BlobStore] = None):
+        self.collection = collection
+        self.blobs = blobs or BlobStore(collection.database["submission_blobs"])
+
+    async def create_indexes(self):
+        for keys in INDEXES:
+            await self.collection.create_index(keys)
+
+    # Split `fields` into the inline ones and the blob ids and previews of long bodies
+    async def _pack(self, fields: dict) -> Tuple[dict, dict, dict]:
+        long_bodies = {field: value for field, value in fields.items()
+                       if field in BODY_FIELDS and isinstance(value, str)
+                       and len(value) > settings.SUBMISSION_INLINE_MAX_CHARS}
+        inline = {field: value for field, value in fields.items() if field not in long_bodies}
+        digests = await asyncio.gather(*(self.blobs.put(value) for value in long_bodies.values()))
+        blobs = dict(zip(long_bodies, digests))
+        previews = {field: value[:settings.SUBMISSION_PREVIEW_CHARS] for field, value in long_bodies.items()}
+        return inline, blobs, previews
+
+    # Put the text of `fields` back into each doc, reading every blob they need at once.
+    # Blob ids are dropped, and so are the previews of the fields that were filled in.
+    async def _assemble(self, docs: List[dict], fields: Iterable[str]) -> List[dict]:
+        fields = set(fields)
+        texts = await self.blobs.get_many(
+            digest for doc in docs for field, digest in (doc.get("blobs") or {}).items() if field in fields
+        )
+        for doc in docs:
+            for field, digest in (doc.pop("blobs", None) or {}).items():
+                if field in fields:
+                    doc[field] = texts.get(digest)
+            previews = doc.get("previews")
+            if previews is not None:
+                for field in fields:
+                    previews.pop(field, None)
+                if not previews:
+                    del doc["previews"]
+        return docs
+
+    async def insert(self, submission: dict) -> ObjectId:
+        inline, blobs, previews = await self._pack(submission)
+        doc = {**inline, "created_at": time.time()}
+        if blobs:
+            doc.update(blobs=blobs, previews=previews)
+        result = await self.collection.insert_one(doc)
+        return result.inserted_id
+
+    # Pass user_id to only find the submission if that user made it. Bodies are assembled
+    # for the fields in the projection, or all of them without one.
+    async def get(self, submission_id: ObjectId, fields: Optional[dict] = None,
+                  user_id: Optional[int] = None) -> Optional[dict]:
+        query = {"_id": submission_id}
+        if user_id is not None:
+            query["user_id"] = user_id
+        wanted = BODY_FIELDS if fields is None else [field for field in BODY_FIELDS if fields.get(field)]
+        if fields is not None and wanted:
+            fields = {**fields, **{f"blobs.{field}": 1 for field in wanted}}
+        doc = await self.collection.find_one(query, fields)
+        if doc is None or not wanted:
+            return doc
+        return (await self._assemble([doc], wanted))[0]
+
+    async def get_status(self, submission_id: ObjectId, user_id: Optional[int] = None) -> Optional[dict]:
+        return await self.get(submission_id, STATUS_FIELDS, user_id)
+
+    async def update(self, submission_id: ObjectId, fields: dict):
+        inline, blobs, previews = await self._pack(fields)
+        update = {"$set": {
+            **inline,
+            **{f"blobs.{field}": digest for field, digest in blobs.items()},
+            **{f"previews.{field}": preview for field, preview in previews.items()},
+        }}
+        # Drop whichever form an earlier update stored each body in
+        unset = {field: "" for field in blobs}
+        for field in inline:
+            if field in BODY_FIELDS:
+                unset.update({f"blobs.{field}": "", f"previews.{field}": ""})
+        if unset:
+            update["$unset"] = unset
+        await self.collection.update_one({"_id": submission_id}, update)
+
+    # True only for the first caller per flag, so a redelivered job is counted once
+    async def claim(self, submission_id: ObjectId, flag: str) -> bool:
+        result = await self.collection.update_one(
+            {"_id": submission_id, flag: {"$ne": True}},
+            {"$set": {flag: True}}
+        )
+        return result.modified_count == 1
+
+    async def claim_analytics(self, submission_id: ObjectId) -> bool:
+        return await self.claim(submission_id, "analytics_recorded")
+
+    # Undo a claim; True if the flag was set
+    async def release(self, submission_id: ObjectId, flag: str) -> bool:
+        result = await self.collection.update_one({"_id": submission_id, flag: True}, {"$unset": {flag: ""}})
+        return result.modified_count == 1
+
+    # One page of submissions matching `query`, newest first. Returns (page, next cursor).
+    async def _page(self, query: dict, cursor: Optional[str], limit: int,
+                    include: Iterable[str] = ()) -> Tuple[List[dict], Optional[str]]:
+        if cursor:
+            created_at, submission_id = decode_cursor(cursor)
+            query = {**query, "$or": [
+                {"created_at": {"$lt": created_at}},
+                {"created_at": created_at, "_id": {"$lt": submission_id}},
+            ]}
+        excluded = [field for field in HEAVY_FIELDS if field not in set(include)]
+        projection = {field: 0 for field in excluded}
+        projection.update({f"blobs.{field}": 0 for field in excluded if field in BODY_FIELDS})
+        docs = await self.collection.find(query, projection or None) \
+            .sort([("created_at", DESCENDING), ("_id", DESCENDING)]) \
+            .limit(limit + 1) \
+            .to_list(limit + 1)
+        next_cursor = encode_cursor(docs[limit - 1]) if len(docs) > limit else None
+        return await self._assemble(docs[:limit], include), next_cursor
+
+    async def history_for_user(self, user_id: int, challenge_id: Optional[int] = None, cursor: Optional[str] = None,
+                               limit: int = 20, include: Iterable[str] = ()):
+        query = {"user_id": user_id}
+        if challenge_id is not None:
+            query["challenge_id"] = challenge_id
+        return await self._page(query, cursor, limit, include)
+
+    async def history_for_challenge(self, challenge_id: int, status: Optional[str] = None,
+                                    cursor: Optional[str] = None, limit: int = 20, include: Iterable[str] = ()):
+        query = {"challenge_id": challenge_id}
+        if status is not None:
+            query["status"] = status
+        return await self._page(query, cursor, limit, include)
+
+    # "submit" submissions of a challenge (only those with `status` if given) with their source code
+    async def graded_sources(self, challenge_id: int, status: Optional[str] = None) -> List[dict]:
+        query = {"challenge_id": challenge_id, "mode": "submit"}
+        if status is not None:
+            query["status"] = status
+        docs = await self.collection.find(
+            query, {"user_id": 1, "language_id": 1, "status": 1, "source_code": 1, "blobs.source_code": 1}
+        ).sort("created_at", ASCENDING).to_list(None)
+        return await self._assemble(docs, ["source_code"])
+
+    async def accepted_sources(self, challenge_id: int) -> List[dict]:
+        return await self.graded_sources(challenge_id, "Accepted")
+
+    # "submit" submissions of a challenge with `status` if given, and never one in `excluded`
+    @staticmethod
+    def _graded_query(challenge_id: int, status: Optional[str], excluded: Iterable[str]) -> dict:
+        statuses = {"$nin": list(excluded)}
+        if status is not None:
+            statuses["$eq"] = status
+        return {"challenge_id": challenge_id, "mode": "submit", "status": statuses}
+
+    async def count_graded(self, challenge_id: int, status: Optional[str] = None, excluded: Iterable[str] = ()) -> int:
+        return await self.collection.count_documents(self._graded_query(challenge_id, status, excluded))
+
+    # The same submissions as count_graded with their source code, in pages of `page_size` in _id
+    # order. Each page starts past the last _id of the one before, so only one page is in memory.
+    async def graded_source_pages(self, challenge_id: int, status: Optional[str] = None,
+                                  excluded: Iterable[str] = (), page_size: int = 200) -> AsyncIterator[List[dict]]:
+        query = self._graded_query(challenge_id, status, excluded)
+        projection = {"user_id": 1, "language_id": 1, "status": 1, "source_code": 1, "blobs.source_code": 1}
+        after = None
+        while True:
+            page_query = query if after is None else {**query, "_id": {"$gt": after}}
+            docs = await self.collection.find(page_query, projection) \
+                .sort("_id", ASCENDING) \
+                .limit(page_size) \
+                .to_list(page_size)
+            if not docs:
+                return
+            after = docs[-1]["_id"]
+            yield await self._assemble(docs, ["source_code"])
+            if len(docs) < page_size:
+                return
+
+    # Final verdicts of one user's submissions of a challenge that are scored on the leaderboard
+    async def leaderboard_verdicts(self, user_id: int, challenge_id: int) -> List[dict]:
+        cursor = self.collection.find(
+            {"user_id": user_id, "challenge_id": challenge_id, "mode": "submit", "leaderboard_recorded": True},
+            {"status_id": 1, "finished_at": 1}
+        )
+        return [doc async for doc in cursor]
+
+
+# Dependency; follows overrides of get_submissions_collection
+def get_submission_repository(collection=Depends(get_submissions_collection)) -> SubmissionRepository:
+    return SubmissionRepository(collection)
@@ -1,14 +1,99 @@
-from fastapi import FastAPI
-from routers import auth, admin, candidate, submissions
+from contextlib import asynccontextmanager
+import math
+import time
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from routers import auth, admin, candidate, internal, leaderboard, submissions
+from core import metrics
+from core.config import settings
+from core.db import database
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.admission import RateLimited, get_admission_control
+from services.analytics import get_submission_analytics
+from services.executors import close_executor
+from services.judge0 import close_judge0_client, get_judge0_client
+from services.leaderboard import get_leaderboard
+from services.passwords import close_password_hasher
+from services.pubsub import close_pubsub, get_pubsub
+from services.similarity import close_similarity_index, get_similarity_index
+from services.submission_queue import get_submission_queue
+from services.testcase_store import close_hidden_case_store
+from services.submission_worker import SubmissionWorker, WorkerPool
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    database.connect()
+    repository = SubmissionRepository(get_submissions_collection())
+    await repository.create_indexes()
+    analytics = get_submission_analytics()
+    await analytics.create_indexes()
+    board = get_leaderboard()
+    await board.create_indexes()
+    await board.sync()
+    similarity = get_similarity_index()
+    await similarity.create_indexes()
+    admission = get_admission_control()
+    await admission.store.create_indexes()
+    pubsub = get_pubsub()
+    await pubsub.start()
+    if settings.EXECUTOR_BACKEND == "judge0":
+        await get_judge0_client().start()
+    queue = get_submission_queue()
+    await queue.start()
+    pool = None
+    if settings.RUN_WORKERS_IN_APP:
+        worker = SubmissionWorker(repository, analytics=analytics, leaderboard=board, similarity=similarity,
+                                  pubsub=pubsub)
+        pool = WorkerPool(queue, worker, settings.SUBMISSION_WORKERS, admission)
+        pool.start()
+    metrics.watch_pipeline(queue, pool, admission)
+    yield
+    if pool is not None:
+        await pool.stop()
+    await queue.stop()
+    await close_executor()
+    await close_judge0_client()
+    await close_pubsub()
+    close_hidden_case_store()
+    close_password_hasher()
+    close_similarity_index()
+    await database.disconnect()
+
+app = FastAPI(lifespan=lifespan)
+
+# Rate limits and load shedding answer 429 with the seconds to wait
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(status_code=429, content={"detail": exc.detail},
+                        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))})
+
+# Times every request per route template (unmatched paths share one label); the spans it ran
+# (SQL, Mongo, Judge0, S3, thread pool) are logged for requests slower than SLOW_REQUEST_SECONDS
+@app.middleware("http")
+async def time_requests(request: Request, call_next):
+    started = time.perf_counter()
+    with metrics.tracking() as breakdown:
+        response = await call_next(request)
+    route = request.scope.get("route")
+    metrics.observe_request(request.method, route.path if route else "unmatched", response.status_code,
+                            time.perf_counter() - started, breakdown)
+    return response
 
 app.include_router(auth.router, prefix="/auth", tags=["Auth"])
 app.include_router(admin.router, prefix="/admin", tags=["Admin"])
 app.include_router(candidate.router, prefix="/candidate", tags=["Candidate"])
 app.include_router(submissions.router, prefix="/submissions", tags=["Submissions"])
+app.include_router(leaderboard.router, prefix="/leaderboard", tags=["Leaderboard"])
+app.include_router(internal.router, prefix="/internal", tags=["Internal"])
 
 @app.get("/")
 async def root():
     return {"message": "Welcome to the Online Coding Platform API"}
 
+# Prometheus metrics of this process
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404, detail="Not Found")
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
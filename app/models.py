@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, Enum, Boolean, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, Enum, Boolean, Float, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from database.mysql_db import Base
 
@@ -8,6 +8,7 @@ class User(Base):
     username = Column(String, index=True)
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
+    is_admin = Column(Boolean, nullable=False, default=False, server_default="0")
 
 class Challenge(Base):
     __tablename__ = 'challenges'
@@ -18,11 +19,24 @@ class Challenge(Base):
     difficulty = Column(Enum('easy', 'medium', 'hard'), nullable=False)
     time_limit = Column(Integer)
     memory_limit = Column(Integer)
+    # How outputs are compared with the expected ones (services.comparator.MODES); float_tolerance
+    # is used by the "float" mode
+    compare_mode = Column(String(16), nullable=False, default="exact", server_default="exact")
+    float_tolerance = Column(Float, nullable=True)
+    # Bumped whenever the test cases or limits change; part of the verdict cache key
+    test_set_version = Column(Integer, nullable=False, default=1, server_default="1")
     test_cases = relationship("TestCase", back_populates="challenge", cascade="all, delete-orphan")
 
+    # Keyset pagination of the catalog filtered by difficulty
+    __table_args__ = (Index("ix_challenges_difficulty_id", "difficulty", "id"),)
+
 
 class TestCase(Base):
     __tablename__ = "public_test_cases"
     id = Column(Integer, primary_key=True, autoincrement=True)
     challenge_id = Column(Integer, ForeignKey("challenges.id"))
+    input_data = Column(Text)
+    expected_output = Column(Text)
+    is_hidden = Column(Boolean, default=False)
+    s3_key = Column(String(255), nullable=True)  # input file of a hidden case
     challenge = relationship("Challenge", back_populates="test_cases")
@@ -1,9 +0,0 @@
-from sqlalchemy import Column, Integer, String
-from app.core.db_base import Base
-
-class User(Base):
-    __tablename__ = "users"
-    id = Column(Integer, primary_key=True, index=True)
-    username = Column(String, unique=True, index=True)
-    hashed_password = Column(String)
-    role = Column(String)  # "admin" or "candidate"
@@ -1,15 +1,43 @@
 # Importing necessary modules from FastAPI, SQLAlchemy, and AWS SDK
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
+import asyncio
+import inspect
+import logging
+import time
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, UploadFile, File, Form, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.mysql_db import get_db  # Dependency to get the DB session
-from models import Challenge, TestCase  # SQLAlchemy models for the database
-from pydantic import BaseModel  # For request validation
-import boto3  # AWS SDK to interact with S3
+from models import Challenge, TestCase, User  # SQLAlchemy models for the database
+from pydantic import BaseModel, Field  # For request validation
 import uuid  # To generate unique keys for S3
-from typing import Optional
+from bson.errors import InvalidId
+from bson.objectid import ObjectId
+from typing import Literal, Optional
+from core.config import settings
+from core.db import database
+from core.security import auth_cache_stats, get_current_admin, invalidate_user
+from services.testcase_sets import bump_test_set_version, hidden_output_key
+from services.testcase_import import InvalidArchiveError, import_test_cases
+from services.judge0 import get_judge0_client
+from services.verdict_cache import get_verdict_cache
+from services.catalog_cache import get_catalog_cache
+from database.blobs import blob_stats
+from database.submissions import SubmissionRepository, get_submission_repository, parse_include, serialize
+from services.analytics import SubmissionAnalytics, get_submission_analytics
+from services.s3 import get_s3_client
+from services.passwords import get_password_hasher
+from services.pubsub import get_pubsub
+from services.admission import get_admission_control
+from services.leaderboard import get_leaderboard
+from services.similarity import SimilarityIndex, get_similarity_index
+from services.submission_queue import SubmissionQueue, get_submission_queue
+from services.submission_worker import ACTIVE_STATUSES, REJUDGE
+from services.testcase_store import get_hidden_case_store
 
-# Creating a router object to define endpoints for challenges and test cases
-router = APIRouter()
+logger = logging.getLogger(__name__)
+
+# Creating a router object to define endpoints for challenges and test cases; admins only
+router = APIRouter(dependencies=[Depends(get_current_admin)])
 
 # ------------ SCHEMAS ------------
 
@@ -20,6 +48,13 @@ class ChallengeModel(BaseModel):
     difficulty: Optional[str] = None
     time_limit: Optional[int] = None
     memory_limit: Optional[int] = None
+    # How outputs are compared; see services/comparator.py
+    compare_mode: Optional[Literal["exact", "whitespace", "float", "line_set"]] = None
+    float_tolerance: Optional[float] = Field(None, ge=0)
+
+# Pydantic schema for changing a user's role
+class UserRoleModel(BaseModel):
+    is_admin: bool
 
 # Pydantic schema for TestCase model
 class TestCaseModel(BaseModel):
@@ -31,22 +66,23 @@ class TestCaseModel(BaseModel):
 
 # Create a new challenge
 @router.post("/challenges")
-def create_challenge(data: ChallengeModel, db: Session = Depends(get_db)):
-    new_challenge = Challenge(**data.dict())  # Map fields to DB model
+async def create_challenge(data: ChallengeModel, db: AsyncSession = Depends(get_db)):
+    new_challenge = Challenge(**data.dict(exclude_none=True))  # Map fields to DB model; unset ones get column defaults
     db.add(new_challenge)                     # Add to DB session
-    db.commit()                               # Commit transaction
-    db.refresh(new_challenge)                 # Refresh instance with updated info (e.g., auto-generated ID)
+    await db.commit()                         # Commit transaction
+    await get_catalog_cache().invalidate()
+    await db.refresh(new_challenge)           # Refresh instance with updated info (e.g., auto-generated ID)
     return new_challenge
 
 # Edit/update an existing challenge
 @router.put("/challenges/{challenge_id}")
-def edit_challenge(
+async def edit_challenge(
     challenge_id: int, 
     data: ChallengeModel, 
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     # Find challenge by ID
-    challenge = db.query(Challenge).filter(Challenge.id == challenge_id).first()
+    challenge = await db.get(Challenge, challenge_id)
     
     # If not found, return 404
     if not challenge:
@@ -63,44 +99,66 @@ def edit_challenge(
         challenge.time_limit = data.time_limit
     if data.memory_limit is not None:
         challenge.memory_limit = data.memory_limit
+    if data.compare_mode is not None:
+        challenge.compare_mode = data.compare_mode
+    if data.float_tolerance is not None:
+        challenge.float_tolerance = data.float_tolerance
+
+    # Limits and the compare mode change verdicts just like test cases do
+    judging = (data.time_limit, data.memory_limit, data.compare_mode, data.float_tolerance)
+    if any(value is not None for value in judging):
+        challenge.test_set_version = challenge.test_set_version + 1
     
-    db.commit()
-    db.refresh(challenge)
+    await db.commit()
+    await get_catalog_cache().invalidate()
+    await db.refresh(challenge)
     
     return challenge
 
 # Delete an existing challenge
 @router.delete("/challenges/{challenge_id}")
-def delete_challenge(challenge_id: int, db: Session = Depends(get_db)):
-    challenge = db.query(Challenge).filter(Challenge.id == challenge_id).first()
+async def delete_challenge(challenge_id: int, db: AsyncSession = Depends(get_db)):
+    challenge = await db.get(Challenge, challenge_id)
     
     if not challenge:
         raise HTTPException(status_code=404, detail="Challenge not found")
     
-    db.delete(challenge)
-    db.commit()
+    await db.delete(challenge)
+    await db.commit()
+    await get_catalog_cache().invalidate()
     return {"message": "Challenge deleted successfully"}
 
 # Add a test case (visible or hidden) to a challenge
 @router.post("/challenges/{challenge_id}/testcases")
-def add_test_case(
+async def add_test_case(
     challenge_id: int,
     is_hidden: bool = Form(...),
     input_data: Optional[str] = Form(None),
     expected_output: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    output_file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db)
 ):
     s3_key = None  # Default key (for visible test cases)
 
-    # If it's a hidden test case, upload the file to S3
+    # If it's a hidden test case, upload the input file (and the expected output
+    # file, unless expected_output is given inline) to S3
     if is_hidden:
         if not file:
             raise HTTPException(status_code=400, detail="Hidden test case must include a file.")
-        s3 = boto3.client("s3")
+        if not output_file and expected_output is None:
+            raise HTTPException(status_code=400, detail="Hidden test case must include output_file or expected_output.")
+        s3 = get_s3_client()
         s3_key = f"hidden_cases/{uuid.uuid4()}.txt"
+
+        # boto3 blocks, so the uploads run in a worker thread
+        def upload():
+            s3.upload_fileobj(file.file, settings.AWS_BUCKET_NAME, s3_key)
+            if output_file:
+                s3.upload_fileobj(output_file.file, settings.AWS_BUCKET_NAME, hidden_output_key(s3_key))
+
         try:
-            s3.upload_fileobj(file.file, "your-s3-bucket", s3_key)
+            await asyncio.to_thread(upload)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
     else:
@@ -117,24 +175,46 @@ def add_test_case(
         s3_key=s3_key
     )
     db.add(new_case)
-    db.commit()
+    await db.execute(bump_test_set_version(challenge_id))
+    await db.commit()
+    await get_catalog_cache().invalidate()
     return {"message": "Test case added successfully"}
 
+# Import many test cases at once from a zip of NN.in/NN.out pairs; manifest.json
+# ({"hidden": ["03", ...]}) marks hidden cases, whose files are uploaded to S3
+@router.post("/challenges/{challenge_id}/testcases/import")
+async def import_test_case_archive(
+    challenge_id: int,
+    archive: UploadFile = File(...),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await db.scalar(select(Challenge.id).where(Challenge.id == challenge_id)):
+        raise HTTPException(status_code=404, detail="Challenge not found")
+    try:
+        counts = await import_test_cases(db, challenge_id, archive.file)
+    except InvalidArchiveError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Failed to import test cases: {str(e)}")
+    await get_catalog_cache().invalidate()
+    return {"message": "Test cases imported successfully", **counts}
+
 # Edit an existing test case
 @router.put("/challenges/{challenge_id}/testcases/{test_case_id}")
-def edit_test_case(
+async def edit_test_case(
     challenge_id: int, 
     test_case_id: int, 
     is_hidden: bool = Form(...),
     input_data: Optional[str] = Form(None),
     expected_output: Optional[str] = Form(None),
     file: Optional[UploadFile] = File(None),
-    db: Session = Depends(get_db)
+    output_file: Optional[UploadFile] = File(None),
+    db: AsyncSession = Depends(get_db)
 ):
-    test_case = db.query(TestCase).filter(
+    test_case = await db.scalar(select(TestCase).where(
         TestCase.id == test_case_id, 
         TestCase.challenge_id == challenge_id
-    ).first()
+    ))
 
     if not test_case:
         raise HTTPException(status_code=404, detail="Test case not found")
@@ -146,37 +226,237 @@ def edit_test_case(
 
     # If it's a hidden test case and file is provided, upload new file to S3
     if is_hidden and file:
-        s3 = boto3.client("s3")
+        s3 = get_s3_client()
         s3_key = f"hidden_cases/{uuid.uuid4()}.txt"
+        previous_key = test_case.s3_key
+
+        def upload():
+            s3.upload_fileobj(file.file, settings.AWS_BUCKET_NAME, s3_key)
+            if output_file:
+                s3.upload_fileobj(output_file.file, settings.AWS_BUCKET_NAME, hidden_output_key(s3_key))
+            elif previous_key and expected_output is None:
+                # Keep using the previously uploaded expected output
+                s3.copy_object(
+                    Bucket=settings.AWS_BUCKET_NAME,
+                    Key=hidden_output_key(s3_key),
+                    CopySource={"Bucket": settings.AWS_BUCKET_NAME, "Key": hidden_output_key(previous_key)}
+                )
+
         try:
-            s3.upload_fileobj(file.file, "your-s3-bucket", s3_key)
+            await asyncio.to_thread(upload)
             test_case.s3_key = s3_key
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to upload to S3: {str(e)}")
     
-    db.commit()
-    db.refresh(test_case)
+    await db.execute(bump_test_set_version(challenge_id))
+    await db.commit()
+    await get_catalog_cache().invalidate()
+    await db.refresh(test_case)
     return {"message": "Test case updated successfully"}
 
 # Delete a test case from a challenge
 @router.delete("/challenges/{challenge_id}/testcases/{test_case_id}")
-def delete_test_case(challenge_id: int, test_case_id: int, db: Session = Depends(get_db)):
-    test_case = db.query(TestCase).filter(
+async def delete_test_case(challenge_id: int, test_case_id: int, db: AsyncSession = Depends(get_db)):
+    test_case = await db.scalar(select(TestCase).where(
         TestCase.id == test_case_id, 
         TestCase.challenge_id == challenge_id
-    ).first()
+    ))
 
     if not test_case:
         raise HTTPException(status_code=404, detail="Test case not found")
 
     # If it's a hidden test case, delete the associated file from S3
     if test_case.is_hidden and test_case.s3_key:
-        s3 = boto3.client("s3")
+        s3 = get_s3_client()
+        s3_key = test_case.s3_key
+
+        def delete():
+            s3.delete_object(Bucket=settings.AWS_BUCKET_NAME, Key=s3_key)
+            s3.delete_object(Bucket=settings.AWS_BUCKET_NAME, Key=hidden_output_key(s3_key))
+
         try:
-            s3.delete_object(Bucket="your-s3-bucket", Key=test_case.s3_key)
+            await asyncio.to_thread(delete)
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"Failed to delete from S3: {str(e)}")
     
-    db.delete(test_case)
-    db.commit()
+    await db.delete(test_case)
+    await db.execute(bump_test_set_version(challenge_id))
+    await db.commit()
+    await get_catalog_cache().invalidate()
     return {"message": "Test case deleted successfully"}
+
+# Grant or revoke admin rights; the change applies to the user's next request
+@router.put("/users/{user_id}")
+async def set_user_role(user_id: int, data: UserRoleModel, db: AsyncSession = Depends(get_db)):
+    user = await db.get(User, user_id)
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    user.is_admin = data.is_admin
+    await db.commit()
+    # The flush already dropped the cached row; drop it again in case a concurrent request
+    # re-cached it before the commit was visible
+    invalidate_user(user_id)
+    return {"id": user.id, "is_admin": user.is_admin}
+
+# Submissions to a challenge, newest first, optionally only those with a given status
+# ("Accepted", "Wrong Answer", ...). Paginated like GET /candidate/submissions.
+@router.get("/challenges/{challenge_id}/submissions")
+async def get_challenge_submissions(
+    challenge_id: int,
+    response: Response,
+    status: Optional[str] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    include: Optional[str] = None,
+    submissions: SubmissionRepository = Depends(get_submission_repository)
+):
+    try:
+        page, next_cursor = await submissions.history_for_challenge(
+            challenge_id, status, cursor, limit, parse_include(include)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [serialize(doc) for doc in page]
+
+# Queue the rejudge jobs of a challenge page by page, after the response is sent. queue.put
+# waits while the queue is full, which only holds up this task.
+async def enqueue_rejudges(submissions: SubmissionRepository, queue: SubmissionQueue, challenge_id: int,
+                           status: Optional[str]):
+    try:
+        async for page in submissions.graded_source_pages(challenge_id, status, ACTIVE_STATUSES):
+            for doc in page:
+                await queue.put({
+                    "submission_id": str(doc["_id"]),
+                    "user_id": doc.get("user_id"),
+                    "challenge_id": challenge_id,
+                    "language_id": doc.get("language_id"),
+                    "source_code": doc.get("source_code") or "",
+                    "stdin": "",
+                    "mode": "submit",
+                    "priority": REJUDGE,
+                    "enqueued_at": time.time()
+                })
+    except Exception:
+        logger.exception("Queueing the rejudge of challenge %s failed", challenge_id)
+
+# Judge every graded submission of a challenge again, e.g. after its test cases changed. The jobs
+# run in the "rejudge" priority class, behind new submissions and within its share of the workers,
+# and are queued in the background; `queued` is how many matched. Submissions still waiting for
+# their first verdict are left alone.
+@router.post("/challenges/{challenge_id}/rejudge", status_code=202)
+async def rejudge_challenge(
+    challenge_id: int,
+    background_tasks: BackgroundTasks,
+    status: Optional[str] = None,
+    submissions: SubmissionRepository = Depends(get_submission_repository),
+    queue: SubmissionQueue = Depends(get_submission_queue)
+):
+    queued = await submissions.count_graded(challenge_id, status, ACTIVE_STATUSES)
+    background_tasks.add_task(enqueue_rejudges, submissions, queue, challenge_id, status)
+    return {"challenge_id": challenge_id, "queued": queued}
+
+# Submission stats of every challenge: attempts, accepted, distinct users, counts per
+# status id and time/memory histograms, read from pre-aggregated rollups
+@router.get("/analytics")
+async def get_analytics(analytics: SubmissionAnalytics = Depends(get_submission_analytics)):
+    return await analytics.challenges()
+
+# One challenge's totals, per-language totals and hourly series for the last `hours`
+@router.get("/analytics/{challenge_id}")
+async def get_challenge_analytics(
+    challenge_id: int,
+    hours: int = Query(24, ge=1, le=24 * 90),
+    analytics: SubmissionAnalytics = Depends(get_submission_analytics)
+):
+    return await analytics.challenge(challenge_id, hours)
+
+# Pairs of users with suspiciously similar accepted submissions to a challenge, most similar first
+@router.get("/similarity/challenges/{challenge_id}")
+async def get_similar_pairs(
+    challenge_id: int,
+    min_similarity: float = Query(0.5, ge=0, le=1),
+    limit: int = Query(50, ge=1, le=500),
+    index: SimilarityIndex = Depends(get_similarity_index)
+):
+    return await index.suspicious_pairs(challenge_id, min_similarity, limit)
+
+# Re-fingerprint every accepted submission to a challenge on the process pool, then rank its pairs
+@router.post("/similarity/challenges/{challenge_id}/scan")
+async def scan_challenge_similarity(
+    challenge_id: int,
+    min_similarity: float = Query(0.5, ge=0, le=1),
+    limit: int = Query(50, ge=1, le=500),
+    index: SimilarityIndex = Depends(get_similarity_index),
+    submissions: SubmissionRepository = Depends(get_submission_repository)
+):
+    return await index.scan(submissions, challenge_id, min_similarity, limit)
+
+# Accepted submissions by other users closest to one accepted submission
+@router.get("/similarity/submissions/{submission_id}")
+async def get_similar_submissions(
+    submission_id: str,
+    limit: int = Query(10, ge=1, le=100),
+    index: SimilarityIndex = Depends(get_similarity_index)
+):
+    try:
+        matches = await index.matches(ObjectId(submission_id), limit)
+    except InvalidId:
+        matches = None
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Submission is not indexed")
+    return matches
+
+# Counters of this process's subsystems, by component name
+def stats_sources(queue: SubmissionQueue) -> dict:
+    return {
+        # Judge0 client: request/retry/poll counts, latency and in-flight executions
+        "judge0": lambda: get_judge0_client().stats(),
+        # Verdict cache: hits (in memory and from Mongo), misses, stores and evictions
+        "verdict-cache": lambda: get_verdict_cache().stats(),
+        # Hidden test case file cache: hits, misses, ETag revalidations, evictions and disk usage
+        "hidden-case-cache": lambda: get_hidden_case_store().stats(),
+        # Challenge catalog cache: hits, misses, 304 responses and invalidations
+        "catalog-cache": lambda: get_catalog_cache().stats(),
+        # Submission body blobs: deduplicated puts, bytes in and stored, S3 objects
+        "submission-blobs": blob_stats,
+        # Pub/sub: messages published, delivered to and dropped by slow subscribers, open subscriptions
+        "pubsub": lambda: get_pubsub().stats(),
+        # Submission queue: jobs queued and running, concurrency limit and users waiting per priority class
+        "queue": lambda: {"depth": queue.depth(), "classes": queue.stats()},
+        # SQL connection pools: size, connections in use, saturation and checkout waits
+        "db": database.pool_stats,
+        # Verified-token and user caches behind the authentication dependencies
+        "auth-cache": auth_cache_stats,
+        # Password hasher: hashes, verifications, cost upgrades, pending and rejected (429) operations
+        "password-hasher": lambda: get_password_hasher().stats(),
+        # Admission control: rate-limited and shed requests, execution slot waits and the current backlog
+        "admission": lambda: get_admission_control().stats(),
+        # Leaderboard: solves and wrong attempts recorded, solves applied, boards and last sync
+        "leaderboard": lambda: get_leaderboard().stats(),
+        # Similarity index: submissions indexed, match lookups and candidates read, batch scans
+        "similarity": lambda: get_similarity_index().stats(),
+    }
+
+async def collect_stats(source):
+    stats = source()
+    return await stats if inspect.isawaitable(stats) else stats
+
+# Counters of every subsystem; one that cannot report (e.g. its backend is down) gives its error instead
+@router.get("/stats")
+async def get_stats(queue: SubmissionQueue = Depends(get_submission_queue)):
+    stats = {}
+    for component, source in stats_sources(queue).items():
+        try:
+            stats[component] = await collect_stats(source)
+        except Exception as e:
+            stats[component] = {"error": str(e)}
+    return stats
+
+@router.get("/stats/{component}")
+async def get_component_stats(component: str, queue: SubmissionQueue = Depends(get_submission_queue)):
+    source = stats_sources(queue).get(component)
+    if source is None:
+        raise HTTPException(status_code=404, detail=f"Unknown component: {component}")
+    return await collect_stats(source)
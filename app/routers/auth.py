@@ -6,54 +6,32 @@ import os
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..")))
 
 # FastAPI modules for building APIs and handling security/auth
-from fastapi import APIRouter, HTTPException, Depends
-from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
+from fastapi import APIRouter, HTTPException, Depends, Request
 
 # Pydantic models for data validation
 from pydantic import BaseModel, EmailStr
 
-# SQLAlchemy session for database operations
-from sqlalchemy.orm import Session
+# Async SQLAlchemy session for database operations
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.mysql_db import get_db  # function to get DB session
 
 # ORM model representing the User table
 from models import User
 
-# For password hashing
-from passlib.context import CryptContext
+# Token issuing and the current-user dependency
+from core.security import CurrentUser, create_access_token, get_current_user
 
-# For encoding/decoding JWT tokens
-from jose import JWTError, jwt
+# Per-IP and per-account login rate limits
+from core.config import settings
+from services.admission import AdmissionControl, client_ip, get_admission_control
 
-# For token expiry and environment variables
-import os
-from datetime import datetime, timedelta
-from typing import Optional
-from dotenv import load_dotenv
-
-# Load environment variables from .env file
-load_dotenv()
+# bcrypt hashing/verification on a bounded process pool
+from services.passwords import PasswordHasher, PasswordHasherBusy, get_password_hasher
 
 # Create a FastAPI router for defining related endpoints
 router = APIRouter()
 
-# -------------------- AUTH CONFIGURATION --------------------
-
-# Load the secret key for JWT from environment variables
-SECRET_KEY = str(os.getenv("JWT_SECRET_KEY"))
-if SECRET_KEY is None:
-    raise ValueError("SECRET_KEY environment variable is not set")
-
-# Define the algorithm and expiration time for JWT
-ALGORITHM = "HS256"
-ACCESS_TOKEN_EXPIRE_MINUTES = 30
-
-# Set up password hashing context using bcrypt
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
-# Setup OAuth2 password bearer token scheme
-oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
-
 # -------------------- DATA MODELS (SCHEMAS) --------------------
 
 # Model for user registration input
@@ -76,39 +54,70 @@ class TokenResponse(BaseModel):
 
 # POST endpoint to register a new user
 @router.post("/register")
-def register_user(data: RegisterModel, db: Session = Depends(get_db)):
+async def register_user(
+    data: RegisterModel,
+    db: AsyncSession = Depends(get_db),
+    hasher: PasswordHasher = Depends(get_password_hasher)
+):
     # Check if a user with the given email already exists
-    existing_user = db.query(User).filter(User.email == data.email).first()
+    existing_user = await db.scalar(select(User).where(User.email == data.email).limit(1))
     if existing_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    # Hash the password securely
-    hashed_pw = pwd_context.hash(data.password)
+    # Hash the password securely; bcrypt is slow on purpose, so it runs on the hasher's processes
+    try:
+        hashed_pw = await hasher.hash(data.password)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=429, detail="Too many requests, try again shortly", headers={"Retry-After": "1"})
     
     # Create a new User object and add it to the database
     new_user = User(username=data.username, email=data.email, password_hash=hashed_pw)
     db.add(new_user)
-    db.commit()
-    db.refresh(new_user)
+    await db.commit()
     
     return {"message": "User registered successfully"}
 
 # POST endpoint to log in a user and return a JWT access token
 @router.post("/login", response_model=TokenResponse)
-def login_user(data: LoginModel, db: Session = Depends(get_db)):
+async def login_user(
+    data: LoginModel,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    hasher: PasswordHasher = Depends(get_password_hasher),
+    admission: AdmissionControl = Depends(get_admission_control)
+):
+    # Slow down password guessing, both from one address and against one account
+    await admission.limit([
+        (f"login:ip:{client_ip(request)}", settings.LOGIN_RATE_PER_IP, settings.LOGIN_BURST_PER_IP),
+        (f"login:account:{data.email.lower()}", settings.LOGIN_RATE_PER_ACCOUNT, settings.LOGIN_BURST_PER_ACCOUNT),
+    ])
+
     # Look for the user with the provided email
-    user = db.query(User).filter(User.email == data.email).first()
+    user = await db.scalar(select(User).where(User.email == data.email).limit(1))
     
-    # Validate password; raise error if credentials are invalid
-    if not user or not pwd_context.verify(data.password, user.password_hash):
+    if not user:
         raise HTTPException(status_code=401, detail="Invalid credentials")
 
-    # Set token expiration time
-    expiration = datetime.utcnow() + timedelta(hours=ACCESS_TOKEN_EXPIRE_MINUTES)
-    
-    # Create payload and encode JWT
-    payload = {"sub": str(user.id), "exp": expiration}
-    token = jwt.encode(payload, SECRET_KEY, algorithm=ALGORITHM)
+    # Validate password (on the hasher's processes, like hashing); raise error if credentials are invalid
+    try:
+        valid, new_hash = await hasher.verify(data.password, user.password_hash)
+    except PasswordHasherBusy:
+        raise HTTPException(status_code=429, detail="Too many requests, try again shortly", headers={"Retry-After": "1"})
+    if not valid:
+        raise HTTPException(status_code=401, detail="Invalid credentials")
+
+    # The hash was made with an outdated bcrypt cost; store one made with the current cost
+    if new_hash:
+        user.password_hash = new_hash
+        await db.commit()
+
+    # Signed JWT for the user, valid for ACCESS_TOKEN_EXPIRE_MINUTES
+    token = create_access_token(user.id)
 
     # Return access token
     return {"access_token": token, "token_type": "bearer"}
+
+# GET endpoint returning the user the bearer token belongs to
+@router.get("/me")
+async def read_current_user(user: CurrentUser = Depends(get_current_user)):
+    return {"id": user.id, "username": user.username, "email": user.email, "is_admin": user.is_admin}
@@ -1,21 +1,78 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from typing import Literal, Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database.mysql_db import get_db  # Corrected import
 from models import Challenge, TestCase  # Corrected import
+from core.security import CurrentUser, get_current_user
+from database.submissions import SubmissionRepository, get_submission_repository, parse_include, serialize
+from services.catalog_cache import Payload, get_catalog_cache
 
 router = APIRouter()
 
+# Columns returned by the challenge listing; the description is only in the detail view
+SUMMARY_COLUMNS = (Challenge.id, Challenge.title, Challenge.difficulty, Challenge.time_limit, Challenge.memory_limit)
+
+# One page of challenge summaries ordered by id. Pass the X-Next-Cursor header of a page
+# as `after` to get the next one; the header is absent on the last page.
+# Served from the catalog cache; MySQL is only queried after an admin change
 @router.get("/challenges")
-def get_all_challenges(db: Session = Depends(get_db)):
-    return db.query(Challenge).all()
+async def get_all_challenges(
+    after: Optional[int] = Query(None, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    difficulty: Optional[Literal["easy", "medium", "hard"]] = None,
+    db: AsyncSession = Depends(get_db),
+    if_none_match: Optional[str] = Header(None)
+):
+    async def build():
+        query = select(*SUMMARY_COLUMNS)
+        if difficulty is not None:
+            query = query.where(Challenge.difficulty == difficulty)
+        if after is not None:
+            query = query.where(Challenge.id > after)
+        rows = (await db.execute(query.order_by(Challenge.id).limit(limit + 1))).all()
+        page = [row._asdict() for row in rows[:limit]]
+        headers = {"X-Next-Cursor": str(page[-1]["id"])} if len(rows) > limit else {}
+        return Payload(page, headers)
+
+    key = f"challenges:{difficulty}:{after}:{limit}"
+    return await get_catalog_cache().response(key, build, if_none_match)
 
 @router.get("/challenges/{challenge_id}")
-def get_challenge_details(challenge_id: int, db: Session = Depends(get_db)):
-    challenge = db.query(Challenge).filter(Challenge.id == challenge_id).first()
-    if not challenge:
-        raise HTTPException(status_code=404, detail="Challenge not found")
-    visible_cases = db.query(TestCase).filter(TestCase.challenge_id == challenge_id, TestCase.is_hidden == False).all()
-    return {
-        "challenge": challenge,
-        "visible_test_cases": visible_cases
-    }
+async def get_challenge_details(challenge_id: int, db: AsyncSession = Depends(get_db),
+                                if_none_match: Optional[str] = Header(None)):
+    async def build():
+        challenge = await db.get(Challenge, challenge_id)
+        if not challenge:
+            raise HTTPException(status_code=404, detail="Challenge not found")
+        visible_cases = (await db.scalars(
+            select(TestCase).where(TestCase.challenge_id == challenge_id, TestCase.is_hidden == False)
+        )).all()
+        return {
+            "challenge": challenge,
+            "visible_test_cases": visible_cases
+        }
+
+    return await get_catalog_cache().response(f"challenge:{challenge_id}", build, if_none_match)
+
+# The current user's past submissions, newest first, without source code and program output unless
+# listed in `include`. Pass the X-Next-Cursor header of a page as `cursor` for the next one.
+@router.get("/submissions")
+async def get_submission_history(
+    response: Response,
+    challenge_id: Optional[int] = None,
+    cursor: Optional[str] = None,
+    limit: int = Query(20, ge=1, le=100),
+    include: Optional[str] = None,
+    user: CurrentUser = Depends(get_current_user),
+    submissions: SubmissionRepository = Depends(get_submission_repository)
+):
+    try:
+        page, next_cursor = await submissions.history_for_user(
+            user.id, challenge_id, cursor, limit, parse_include(include)
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    return [serialize(doc) for doc in page]
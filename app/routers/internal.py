@@ -0,0 +1,29 @@
+import binascii
+import hmac
+from fastapi import APIRouter, Body, Depends, HTTPException
+from core.config import settings
+from services.judge0 import CALLBACK_CHANNEL, decode_callback
+from services.pubsub import PubSub, get_pubsub
+
+router = APIRouter()
+
+# Judge0 PUTs each finished submission here (JUDGE0_CALLBACK_URL). The result is published to
+# the Judge0 client that submitted it, in whichever process that is, which then finalizes the submission.
+@router.put("/judge0/callback")
+async def judge0_callback(
+    client: str,
+    secret: str,
+    body: dict = Body(...),
+    pubsub: PubSub = Depends(get_pubsub)
+):
+    expected = settings.JUDGE0_CALLBACK_SECRET
+    if not expected or not hmac.compare_digest(secret.encode(), expected.encode()):
+        raise HTTPException(status_code=403, detail="Invalid callback secret")
+    if not body.get("token"):
+        raise HTTPException(status_code=422, detail="Callback without a token")
+    try:
+        result = decode_callback(body)
+    except (binascii.Error, TypeError):
+        raise HTTPException(status_code=422, detail="Callback fields are not base64")
+    await pubsub.publish(CALLBACK_CHANNEL.format(client), result)
+    return {"token": body["token"]}
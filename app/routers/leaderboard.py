@@ -0,0 +1,80 @@
+from typing import List
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from database.mysql_db import get_db
+from models import User
+from core.security import CurrentUser, get_current_user
+from services.leaderboard import Leaderboard, get_leaderboard
+
+router = APIRouter()
+
+# Ranks come from the in-memory boards; MySQL is only asked for the usernames of the rows returned
+async def with_usernames(db: AsyncSession, rows: List[dict]) -> List[dict]:
+    ids = {row["user_id"] for row in rows}
+    names = dict((await db.execute(select(User.id, User.username).where(User.id.in_(ids)))).all()) if ids else {}
+    return [{**row, "username": names.get(row["user_id"])} for row in rows]
+
+async def top(board: Leaderboard, db: AsyncSession, offset: int, limit: int, challenge_id=None) -> dict:
+    await board.refresh()
+    page = board.top(offset, limit, challenge_id)
+    return {**page, "entries": await with_usernames(db, page["entries"])}
+
+async def around(board: Leaderboard, db: AsyncSession, user_id: int, window: int, challenge_id=None) -> dict:
+    await board.refresh()
+    result = board.around(user_id, window, challenge_id)
+    if result is None:
+        raise HTTPException(status_code=404, detail="User is not on this leaderboard")
+    entries = await with_usernames(db, result["entries"])
+    entry = next(row for row in entries if row["user_id"] == user_id)
+    return {"total": result["total"], "entry": entry, "entries": entries}
+
+# Global standings: challenges solved, then total penalty seconds
+@router.get("/")
+async def get_leaderboard_page(
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    board: Leaderboard = Depends(get_leaderboard),
+    db: AsyncSession = Depends(get_db)
+):
+    return await top(board, db, offset, limit)
+
+# The current user's rank with `window` users above and below
+@router.get("/me")
+async def get_my_rank(
+    window: int = Query(5, ge=0, le=50),
+    user: CurrentUser = Depends(get_current_user),
+    board: Leaderboard = Depends(get_leaderboard),
+    db: AsyncSession = Depends(get_db)
+):
+    return await around(board, db, user.id, window)
+
+@router.get("/users/{user_id}")
+async def get_user_rank(
+    user_id: int,
+    window: int = Query(5, ge=0, le=50),
+    board: Leaderboard = Depends(get_leaderboard),
+    db: AsyncSession = Depends(get_db)
+):
+    return await around(board, db, user_id, window)
+
+# Users who solved one challenge, by their penalty on it
+@router.get("/challenges/{challenge_id}")
+async def get_challenge_leaderboard(
+    challenge_id: int,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    board: Leaderboard = Depends(get_leaderboard),
+    db: AsyncSession = Depends(get_db)
+):
+    return await top(board, db, offset, limit, challenge_id)
+
+@router.get("/challenges/{challenge_id}/users/{user_id}")
+async def get_challenge_user_rank(
+    challenge_id: int,
+    user_id: int,
+    window: int = Query(5, ge=0, le=50),
+    board: Leaderboard = Depends(get_leaderboard),
+    db: AsyncSession = Depends(get_db)
+):
+    return await around(board, db, user_id, window, challenge_id)
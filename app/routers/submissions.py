@@ -1,68 +1,174 @@
-from fastapi import APIRouter, HTTPException
+import asyncio
+import json
+import time
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from pymongo import MongoClient
-import requests, time, os
+from typing import AsyncIterator, Literal, Optional
 from bson.objectid import ObjectId
+from bson.errors import InvalidId
 
-router = APIRouter()
-
-mongo_client = MongoClient("mongodb://localhost:27017")
-db = mongo_client["code_platform"]
-submissions = db["submissions"]
+from core.config import settings
+from core.security import CurrentUser, get_current_user
+from services.admission import AdmissionControl, client_ip, get_admission_control
+from database.submissions import SubmissionRepository, get_submission_repository
+from services.pubsub import PubSub, Subscription, get_pubsub
+from services.submission_queue import SubmissionQueue, get_submission_queue, priority_class
+from services.submission_worker import ACTIVE_STATUSES, SUBMISSION_CHANNEL, USER_CHANNEL
 
-JUDGE0_URL = "https://judge0-ce.p.rapidapi.com/submissions"
-JUDGE0_HEADERS = {
-    "X-RapidAPI-Host": "judge0-ce.p.rapidapi.com",
-    "X-RapidAPI-Key": os.environ.get("RAPIDAPI_KEY"),
-    "Content-Type": "application/json"
-}
+router = APIRouter()
 
 class SubmissionModel(BaseModel):
-    user_id: int
     challenge_id: int
     language_id: int  # e.g., 71 for Python 3
     source_code: str
     stdin: str = ""
+    # "run" executes once against stdin, "submit" judges against all test cases
+    mode: Literal["run", "submit"] = "run"
 
-@router.post("/")
-def submit_code(data: SubmissionModel):
-    judge_payload = {
-        "source_code": data.source_code,
+def parse_submission_id(submission_id: str) -> ObjectId:
+    try:
+        return ObjectId(submission_id)
+    except InvalidId:
+        raise HTTPException(status_code=404, detail="Submission not found")
+
+# Users only see their own submissions; admins see all of them
+def owner_filter(user: CurrentUser):
+    return None if user.is_admin else user.id
+
+# Proxies must pass events through as they come
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+def sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Status events of `subscription` as server-sent events, after `first` if given, with a comment
+# as heartbeat when none came for SSE_HEARTBEAT_SECONDS. With `until_final` the stream ends after a
+# final status. Closes the subscription when done or when the client goes away.
+async def stream_events(subscription: Subscription, first: Optional[dict] = None,
+                        until_final: bool = False) -> AsyncIterator[str]:
+    with subscription:
+        if first is not None:
+            yield sse("status", first)
+            if until_final and first.get("status") not in ACTIVE_STATUSES:
+                return
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), settings.SSE_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keep-alive\n\n"
+                continue
+            yield sse("status", event)
+            if until_final and event.get("status") not in ACTIVE_STATUSES:
+                return
+
+# Persist the submission as Pending and hand it to the evaluation workers. Rate limited
+# per user and per IP; answers 429 while the backlog of queued and running jobs is full.
+@router.post("/", status_code=202)
+async def submit_code(
+    data: SubmissionModel,
+    request: Request,
+    user: CurrentUser = Depends(get_current_user),
+    submissions: SubmissionRepository = Depends(get_submission_repository),
+    queue: SubmissionQueue = Depends(get_submission_queue),
+    admission: AdmissionControl = Depends(get_admission_control)
+):
+    await admission.limit([
+        (f"submit:user:{user.id}", settings.SUBMIT_RATE_PER_USER, settings.SUBMIT_BURST_PER_USER),
+        (f"submit:ip:{client_ip(request)}", settings.SUBMIT_RATE_PER_IP, settings.SUBMIT_BURST_PER_IP),
+    ])
+    await admission.check_backlog()
+
+    submission_data = {
+        "user_id": user.id,
+        "challenge_id": data.challenge_id,
         "language_id": data.language_id,
-        "stdin": data.stdin
+        "source_code": data.source_code,
+        "stdin": data.stdin,
+        "mode": data.mode,
+        "status": "Pending"
     }
-    judge_res = requests.post(JUDGE0_URL + "?base64_encoded=false&wait=false",
-                              headers=JUDGE0_HEADERS, json=judge_payload)
-    if judge_res.status_code != 201:
-        raise HTTPException(status_code=500, detail="Judge0 submission failed")
-
-    token = judge_res.json().get("token")
-    result = None
-    for _ in range(10):
-        res = requests.get(f"{JUDGE0_URL}/{token}?base64_encoded=false", headers=JUDGE0_HEADERS)
-        if res.json().get("status", {}).get("id") in [1, 2]:  # In queue or processing
-            time.sleep(2)
-        else:
-            result = res.json()
-            break
+    inserted_id = await submissions.insert(submission_data)
+    submission_id = str(inserted_id)
 
-    submission_data = {
-        "user_id": data.user_id,
+    job = {
+        "submission_id": submission_id,
+        "user_id": user.id,
         "challenge_id": data.challenge_id,
         "language_id": data.language_id,
         "source_code": data.source_code,
         "stdin": data.stdin,
-        "status": result.get("status"),
-        "stdout": result.get("stdout"),
-        "stderr": result.get("stderr"),
-        "created_at": time.time()
+        "mode": data.mode
     }
-    insert_result = submissions.insert_one(submission_data)
-    return {"submission_id": str(insert_result.inserted_id), "result": result}
+    # Custom stdin runs are scheduled ahead of graded submissions
+    job["priority"] = priority_class(job)
+    job["enqueued_at"] = time.time()
+    # Counted before it is published, so a fast worker never finishes it before it is counted
+    await admission.enqueued(submission_id)
+    try:
+        await queue.put(job)
+    except Exception as e:
+        await admission.finished(submission_id)
+        await submissions.update(
+            inserted_id, {"status": "Internal Error", "error": f"Failed to enqueue: {str(e)}"}
+        )
+        raise HTTPException(status_code=503, detail="Submission queue unavailable")
+
+    return {"submission_id": submission_id, "status": "Pending"}
+
+# Server-sent events with the status changes of all of the user's submissions, as long as the client stays connected
+@router.get("/events")
+async def follow_submissions(
+    user: CurrentUser = Depends(get_current_user),
+    pubsub: PubSub = Depends(get_pubsub)
+):
+    subscription = pubsub.subscribe(USER_CHANNEL.format(user.id))
+    return StreamingResponse(stream_events(subscription), media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Server-sent events with the status of a submission: its current one, then every change until
+# the verdict, after which the stream ends. Replaces polling GET /submissions/{id}/status.
+@router.get("/{submission_id}/events")
+async def follow_submission(
+    submission_id: str,
+    user: CurrentUser = Depends(get_current_user),
+    submissions: SubmissionRepository = Depends(get_submission_repository),
+    pubsub: PubSub = Depends(get_pubsub)
+):
+    object_id = parse_submission_id(submission_id)
+    # Subscribed before reading the status, so a change in between is not missed
+    subscription = pubsub.subscribe(SUBMISSION_CHANNEL.format(object_id))
+    try:
+        result = await submissions.get_status(object_id, owner_filter(user))
+    except Exception:
+        subscription.close()
+        raise
+    if not result:
+        subscription.close()
+        raise HTTPException(status_code=404, detail="Submission not found")
+    result["submission_id"] = str(result.pop("_id"))
+    return StreamingResponse(stream_events(subscription, result, until_final=True),
+                             media_type="text/event-stream", headers=SSE_HEADERS)
+
+# Poll the evaluation state of a submission
+@router.get("/{submission_id}/status")
+async def get_submission_status(
+    submission_id: str,
+    user: CurrentUser = Depends(get_current_user),
+    submissions: SubmissionRepository = Depends(get_submission_repository)
+):
+    result = await submissions.get_status(parse_submission_id(submission_id), owner_filter(user))
+    if not result:
+        raise HTTPException(status_code=404, detail="Submission not found")
+    result["submission_id"] = str(result.pop("_id"))
+    return result
 
 @router.get("/{submission_id}")
-def get_submission(submission_id: str):
-    result = submissions.find_one({"_id": ObjectId(submission_id)})
+async def get_submission(
+    submission_id: str,
+    user: CurrentUser = Depends(get_current_user),
+    submissions: SubmissionRepository = Depends(get_submission_repository)
+):
+    result = await submissions.get(parse_submission_id(submission_id), user_id=owner_filter(user))
     if not result:
         raise HTTPException(status_code=404, detail="Submission not found")
     result["_id"] = str(result["_id"])
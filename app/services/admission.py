@@ -0,0 +1,299 @@
+# Admission control for code execution: token-bucket rate limits (per user and per IP on
+# submit and login), load shedding once the submission backlog passes a depth, and a
+# global cap on concurrent executions. The state lives in a LimiterStore: "memory" for a
+# single node, "mongo" when several API/worker processes must share it (required with
+# the kafka queue, whose workers run in other processes).
+#
+# The backlog is a set of submission ids with an expiry rather than a counter: a job whose
+# process died between queueing and finishing stops counting once its entry expires, and a
+# job finished twice (redelivered) is only taken off once.
+import asyncio
+import os
+import socket
+import time
+import uuid
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, Optional, Tuple
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from core import metrics
+from core.config import settings
+
+BACKLOG_KEY = "submissions:backlog"
+EXECUTION_SLOTS = "executions"
+
+# (bucket key, tokens per second, burst); a rate of 0 or less disables the rule
+Rule = Tuple[str, float, float]
+
+
+class RateLimited(Exception):
+    def __init__(self, retry_after: float, detail: str = "Too many requests"):
+        super().__init__(detail)
+        self.retry_after = retry_after
+        self.detail = detail
+
+
+class LimiterStore(ABC):
+    # Take one token from the bucket; returns 0 if it was taken, else seconds until one is available
+    @abstractmethod
+    async def take(self, key: str, rate: float, burst: float) -> float:
+        ...
+
+    # Add `member` to the set `key` until `ttl` seconds from now (again: extend it)
+    @abstractmethod
+    async def add_entry(self, key: str, member: str, ttl: float) -> None:
+        ...
+
+    @abstractmethod
+    async def remove_entry(self, key: str, member: str) -> None:
+        ...
+
+    # Members of `key` that have not expired
+    @abstractmethod
+    async def count_entries(self, key: str) -> int:
+        ...
+
+    # Claim one of `limit` slots of `name` for `lease` seconds; False if all are held
+    @abstractmethod
+    async def acquire_slot(self, name: str, limit: int, holder: str, lease: float) -> bool:
+        ...
+
+    @abstractmethod
+    async def release_slot(self, name: str, holder: str) -> None:
+        ...
+
+    async def create_indexes(self):
+        pass
+
+
+def _refill(tokens: float, updated: float, now: float, rate: float, burst: float) -> float:
+    return min(burst, tokens + max(now - updated, 0.0) * rate)
+
+
+class MemoryLimiterStore(LimiterStore):
+    def __init__(self, max_buckets: int = 100000):
+        self.max_buckets = max_buckets
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._entries: Dict[str, Dict[str, float]] = {}
+        self._slots: Dict[str, Dict[str, float]] = {}
+
+    async def take(self, key, rate, burst):
+        now = time.time()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = _refill(tokens, updated, now, rate, burst)
+        if tokens < 1:
+            self._buckets[key] = (tokens, now)
+            return (1 - tokens) / rate
+        self._buckets[key] = (tokens - 1, now)
+        self._buckets.move_to_end(key)
+        # Dropping the least recently used bucket only forgets a client that has been idle longest
+        while len(self._buckets) > self.max_buckets:
+            self._buckets.popitem(last=False)
+        return 0.0
+
+    async def add_entry(self, key, member, ttl):
+        self._entries.setdefault(key, {})[member] = time.time() + ttl
+
+    async def remove_entry(self, key, member):
+        self._entries.get(key, {}).pop(member, None)
+
+    async def count_entries(self, key):
+        now = time.time()
+        entries = self._entries.get(key, {})
+        for expired in [member for member, expires in entries.items() if expires <= now]:
+            del entries[expired]
+        return len(entries)
+
+    async def acquire_slot(self, name, limit, holder, lease):
+        now = time.time()
+        slots = self._slots.setdefault(name, {})
+        for expired in [h for h, expires in slots.items() if expires <= now]:
+            del slots[expired]
+        if len(slots) >= limit:
+            return False
+        slots[holder] = now + lease
+        return True
+
+    async def release_slot(self, name, holder):
+        self._slots.get(name, {}).pop(holder, None)
+
+
+# Shared state in three Motor collections. Buckets are updated with compare-and-set, so
+# concurrent requests for one key never both spend the same token; a request that keeps
+# losing the race is rate limited rather than let through.
+class MongoLimiterStore(LimiterStore):
+    CAS_ATTEMPTS = 5
+
+    def __init__(self, buckets, entries, slots):
+        self.buckets = buckets
+        self.entries = entries
+        self.slots = slots
+        self._slot_docs = set()
+
+    async def create_indexes(self):
+        # Idle buckets are removed by Mongo once they would be full again anyway
+        await self.buckets.create_index("expires_at", expireAfterSeconds=0)
+        # Mongo deletes expired entries about once a minute; counts skip them before that
+        await self.entries.create_index("expires_at", expireAfterSeconds=0)
+        await self.entries.create_index([("key", 1), ("expires_at", 1)])
+
+    async def take(self, key, rate, burst):
+        for _ in range(self.CAS_ATTEMPTS):
+            now = time.time()
+            expires_at = datetime.utcnow() + timedelta(seconds=burst / rate)
+            doc = await self.buckets.find_one({"_id": key})
+            if doc is None:
+                try:
+                    await self.buckets.insert_one({"_id": key, "tokens": burst - 1, "updated": now, "expires_at": expires_at})
+                    return 0.0
+                except DuplicateKeyError:
+                    continue
+            tokens = _refill(doc["tokens"], doc["updated"], now, rate, burst)
+            if tokens < 1:
+                return (1 - tokens) / rate
+            result = await self.buckets.update_one(
+                {"_id": key, "tokens": doc["tokens"], "updated": doc["updated"]},
+                {"$set": {"tokens": tokens - 1, "updated": now, "expires_at": expires_at}}
+            )
+            if result.modified_count == 1:
+                return 0.0
+        # Every attempt lost to a concurrent request for the same key, which is itself a burst:
+        # fail closed and ask for the time one token takes to refill
+        return 1 / rate
+
+    async def add_entry(self, key, member, ttl):
+        await self.entries.update_one(
+            {"_id": f"{key}:{member}"},
+            {"$set": {"key": key, "expires_at": datetime.utcnow() + timedelta(seconds=ttl)}},
+            upsert=True
+        )
+
+    async def remove_entry(self, key, member):
+        await self.entries.delete_one({"_id": f"{key}:{member}"})
+
+    async def count_entries(self, key):
+        return await self.entries.count_documents({"key": key, "expires_at": {"$gt": datetime.utcnow()}})
+
+    async def _ensure_slots(self, name: str, limit: int):
+        if (name, limit) in self._slot_docs:
+            return
+        try:
+            await self.slots.insert_many([{"_id": f"{name}:{i}", "holder": None} for i in range(limit)], ordered=False)
+        except BulkWriteError:
+            pass  # slots created by another process
+        self._slot_docs.add((name, limit))
+
+    async def acquire_slot(self, name, limit, holder, lease):
+        await self._ensure_slots(name, limit)
+        now = time.time()
+        # A slot whose lease ran out belonged to a process that died mid-execution
+        doc = await self.slots.find_one_and_update(
+            {"_id": {"$in": [f"{name}:{i}" for i in range(limit)]},
+             "$or": [{"holder": None}, {"expires": {"$lt": now}}]},
+            {"$set": {"holder": holder, "expires": now + lease}}
+        )
+        return doc is not None
+
+    async def release_slot(self, name, holder):
+        await self.slots.update_one({"holder": holder}, {"$set": {"holder": None}})
+
+
+class AdmissionControl:
+    def __init__(self, store: LimiterStore, max_backlog: int = 0, max_executions: int = 0,
+                 slot_lease: float = 300.0, shed_retry_after: float = 5.0, backlog_ttl: float = 3600.0):
+        self.store = store
+        self.max_backlog = max_backlog
+        self.backlog_ttl = backlog_ttl
+        self.max_executions = max_executions
+        self.slot_lease = slot_lease
+        self.shed_retry_after = shed_retry_after
+        self._holder_prefix = f"{socket.gethostname()}:{os.getpid()}"
+        self.counters = {"rate_limited": 0, "shed": 0, "slot_waits": 0}
+        self.executing = 0  # slots held by this process
+
+    async def stats(self) -> dict:
+        return {**self.counters, "backlog": await self.store.count_entries(BACKLOG_KEY), "max_backlog": self.max_backlog,
+                "max_executions": self.max_executions, "executing": self.executing}
+
+    # Spend a token from every bucket; RateLimited with the longest wait if any is empty
+    async def limit(self, rules: Iterable[Rule]):
+        retry_after = 0.0
+        for key, rate, burst in rules:
+            if rate > 0:
+                retry_after = max(retry_after, await self.store.take(key, rate, burst))
+        if retry_after > 0:
+            self.counters["rate_limited"] += 1
+            raise RateLimited(retry_after)
+
+    # Shed new submissions while the backlog (queued and running jobs) is at its limit
+    async def check_backlog(self):
+        if self.max_backlog > 0 and await self.store.count_entries(BACKLOG_KEY) >= self.max_backlog:
+            self.counters["shed"] += 1
+            raise RateLimited(self.shed_retry_after, "Submission queue is full, try again shortly")
+
+    async def enqueued(self, submission_id: str):
+        await self.store.add_entry(BACKLOG_KEY, submission_id, self.backlog_ttl)
+
+    async def finished(self, submission_id: str):
+        await self.store.remove_entry(BACKLOG_KEY, submission_id)
+
+    # Hold one of the max_executions slots shared by every worker for the duration of the block
+    @asynccontextmanager
+    async def execution_slot(self):
+        holder = None
+        if self.max_executions > 0:
+            holder = f"{self._holder_prefix}:{uuid.uuid4().hex}"
+            delay = 0.01
+            with metrics.span("execution.slot_wait"):
+                while not await self.store.acquire_slot(EXECUTION_SLOTS, self.max_executions, holder, self.slot_lease):
+                    self.counters["slot_waits"] += 1
+                    await asyncio.sleep(delay)
+                    delay = min(delay * 2, 1.0)
+        self.executing += 1
+        try:
+            yield
+        finally:
+            self.executing -= 1
+            if holder is not None:
+                await self.store.release_slot(EXECUTION_SLOTS, holder)
+
+
+# Client address for per-IP limits; X-Forwarded-For is only trusted behind a known proxy
+def client_ip(request) -> str:
+    if settings.TRUST_FORWARDED_FOR:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+
+def create_limiter_store(backend: str = None) -> LimiterStore:
+    backend = backend or settings.ADMISSION_BACKEND
+    if backend == "memory":
+        if settings.SUBMISSION_QUEUE_BACKEND == "kafka":
+            raise ValueError("ADMISSION_BACKEND=mongo is required with SUBMISSION_QUEUE_BACKEND=kafka")
+        return MemoryLimiterStore()
+    if backend == "mongo":
+        from database.mongodb import get_mongo_db
+        db = get_mongo_db()
+        return MongoLimiterStore(db["rate_limit_buckets"], db["admission_backlog"], db["execution_slots"])
+    raise ValueError(f"Unknown ADMISSION_BACKEND: {backend}")
+
+
+_admission: Optional[AdmissionControl] = None
+
+
+# Process-wide admission control configured by the ADMISSION_* / rate limit settings
+def get_admission_control() -> AdmissionControl:
+    global _admission
+    if _admission is None:
+        _admission = AdmissionControl(
+            create_limiter_store(), settings.SUBMISSION_MAX_BACKLOG, settings.EXECUTION_MAX_CONCURRENCY,
+            settings.EXECUTION_SLOT_LEASE_SECONDS, settings.SUBMISSION_SHED_RETRY_AFTER,
+            settings.SUBMISSION_BACKLOG_TTL
+        )
+    return _admission
@@ -0,0 +1,240 @@
+# Submission analytics kept as incremental rollups instead of scanning `submissions`.
+# Every graded submission that reaches a final verdict increments four rollup documents:
+# (challenge, language, hour), (challenge, language, all time) and the same two across
+# all languages (language_id None). A rollup holds attempts, accepted, counts per status
+# id, distinct users and time/memory histograms, so reads touch a handful of small
+# documents no matter how many submissions there are. rebuild_rollups() recomputes
+# everything from the raw submissions with aggregation pipelines (see backfill_analytics.py).
+import logging
+import time
+from typing import Dict, List, Optional
+
+from pymongo.errors import DuplicateKeyError
+
+logger = logging.getLogger(__name__)
+
+BUCKET_SECONDS = 3600
+STATUS_ACCEPTED = 3
+STATUS_INTERNAL_ERROR = 13
+
+# Histogram upper bounds; values above the last bound go to "gt_<last>"
+TIME_BOUNDS_MS = (10, 50, 100, 250, 500, 1000, 2000, 5000)
+MEMORY_BOUNDS_KB = (4096, 16384, 65536, 131072, 262144, 524288)
+
+
+def _label(value: float, bounds, unit: str) -> str:
+    for bound in bounds:
+        if value <= bound:
+            return f"le_{bound}{unit}"
+    return f"gt_{bounds[-1]}{unit}"
+
+
+def time_label(seconds) -> str:
+    try:
+        value = float(seconds or 0) * 1000
+    except (TypeError, ValueError):
+        value = 0.0
+    return _label(value, TIME_BOUNDS_MS, "ms")
+
+
+def memory_label(kb) -> str:
+    return _label(kb or 0, MEMORY_BOUNDS_KB, "kb")
+
+
+def bucket_start(timestamp: float) -> int:
+    return int(timestamp - timestamp % BUCKET_SECONDS)
+
+
+# The rollups a submission counts towards; bucket/language_id None mean "all"
+def rollup_ids(challenge_id: int, language_id: int, bucket: int) -> List[dict]:
+    return [
+        {"challenge_id": challenge_id, "language_id": lang, "bucket": b}
+        for lang in (language_id, None) for b in (bucket, None)
+    ]
+
+
+# The $inc one final verdict adds to each of its rollups
+def verdict_counts(status_id: Optional[int], run_time, memory) -> Dict[str, int]:
+    status_id = status_id or STATUS_INTERNAL_ERROR
+    return {
+        "attempts": 1,
+        "accepted": 1 if status_id == STATUS_ACCEPTED else 0,
+        f"statuses.{status_id}": 1,
+        f"time_ms.{time_label(run_time)}": 1,
+        f"memory_kb.{memory_label(memory)}": 1,
+    }
+
+
+def _public(doc: dict) -> dict:
+    doc = dict(doc)
+    doc.pop("_id", None)
+    return doc
+
+
+class SubmissionAnalytics:
+    def __init__(self, rollups, seen_users):
+        self.rollups = rollups
+        # One document per (rollup, user) pair; a successful insert means a new distinct user
+        self.seen_users = seen_users
+
+    async def create_indexes(self):
+        await self.rollups.create_index([("challenge_id", 1), ("language_id", 1), ("bucket", 1)])
+
+    async def _is_new_user(self, rollup_id: dict, user_id) -> bool:
+        try:
+            result = await self.seen_users.update_one(
+                {"_id": {"rollup": rollup_id, "user_id": user_id}}, {"$setOnInsert": {"at": time.time()}}, upsert=True
+            )
+        except DuplicateKeyError:
+            return False
+        return result.upserted_id is not None
+
+    # Count one final verdict. Each rollup document is updated with a single atomic $inc.
+    async def record(self, challenge_id: int, language_id: int, user_id, status_id: Optional[int],
+                     run_time, memory, finished_at: float):
+        inc = verdict_counts(status_id, run_time, memory)
+        for rollup_id in rollup_ids(challenge_id, language_id, bucket_start(finished_at)):
+            users = 1 if await self._is_new_user(rollup_id, user_id) else 0
+            await self.rollups.update_one(
+                {"_id": rollup_id},
+                {"$inc": {**inc, "users": users}, "$setOnInsert": rollup_id},
+                upsert=True
+            )
+
+    # Replace a counted verdict of a submission with its new one, e.g. after a rejudge. Both are
+    # counted at the same finished_at, so each rollup gets one $inc of the differences; attempts
+    # and distinct users stay as they are.
+    async def revise(self, challenge_id: int, language_id: int, old: dict, new: dict, finished_at: float):
+        inc = verdict_counts(new.get("status_id"), new.get("time"), new.get("memory"))
+        for field, count in verdict_counts(old.get("status_id"), old.get("time"), old.get("memory")).items():
+            inc[field] = inc.get(field, 0) - count
+        inc = {field: count for field, count in inc.items() if count}
+        if not inc:
+            return
+        for rollup_id in rollup_ids(challenge_id, language_id, bucket_start(finished_at)):
+            await self.rollups.update_one({"_id": rollup_id}, {"$inc": inc})
+
+    # All-time totals of every challenge across languages
+    async def challenges(self) -> List[dict]:
+        cursor = self.rollups.find({"language_id": None, "bucket": None}).sort("challenge_id", 1)
+        return [_public(doc) async for doc in cursor]
+
+    # All-time totals of one challenge, per language, and its hourly series for the last `hours`
+    async def challenge(self, challenge_id: int, hours: int = 24) -> dict:
+        since = bucket_start(time.time()) - (hours - 1) * BUCKET_SECONDS
+        total = await self.rollups.find_one({"_id": {"challenge_id": challenge_id, "language_id": None, "bucket": None}})
+        by_language = self.rollups.find(
+            {"challenge_id": challenge_id, "language_id": {"$ne": None}, "bucket": None}
+        ).sort("language_id", 1)
+        hourly = self.rollups.find(
+            {"challenge_id": challenge_id, "language_id": None, "bucket": {"$gte": since}}
+        ).sort("bucket", 1)
+        return {
+            "challenge_id": challenge_id,
+            "total": _public(total) if total else None,
+            "by_language": [_public(doc) async for doc in by_language],
+            "hourly": [_public(doc) async for doc in hourly],
+        }
+
+
+# ------------ BACKFILL ------------
+
+# Graded submissions with a final verdict
+FINAL_MATCH = {"mode": "submit", "finished_at": {"$exists": True}}
+
+
+def _key_expression(per_language: bool, per_bucket: bool) -> dict:
+    return {
+        "challenge_id": "$challenge_id",
+        "language_id": "$language_id" if per_language else None,
+        "bucket": {"$subtract": ["$finished_at", {"$mod": ["$finished_at", BUCKET_SECONDS]}]} if per_bucket else None,
+    }
+
+
+def _memory_switch() -> dict:
+    memory = {"$ifNull": ["$memory", 0]}
+    branches = [{"case": {"$lte": [memory, bound]}, "then": f"le_{bound}kb"} for bound in MEMORY_BOUNDS_KB]
+    return {"$switch": {"branches": branches, "default": f"gt_{MEMORY_BOUNDS_KB[-1]}kb"}}
+
+
+def _normalize(key: dict) -> dict:
+    bucket = key["bucket"]
+    return {"challenge_id": key["challenge_id"], "language_id": key["language_id"],
+            "bucket": int(bucket) if bucket is not None else None}
+
+
+# Recompute every rollup from the raw submissions. Grouping runs in Mongo; only one row
+# per rollup and status/histogram bin (or distinct user) comes back. Intended to run while
+# no workers are recording, since the old rollups are replaced wholesale.
+async def rebuild_rollups(submissions, analytics: SubmissionAnalytics, batch_size: int = 1000) -> dict:
+    docs: Dict[tuple, dict] = {}
+    seen = []
+
+    def doc_for(key: dict) -> dict:
+        key = _normalize(key)
+        ident = (key["challenge_id"], key["language_id"], key["bucket"])
+        if ident not in docs:
+            docs[ident] = {"_id": key, **key, "attempts": 0, "accepted": 0, "users": 0,
+                           "statuses": {}, "time_ms": {}, "memory_kb": {}}
+        return docs[ident]
+
+    for per_language in (True, False):
+        for per_bucket in (True, False):
+            key = _key_expression(per_language, per_bucket)
+            statuses = submissions.aggregate([
+                {"$match": FINAL_MATCH},
+                {"$group": {"_id": {"k": key, "s": {"$ifNull": ["$status_id", STATUS_INTERNAL_ERROR]}}, "n": {"$sum": 1}}},
+            ])
+            async for row in statuses:
+                doc = doc_for(row["_id"]["k"])
+                status_id = row["_id"]["s"]
+                doc["attempts"] += row["n"]
+                doc["accepted"] += row["n"] if status_id == STATUS_ACCEPTED else 0
+                doc["statuses"][str(status_id)] = row["n"]
+
+            memory = submissions.aggregate([
+                {"$match": FINAL_MATCH},
+                {"$group": {"_id": {"k": key, "m": _memory_switch()}, "n": {"$sum": 1}}},
+            ])
+            async for row in memory:
+                doc_for(row["_id"]["k"])["memory_kb"][row["_id"]["m"]] = row["n"]
+
+            # Judge0 reports time as a decimal string; distinct values are few enough to bin here
+            times = submissions.aggregate([
+                {"$match": FINAL_MATCH},
+                {"$group": {"_id": {"k": key, "t": "$time"}, "n": {"$sum": 1}}},
+            ])
+            async for row in times:
+                histogram = doc_for(row["_id"]["k"])["time_ms"]
+                label = time_label(row["_id"].get("t"))
+                histogram[label] = histogram.get(label, 0) + row["n"]
+
+            users = submissions.aggregate([
+                {"$match": FINAL_MATCH},
+                {"$group": {"_id": {"k": key, "u": "$user_id"}}},
+            ])
+            async for row in users:
+                doc = doc_for(row["_id"]["k"])
+                doc["users"] += 1
+                seen.append({"_id": {"rollup": doc["_id"], "user_id": row["_id"]["u"]}, "at": time.time()})
+
+    await analytics.rollups.delete_many({})
+    await analytics.seen_users.delete_many({})
+    rollups = list(docs.values())
+    for i in range(0, len(rollups), batch_size):
+        await analytics.rollups.insert_many(rollups[i:i + batch_size])
+    for i in range(0, len(seen), batch_size):
+        await analytics.seen_users.insert_many(seen[i:i + batch_size])
+    return {"rollups": len(rollups), "distinct_user_entries": len(seen)}
+
+
+_analytics: Optional[SubmissionAnalytics] = None
+
+
+def get_submission_analytics() -> SubmissionAnalytics:
+    global _analytics
+    if _analytics is None:
+        from database.mongodb import get_mongo_db
+        mongodb = get_mongo_db()
+        _analytics = SubmissionAnalytics(mongodb["submission_rollups"], mongodb["submission_rollup_users"])
+    return _analytics
@@ -0,0 +1,200 @@
+# Serialized challenge catalog payloads, cached in-process. Every entry is tagged with
+# the catalog version it was built under; admin changes bump the version, which makes
+# every process rebuild on its next request. With CATALOG_CACHE_BACKEND=mongo the
+# version lives in Mongo, so all uvicorn workers (and hosts) see a bump within
+# CATALOG_VERSION_CHECK_INTERVAL seconds; "local" is only coherent within one process.
+# Everything runs on the event loop: the shared counter is read and bumped through the
+# application's Motor client (core/db.py).
+import asyncio
+import hashlib
+import json
+import time
+from abc import ABC, abstractmethod
+from typing import Awaitable, Callable, Dict, Optional
+
+from fastapi import Response
+from fastapi.encoders import jsonable_encoder
+from pymongo import ReturnDocument
+
+from core.config import settings
+
+
+class CatalogVersion(ABC):
+    @abstractmethod
+    async def get(self) -> int:
+        ...
+
+    @abstractmethod
+    async def bump(self) -> int:
+        ...
+
+
+class LocalCatalogVersion(CatalogVersion):
+    def __init__(self):
+        self._version = 0
+
+    async def get(self):
+        return self._version
+
+    async def bump(self):
+        self._version += 1
+        return self._version
+
+
+# One counter document shared by every process; takes an async (Motor) collection
+class MongoCatalogVersion(CatalogVersion):
+    DOC_ID = "catalog"
+
+    def __init__(self, collection):
+        self.collection = collection
+
+    async def get(self):
+        doc = await self.collection.find_one({"_id": self.DOC_ID})
+        return doc["version"] if doc else 0
+
+    async def bump(self):
+        doc = await self.collection.find_one_and_update(
+            {"_id": self.DOC_ID}, {"$inc": {"version": 1}}, upsert=True, return_document=ReturnDocument.AFTER
+        )
+        return doc["version"]
+
+
+# What a build function returns when the response needs extra headers besides the body
+class Payload:
+    def __init__(self, content, headers: Optional[dict] = None):
+        self.content = content
+        self.headers = headers or {}
+
+
+class CachedPayload:
+    def __init__(self, version: int, body: bytes, headers: Optional[dict] = None):
+        self.version = version
+        self.body = body
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses the weak comparison, so W/"x" matches "x"
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+class CatalogCache:
+    def __init__(self, version: CatalogVersion, check_interval: float = 1.0, max_entries: int = 1000):
+        self.counter = version
+        self.check_interval = check_interval
+        self.max_entries = max_entries
+        self._entries: Dict[str, CachedPayload] = {}
+        self._version = None
+        self._checked_at = 0.0
+        # Builds in progress on the event loop; concurrent misses of a key wait for the same one
+        self._building: Dict[tuple, asyncio.Future] = {}
+        self.counters = {"hits": 0, "misses": 0, "coalesced": 0, "not_modified": 0, "invalidations": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries), "version": self._version}
+
+    def _stale(self) -> bool:
+        return self._version is None or time.monotonic() - self._checked_at >= self.check_interval
+
+    # Current catalog version, re-read from the counter at most once per check_interval
+    async def version(self) -> int:
+        if self._stale():
+            self._version = await self.counter.get()
+            self._checked_at = time.monotonic()
+        return self._version
+
+    # Called by admin endpoints after their change is committed
+    async def invalidate(self):
+        version = await self.counter.bump()
+        self._entries.clear()
+        self._version = version
+        self._checked_at = time.monotonic()
+        self.counters["invalidations"] += 1
+
+    # Cached payload for `key`, built from the coroutine `build()` (any jsonable value, or a
+    # Payload) when missing or stale. Concurrent misses of one key (e.g. right after an
+    # invalidation) share a single build.
+    async def get(self, key: str, build: Callable[[], Awaitable[object]]) -> CachedPayload:
+        version = await self.version()
+        entry = self._lookup(key, version)
+        if entry is not None:
+            return entry
+        pending = self._building.get((key, version))
+        if pending is not None:
+            self.counters["coalesced"] += 1
+            return await asyncio.shield(pending)
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._building[(key, version)] = future
+        try:
+            entry = self._store(key, version, await build())
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # waiters re-raise it; nothing else needs to retrieve it
+            raise
+        else:
+            future.set_result(entry)
+            return entry
+        finally:
+            del self._building[(key, version)]
+
+    def _lookup(self, key: str, version: int) -> Optional[CachedPayload]:
+        entry = self._entries.get(key)
+        if entry is not None and entry.version == version:
+            self.counters["hits"] += 1
+            return entry
+        return None
+
+    def _store(self, key: str, version: int, value) -> CachedPayload:
+        payload = value if isinstance(value, Payload) else Payload(value)
+        body = json.dumps(jsonable_encoder(payload.content), separators=(",", ":")).encode("utf-8")
+        entry = CachedPayload(version, body, payload.headers)
+        self._entries[key] = entry
+        # Pages are keyed by their query parameters; drop the oldest beyond the bound
+        while len(self._entries) > self.max_entries:
+            del self._entries[next(iter(self._entries))]
+        return entry
+
+    # 304 when the client already has this payload, else the pre-serialized body
+    async def response(self, key: str, build: Callable[[], Awaitable[object]],
+                       if_none_match: Optional[str] = None) -> Response:
+        entry = await self.get(key, build)
+        headers = {**entry.headers, "ETag": entry.etag, "Cache-Control": "no-cache"}
+        if etag_matches(if_none_match, entry.etag):
+            self.counters["not_modified"] += 1
+            return Response(status_code=304, headers=headers)
+        return Response(content=entry.body, media_type="application/json", headers=headers)
+
+    def clear(self):
+        self._entries.clear()
+        self._version = None
+
+
+_cache: Optional[CatalogCache] = None
+
+
+def create_catalog_version(backend: str = None) -> CatalogVersion:
+    backend = backend or settings.CATALOG_CACHE_BACKEND
+    if backend == "local":
+        return LocalCatalogVersion()
+    if backend == "mongo":
+        from database.mongodb import get_mongo_db
+        return MongoCatalogVersion(get_mongo_db()["catalog_version"])
+    raise ValueError(f"Unknown CATALOG_CACHE_BACKEND: {backend}")
+
+
+def get_catalog_cache() -> CatalogCache:
+    global _cache
+    if _cache is None:
+        _cache = CatalogCache(create_catalog_version(), settings.CATALOG_VERSION_CHECK_INTERVAL,
+                              settings.CATALOG_CACHE_MAX_ENTRIES)
+    return _cache
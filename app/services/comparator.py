@@ -0,0 +1,188 @@
+# Compares a program's output with the expected output while streaming both sides in
+# chunks, so outputs of any size are compared in constant memory (except "line_set").
+# The first difference ends the comparison and is reported with its position.
+#
+# Modes, set per challenge (Challenge.compare_mode):
+#   exact       byte for byte, except for trailing whitespace at the very end
+#   whitespace  the same whitespace-separated tokens; how they are spaced or split into lines does not matter
+#   float       like whitespace, but numbers match within Challenge.float_tolerance (absolute or relative)
+#   line_set    the same lines in any order (duplicates count); trailing spaces and blank lines are ignored.
+#               Keeps the expected lines in memory.
+import io
+import math
+from collections import Counter
+from typing import BinaryIO, Callable, Iterator, List, Optional
+
+MODES = ("exact", "whitespace", "float", "line_set")
+DEFAULT_FLOAT_TOLERANCE = 1e-6
+CHUNK_SIZE = 1024 * 1024
+# Bytes of each side shown around a difference
+SNIPPET_BYTES = 40
+
+
+def _snippet(data: Optional[bytes]) -> Optional[str]:
+    if data is None:
+        return None
+    return data[:SNIPPET_BYTES].split(b"\n", 1)[0].decode("utf-8", errors="replace")
+
+
+# True if `buffer` and everything left in `stream` is whitespace
+def _rest_is_space(buffer: bytes, stream: BinaryIO, chunk_size: int) -> bool:
+    while True:
+        if buffer and not buffer.isspace():
+            return False
+        buffer = stream.read(chunk_size)
+        if not buffer:
+            return True
+
+
+# Index of the first differing byte of a[:n] and b[:n], which are known to differ
+def _first_difference(a: bytes, b: bytes, n: int) -> int:
+    lo, hi = 0, n
+    while hi - lo > 64:
+        mid = (lo + hi) // 2
+        if a[lo:mid] == b[lo:mid]:
+            lo = mid
+        else:
+            hi = mid
+    while a[lo] == b[lo]:
+        lo += 1
+    return lo
+
+
+def _exact(actual: BinaryIO, expected: BinaryIO, chunk_size: int) -> Optional[dict]:
+    offset, line, line_start = 0, 1, 0
+    a, b = actual.read(chunk_size), expected.read(chunk_size)
+    while a and b:
+        n = min(len(a), len(b))
+        if a[:n] != b[:n]:
+            n = _first_difference(a, b, n)
+            break
+        line += a.count(b"\n", 0, n)
+        last_newline = a.rfind(b"\n", 0, n)
+        if last_newline >= 0:
+            line_start = offset + last_newline + 1
+        offset += n
+        a = a[n:] or actual.read(chunk_size)
+        b = b[n:] or expected.read(chunk_size)
+    else:
+        n = 0
+    # The remainders differ (or one side ended); fine if both are only trailing whitespace
+    a_rest, b_rest = a[n:], b[n:]
+    if _rest_is_space(a_rest, actual, chunk_size) and _rest_is_space(b_rest, expected, chunk_size):
+        return None
+    line += a.count(b"\n", 0, n)
+    last_newline = a.rfind(b"\n", 0, n)
+    if last_newline >= 0:
+        line_start = offset + last_newline + 1
+    offset += n
+    return {"mode": "exact", "offset": offset, "line": line, "column": offset - line_start + 1,
+            "expected": _snippet(b_rest or None), "actual": _snippet(a_rest or None)}
+
+
+# Lists of whitespace-separated tokens, one per chunk read; a token split by a chunk
+# boundary is carried over to the next list
+def _tokens(stream: BinaryIO, chunk_size: int) -> Iterator[List[bytes]]:
+    carry = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            if carry:
+                yield [carry]
+            return
+        data = carry + chunk
+        tokens = data.split()
+        carry = tokens.pop() if tokens and not data[-1:].isspace() else b""
+        if tokens:
+            yield tokens
+
+
+def _numbers_match(tolerance: float) -> Callable[[bytes, bytes], bool]:
+    def match(actual: bytes, expected: bytes) -> bool:
+        try:
+            return math.isclose(float(actual), float(expected), rel_tol=tolerance, abs_tol=tolerance)
+        except ValueError:
+            return False
+    return match
+
+
+# Token by token; whole runs of tokens are compared at once and only walked on a difference
+def _by_token(actual: BinaryIO, expected: BinaryIO, chunk_size: int, mode: str,
+              also_equal: Optional[Callable[[bytes, bytes], bool]] = None) -> Optional[dict]:
+    a_lists, b_lists = _tokens(actual, chunk_size), _tokens(expected, chunk_size)
+    a, b, ai, bi, index = [], [], 0, 0, 0
+    while True:
+        if ai == len(a):
+            a, ai = next(a_lists, []), 0
+        if bi == len(b):
+            b, bi = next(b_lists, []), 0
+        if not a or not b:
+            if not a and not b:
+                return None
+            return {"mode": mode, "token": index + 1, "expected": _snippet(b[bi] if b else None),
+                    "actual": _snippet(a[ai] if a else None)}
+        n = min(len(a) - ai, len(b) - bi)
+        if a[ai:ai + n] != b[bi:bi + n]:
+            for j in range(n):
+                x, y = a[ai + j], b[bi + j]
+                if x != y and not (also_equal and also_equal(x, y)):
+                    return {"mode": mode, "token": index + j + 1, "expected": _snippet(y), "actual": _snippet(x)}
+        ai, bi, index = ai + n, bi + n, index + n
+
+
+def _lines(stream: BinaryIO, chunk_size: int) -> Iterator[bytes]:
+    carry = b""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        lines = (carry + chunk).split(b"\n")
+        carry = lines.pop()
+        yield from lines
+    yield carry
+
+
+def _line_set(actual: BinaryIO, expected: BinaryIO, chunk_size: int) -> Optional[dict]:
+    remaining = Counter(line.rstrip() for line in _lines(expected, chunk_size))
+    remaining.pop(b"", None)
+    for number, line in enumerate(_lines(actual, chunk_size), 1):
+        line = line.rstrip()
+        if not line:
+            continue
+        if remaining[line] <= 0:
+            return {"mode": "line_set", "line": number, "expected": None, "actual": _snippet(line)}
+        remaining[line] -= 1
+    missing = next((line for line, count in remaining.items() if count > 0), None)
+    if missing is not None:
+        return {"mode": "line_set", "line": None, "expected": _snippet(missing), "actual": None}
+    return None
+
+
+# None if `actual` matches `expected` (binary streams) under `mode`, else the first difference:
+# {"mode", "expected", "actual"} snippets (None past the end of that side) plus its position,
+# "offset"/"line"/"column" for exact, "token" for whitespace/float and "line" for line_set
+def compare(actual: BinaryIO, expected: BinaryIO, mode: str = "exact", tolerance: Optional[float] = None,
+            chunk_size: int = CHUNK_SIZE) -> Optional[dict]:
+    if mode == "exact":
+        return _exact(actual, expected, chunk_size)
+    if mode == "whitespace":
+        return _by_token(actual, expected, chunk_size, mode)
+    if mode == "float":
+        tolerance = DEFAULT_FLOAT_TOLERANCE if tolerance is None else tolerance
+        return _by_token(actual, expected, chunk_size, mode, _numbers_match(tolerance))
+    if mode == "line_set":
+        return _line_set(actual, expected, chunk_size)
+    raise ValueError(f"Unknown compare mode: {mode}")
+
+
+# compare() for a run ({"expected_output" or "expected_output_path", "compare_mode", "float_tolerance"})
+# against the program's output, given as a file path or as text
+def compare_run(run: dict, stdout_path: Optional[str] = None, stdout: Optional[str] = None,
+                chunk_size: int = CHUNK_SIZE) -> Optional[dict]:
+    actual = open(stdout_path, "rb") if stdout_path else io.BytesIO((stdout or "").encode("utf-8"))
+    if run.get("expected_output_path"):
+        expected = open(run["expected_output_path"], "rb")
+    else:
+        expected = io.BytesIO((run.get("expected_output") or "").encode("utf-8"))
+    with actual, expected:
+        return compare(actual, expected, run.get("compare_mode") or "exact", run.get("float_tolerance"), chunk_size)
@@ -0,0 +1,170 @@
+# Execution backends behind the submission evaluator. Both return Judge0-shaped
+# results ({"status": {"id", "description"}, "stdout", "stderr", "time", "memory", ...})
+# so they can be swapped with EXECUTOR_BACKEND.
+import asyncio
+import logging
+import multiprocessing
+import os
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional
+
+from core.config import settings
+from services import judge0, local_runner
+from services.comparator import compare_run
+from services.judge0 import Judge0Client, get_judge0_client
+from services.testcase_store import read_text
+
+logger = logging.getLogger(__name__)
+
+
+class Executor(ABC):
+    # Run the program once per entry of `runs` and return the results in the same order.
+    # A run gives its input as "stdin" or as a file in "stdin_path", and optionally its
+    # expected output as "expected_output" or "expected_output_path", compared under its "compare_mode" (see
+    # services.comparator; "exact" by default) and "float_tolerance". `limits` holds the challenge's time_limit
+    # (seconds) and memory_limit (MB); missing values fall back to the backend's defaults.
+    @abstractmethod
+    async def execute(self, source_code: str, language_id: int, runs: List[dict],
+                      limits: Optional[dict] = None) -> List[dict]:
+        ...
+
+    async def close(self):
+        pass
+
+
+class Judge0Executor(Executor):
+    def __init__(self, client: Optional[Judge0Client] = None):
+        self._client = client
+
+    @property
+    def client(self) -> Judge0Client:
+        return self._client or get_judge0_client()
+
+    # Judge0 wants cpu_time_limit in seconds and memory_limit in KB
+    @staticmethod
+    def judge0_limits(limits: Optional[dict]) -> dict:
+        converted = {}
+        if limits and limits.get("time_limit"):
+            converted["cpu_time_limit"] = limits["time_limit"]
+        if limits and limits.get("memory_limit"):
+            converted["memory_limit"] = limits["memory_limit"] * 1024
+        return converted
+
+    # Judge0 only compares outputs exactly; runs in any other compare mode are checked here
+    @staticmethod
+    def _compared_here(run: dict) -> bool:
+        return (run.get("compare_mode") or "exact") != "exact"
+
+    # Judge0 only takes inline text, so file-backed runs are read here
+    @staticmethod
+    def _payloads(source_code, language_id, runs, extra) -> List[dict]:
+        payloads = []
+        for run in runs:
+            stdin = read_text(run["stdin_path"]) if run.get("stdin_path") else run.get("stdin") or ""
+            payload = {"source_code": source_code, "language_id": language_id, "stdin": stdin, **extra}
+            # Without an expected output Judge0 only runs the program
+            if not Judge0Executor._compared_here(run):
+                if run.get("expected_output_path"):
+                    payload["expected_output"] = read_text(run["expected_output_path"])
+                elif run.get("expected_output") is not None:
+                    payload["expected_output"] = run["expected_output"]
+            payloads.append(payload)
+        return payloads
+
+    async def execute(self, source_code, language_id, runs, limits=None):
+        extra = self.judge0_limits(limits)
+        if any(run.get("stdin_path") or run.get("expected_output_path") for run in runs):
+            payloads = await asyncio.to_thread(self._payloads, source_code, language_id, runs, extra)
+        else:
+            payloads = self._payloads(source_code, language_id, runs, extra)
+
+        if len(payloads) == 1:
+            results = [await self.client.run(payloads[0])]
+        else:
+            # Judge0 caps the number of submissions per batch; chunks are polled concurrently
+            size = settings.JUDGE0_BATCH_SIZE
+            chunks = [payloads[i:i + size] for i in range(0, len(payloads), size)]
+            chunk_results = await asyncio.gather(*(self.client.run_batch(chunk) for chunk in chunks))
+            results = [result for chunk in chunk_results for result in chunk]
+
+        for run, result in zip(runs, results):
+            if self._compared_here(run) and (result.get("status") or {}).get("id") == judge0.STATUS_ACCEPTED:
+                mismatch = await asyncio.to_thread(compare_run, run, stdout=result.get("stdout"))
+                if mismatch is not None:
+                    result["status"] = {"id": judge0.STATUS_WRONG_ANSWER, "description": "Wrong Answer"}
+                    result["mismatch"] = mismatch
+        return results
+
+
+# Runs programs on this machine. Compilation and every test case are separate tasks on
+# a process pool sized to the machine's cores; each task forks the sandboxed program,
+# or with `warm_python` forks Python programs from the worker's pre-booted interpreter.
+# Programs run as the unprivileged account `user`; without one they are not isolated from
+# this service (its files, the hidden case cache) and only fit trusted code.
+class LocalExecutor(Executor):
+    def __init__(self, workers: Optional[int] = None, warm_python: bool = False, user: Optional[str] = None):
+        self.workers = workers or os.cpu_count() or 1
+        self.warm_python = warm_python
+        self.sandbox = local_runner.sandbox_ids(user) if user else None
+        if self.sandbox is None:
+            logger.warning("LOCAL_EXECUTOR_USER is not set: submissions run as this service's user, unisolated")
+        # forkserver: never fork the (multi-threaded) API process itself
+        self.pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("forkserver"))
+
+    async def execute(self, source_code, language_id, runs, limits=None):
+        limits = limits or {}
+        time_limit = limits.get("time_limit") or settings.LOCAL_EXECUTOR_TIME_LIMIT
+        memory_limit = limits.get("memory_limit") or settings.LOCAL_EXECUTOR_MEMORY_LIMIT
+        output_limit = settings.LOCAL_EXECUTOR_OUTPUT_LIMIT_KB
+
+        loop = asyncio.get_running_loop()
+        prepared = await loop.run_in_executor(self.pool, local_runner.prepare, source_code, language_id,
+                                              self.sandbox)
+        try:
+            if prepared["compile_output"] is not None:
+                compile_error = {
+                    "status": local_runner.status(6), "stdout": None, "stderr": None,
+                    "compile_output": prepared["compile_output"], "message": None, "time": None, "memory": None
+                }
+                return [compile_error for _ in runs]
+
+            return list(await asyncio.gather(*(
+                loop.run_in_executor(
+                    self.pool, local_runner.run_case, prepared["workdir"], language_id, run,
+                    time_limit, memory_limit, output_limit, self.warm_python, self.sandbox
+                ) for run in runs
+            )))
+        finally:
+            await loop.run_in_executor(None, local_runner.cleanup, prepared["workdir"])
+
+    async def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: Optional[Executor] = None
+
+
+def create_executor(backend: str = None) -> Executor:
+    backend = backend or settings.EXECUTOR_BACKEND
+    if backend == "judge0":
+        return Judge0Executor()
+    if backend == "local":
+        return LocalExecutor(settings.LOCAL_EXECUTOR_WORKERS, settings.LOCAL_PYTHON_WARM_POOL,
+                             settings.LOCAL_EXECUTOR_USER)
+    raise ValueError(f"Unknown EXECUTOR_BACKEND: {backend}")
+
+
+# Process-wide executor selected by EXECUTOR_BACKEND; closed by the app lifespan
+def get_executor() -> Executor:
+    global _executor
+    if _executor is None:
+        _executor = create_executor()
+    return _executor
+
+
+async def close_executor():
+    global _executor
+    if _executor is not None:
+        await _executor.close()
+        _executor = None
@@ -0,0 +1,363 @@
+# Shared async client for the Judge0 HTTP API (single and batch submissions).
+# One instance lives for the lifetime of the app so TLS connections are reused.
+# Waits for an in-flight slot, HTTP calls and polling sleeps are timed as "judge0.*" spans.
+#
+# With callbacks configured, Judge0 PUTs every finished submission to the callback endpoint
+# (routers/internal.py) of any API process, which publishes it on this client's pub/sub
+# channel; the client only polls for the results that did not arrive in time.
+import asyncio
+import base64
+import random
+import time
+import uuid
+from typing import Dict, Iterable, List, Optional
+
+import httpx
+
+from core import metrics
+from core.config import settings
+from services.pubsub import PubSub, Subscription, get_pubsub
+
+RESULT_FIELDS = "token,status,stdout,stderr,compile_output,message,time,memory"
+# Judge0 sends these base64-encoded to the callback URL
+CALLBACK_TEXT_FIELDS = ("stdout", "stderr", "compile_output", "message")
+CALLBACK_CHANNEL = "judge0:{}"
+
+# Judge0 status ids
+STATUS_ACCEPTED = 3
+STATUS_WRONG_ANSWER = 4
+STATUS_COMPILATION_ERROR = 6
+PENDING_STATUSES = (1, 2)  # In queue, processing
+
+# Responses worth retrying: rate limiting and transient server errors. A POST creates
+# submissions, so it is only retried when Judge0 certainly did not act on it: on 429, or
+# when the connection was never made.
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+POST_RETRY_STATUSES = (429,)
+
+
+class Judge0Error(Exception):
+    pass
+
+
+def is_pending(result: dict) -> bool:
+    return (result.get("status") or {}).get("id") in PENDING_STATUSES
+
+
+# A callback body in the shape of a polled result
+def decode_callback(body: dict) -> dict:
+    result = dict(body)
+    for field in CALLBACK_TEXT_FIELDS:
+        if result.get(field) is not None:
+            result[field] = base64.b64decode(result[field]).decode("utf-8", errors="replace")
+    return result
+
+
+# Caps the number of programs executing on Judge0 at once. A batch of N
+# submissions takes N slots so batches and single runs share one budget.
+class InFlightLimiter:
+    def __init__(self, limit: int):
+        self.limit = limit
+        self.in_flight = 0
+        self._cond = asyncio.Condition()
+
+    async def acquire(self, n: int = 1) -> int:
+        n = min(n, self.limit)
+        async with self._cond:
+            await self._cond.wait_for(lambda: self.in_flight + n <= self.limit)
+            self.in_flight += n
+        return n
+
+    async def release(self, n: int = 1):
+        async with self._cond:
+            self.in_flight -= n
+            self._cond.notify_all()
+
+
+class Judge0Client:
+    def __init__(
+        self,
+        base_url: str = settings.JUDGE0_URL,
+        api_key: Optional[str] = settings.JUDGE0_API_KEY,
+        max_in_flight: int = settings.JUDGE0_MAX_IN_FLIGHT,
+        max_connections: int = settings.JUDGE0_MAX_CONNECTIONS,
+        timeout: float = settings.JUDGE0_TIMEOUT,
+        poll_initial: float = settings.JUDGE0_POLL_INITIAL,
+        poll_max: float = settings.JUDGE0_POLL_MAX,
+        poll_timeout: float = settings.JUDGE0_POLL_TIMEOUT,
+        max_retries: int = settings.JUDGE0_MAX_RETRIES,
+        callback_url: Optional[str] = settings.JUDGE0_CALLBACK_URL,
+        callback_secret: Optional[str] = settings.JUDGE0_CALLBACK_SECRET,
+        callback_timeout: float = settings.JUDGE0_CALLBACK_TIMEOUT,
+        pubsub: Optional[PubSub] = None,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.url = base_url.rstrip("/") + "/submissions"
+        self.poll_initial = poll_initial
+        self.poll_max = poll_max
+        self.poll_timeout = poll_timeout
+        self.max_retries = max_retries
+        self.limiter = InFlightLimiter(max_in_flight)
+        # Callbacks name this client so they are published where it listens
+        self.client_id = uuid.uuid4().hex
+        self.callback_url = None
+        if callback_url and callback_secret:
+            self.callback_url = str(httpx.URL(callback_url).copy_merge_params(
+                {"client": self.client_id, "secret": callback_secret}
+            ))
+        self.callback_timeout = callback_timeout
+        self._pubsub = pubsub
+        self._subscription: Optional[Subscription] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._waiters: Dict[str, asyncio.Future] = {}
+        # Callbacks that beat the submit response, by token: (arrival, result)
+        self._early: Dict[str, tuple] = {}
+        self._http = httpx.AsyncClient(
+            headers={
+                "X-RapidAPI-Host": httpx.URL(self.url).host,
+                "X-RapidAPI-Key": api_key or "",
+                "Content-Type": "application/json"
+            },
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+            timeout=timeout,
+            transport=transport,
+        )
+        self.counters = {
+            "requests": 0,
+            "retries": 0,
+            "errors": 0,
+            "polls": 0,
+            "callbacks": 0,
+            "callback_timeouts": 0,
+            "executions": 0,
+            "calls": 0,
+            "latency_seconds_total": 0.0,
+            "latency_seconds_max": 0.0,
+        }
+
+    # Subscribe to this client's callback channel before anything is submitted, so a callback
+    # that beats the submit response is kept (in _early) instead of dropped. Called by the app
+    # lifespan and worker.py once pub/sub has started; run() and run_batch() call it too in
+    # case a client is used without either.
+    async def start(self):
+        if self.callback_url and self._subscription is None:
+            self._subscription = (self._pubsub or get_pubsub()).subscribe(CALLBACK_CHANNEL.format(self.client_id))
+            self._listener = asyncio.create_task(self._listen())
+
+    async def close(self):
+        if self._listener is not None:
+            self._listener.cancel()
+            await asyncio.gather(self._listener, return_exceptions=True)
+            self._listener = None
+        if self._subscription is not None:
+            self._subscription.close()
+            self._subscription = None
+        await self._http.aclose()
+
+    # Payloads ask Judge0 to call back when callbacks are configured
+    def _with_callback(self, payload: dict) -> dict:
+        return {**payload, "callback_url": self.callback_url} if self.callback_url else payload
+
+    async def _listen(self):
+        async for result in self._subscription:
+            token = result.get("token")
+            waiter = self._waiters.pop(token, None)
+            if waiter is not None:
+                if not waiter.done():
+                    waiter.set_result(result)
+                continue
+            now = time.monotonic()
+            self._early = {t: early for t, early in self._early.items() if now - early[0] < self.poll_timeout}
+            self._early[token] = (now, result)
+
+    # Results of `tokens` delivered by callback within callback_timeout; the rest are left to polling
+    async def _wait_callbacks(self, tokens: Iterable[str]) -> Dict[str, dict]:
+        results, waiters = {}, {}
+        loop = asyncio.get_running_loop()
+        for token in tokens:
+            early = self._early.pop(token, None)
+            if early is not None:
+                results[token] = early[1]
+            else:
+                waiters[token] = self._waiters[token] = loop.create_future()
+        if waiters:
+            with metrics.span("judge0.callback_wait"):
+                await asyncio.wait(waiters.values(), timeout=min(self.callback_timeout, self.poll_timeout))
+        for token, waiter in waiters.items():
+            self._waiters.pop(token, None)
+            if waiter.done():
+                results[token] = waiter.result()
+            else:
+                waiter.cancel()
+        self.counters["callbacks"] += len(results)
+        self.counters["callback_timeouts"] += sum(1 for token in waiters if token not in results)
+        return results
+
+    def stats(self) -> dict:
+        calls = self.counters["calls"]
+        return {
+            **self.counters,
+            "latency_seconds_avg": self.counters["latency_seconds_total"] / calls if calls else 0.0,
+            "in_flight": self.limiter.in_flight,
+            "in_flight_limit": self.limiter.limit,
+        }
+
+    # Exponential backoff with jitter: ~50ms, 100ms, 200ms ... capped at poll_max.
+    # Half of each delay is randomized so concurrent pollers spread out.
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.poll_max, self.poll_initial * (2 ** attempt))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    async def _request(self, method: str, url: str, **kwargs) -> httpx.Response:
+        stage = "judge0.submit" if method == "POST" else "judge0.poll"
+        idempotent = method != "POST"
+        retry_statuses = RETRY_STATUSES if idempotent else POST_RETRY_STATUSES
+        for attempt in range(self.max_retries + 1):
+            self.counters["requests"] += 1
+            try:
+                with metrics.span(stage):
+                    res = await self._http.request(method, url, **kwargs)
+            except httpx.TransportError as e:
+                sent = not isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout))
+                if attempt == self.max_retries or (sent and not idempotent):
+                    self.counters["errors"] += 1
+                    raise Judge0Error(f"Judge0 unreachable: {e}")
+                delay = self._backoff(attempt + 1)
+            else:
+                if res.status_code not in retry_statuses or attempt == self.max_retries:
+                    return res
+                retry_after = res.headers.get("Retry-After")
+                delay = float(retry_after) if retry_after and retry_after.isdigit() else self._backoff(attempt + 1)
+            self.counters["retries"] += 1
+            with metrics.span("judge0.retry_sleep"):
+                await asyncio.sleep(delay)
+
+    # Latency is measured per call (submit to final result); a batch counts as one call
+    def _record_latency(self, started: float, executions: int):
+        elapsed = time.perf_counter() - started
+        self.counters["executions"] += executions
+        self.counters["calls"] += 1
+        self.counters["latency_seconds_total"] += elapsed
+        self.counters["latency_seconds_max"] = max(self.counters["latency_seconds_max"], elapsed)
+
+    # Submit one program and wait for its callback, or poll until it reaches a final status
+    async def run(self, payload: dict) -> dict:
+        await self.start()
+        with metrics.span("judge0.queue"):
+            slots = await self.limiter.acquire(1)
+        started = time.perf_counter()
+        try:
+            res = await self._request("POST", self.url, params={"base64_encoded": "false", "wait": "false"},
+                                      json=self._with_callback(payload))
+            if res.status_code != 201:
+                self.counters["errors"] += 1
+                raise Judge0Error(f"Judge0 submission failed with status {res.status_code}")
+            token = res.json().get("token")
+
+            deadline = time.monotonic() + self.poll_timeout
+            if self.callback_url:
+                delivered = await self._wait_callbacks([token])
+                if token in delivered:
+                    self._record_latency(started, 1)
+                    return delivered[token]
+            attempt = 0
+            while True:
+                self.counters["polls"] += 1
+                res = await self._request("GET", f"{self.url}/{token}", params={
+                    "base64_encoded": "false", "fields": RESULT_FIELDS
+                })
+                if res.status_code != 200:
+                    self.counters["errors"] += 1
+                    raise Judge0Error(f"Judge0 poll failed with status {res.status_code}")
+                result = res.json()
+                if not is_pending(result):
+                    self._record_latency(started, 1)
+                    return result
+                if time.monotonic() >= deadline:
+                    self.counters["errors"] += 1
+                    raise Judge0Error("Timed out waiting for Judge0 result")
+                with metrics.span("judge0.poll_sleep"):
+                    await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+        finally:
+            await self.limiter.release(slots)
+
+    # Submit several programs in one request and wait for their callbacks, or poll them as a
+    # single batch. Results are returned in the same order as the payloads.
+    async def run_batch(self, payloads: List[dict]) -> List[dict]:
+        await self.start()
+        with metrics.span("judge0.queue"):
+            slots = await self.limiter.acquire(len(payloads))
+        started = time.perf_counter()
+        try:
+            res = await self._request("POST", f"{self.url}/batch", params={"base64_encoded": "false"},
+                                      json={"submissions": [self._with_callback(payload) for payload in payloads]})
+            if res.status_code != 201:
+                self.counters["errors"] += 1
+                raise Judge0Error(f"Judge0 batch submission failed with status {res.status_code}")
+            tokens = [item.get("token") for item in res.json()]
+            if None in tokens:
+                self.counters["errors"] += 1
+                raise Judge0Error(f"Judge0 rejected part of the batch: {res.json()}")
+
+            results: List[Optional[dict]] = [None] * len(tokens)
+            pending = list(range(len(tokens)))
+            deadline = time.monotonic() + self.poll_timeout
+            if self.callback_url:
+                delivered = await self._wait_callbacks(tokens)
+                for i, token in enumerate(tokens):
+                    results[i] = delivered.get(token)
+                pending = [i for i in pending if results[i] is None]
+                if not pending:
+                    self._record_latency(started, len(tokens))
+                    return results
+            attempt = 0
+            while True:
+                self.counters["polls"] += 1
+                res = await self._request("GET", f"{self.url}/batch", params={
+                    "tokens": ",".join(tokens[i] for i in pending),
+                    "base64_encoded": "false",
+                    "fields": RESULT_FIELDS
+                })
+                if res.status_code != 200:
+                    self.counters["errors"] += 1
+                    raise Judge0Error(f"Judge0 batch poll failed with status {res.status_code}")
+                # Only the still-running tokens are polled again
+                still_pending = []
+                for i, result in zip(pending, res.json()["submissions"]):
+                    if is_pending(result):
+                        still_pending.append(i)
+                    else:
+                        results[i] = result
+                pending = still_pending
+                if not pending:
+                    self._record_latency(started, len(tokens))
+                    return results
+                if time.monotonic() >= deadline:
+                    self.counters["errors"] += 1
+                    raise Judge0Error("Timed out waiting for Judge0 batch result")
+                with metrics.span("judge0.poll_sleep"):
+                    await asyncio.sleep(self._backoff(attempt))
+                attempt += 1
+        finally:
+            await self.limiter.release(slots)
+
+
+_client: Optional[Judge0Client] = None
+
+
+# Process-wide client; created lazily and closed by the app lifespan
+def get_judge0_client() -> Judge0Client:
+    global _client
+    if _client is None:
+        client = _client = Judge0Client()
+        metrics.registry.gauge("judge0_in_flight", "Programs executing on Judge0 for this process",
+                               lambda: client.limiter.in_flight)
+    return _client
+
+
+async def close_judge0_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
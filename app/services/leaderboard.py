@@ -0,0 +1,330 @@
+# Contest leaderboards kept up to date incrementally instead of scanning `submissions`.
+# Scoring is ICPC style: a user gets one point per challenge they solve (only the first
+# accepted submission counts) and a time penalty per solved challenge, the seconds from
+# their first graded attempt to the accepted one plus LEADERBOARD_WRONG_ATTEMPT_PENALTY
+# for every rejected attempt before it. Users rank by solved (more first), then penalty.
+#
+# The durable state is one Mongo document per (user, challenge) in `leaderboard_entries`,
+# written by the workers. Every API process keeps the boards in memory in indexable skip
+# lists, so top-K, a user's rank and the window around them cost O(log n + k). Solves made
+# in this process are applied immediately; ones written by other processes (kafka workers,
+# other API replicas) are picked up by a read of the recently recorded entries, at most once
+# per LEADERBOARD_SYNC_INTERVAL seconds. A rejudge that changes a verdict rebuilds the user's
+# entry for that challenge from their stored verdicts (see rebuild()).
+import asyncio
+import random
+import time
+from typing import Dict, List, Optional, Tuple
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+from core.config import settings
+from services import judge0
+
+STATUS_INTERNAL_ERROR = 13
+STATUS_EXEC_FORMAT_ERROR = 14
+# Verdicts that say nothing about the solution and are neither a solve nor a wrong attempt
+UNSCORED_STATUSES = (judge0.STATUS_COMPILATION_ERROR, STATUS_INTERNAL_ERROR, STATUS_EXEC_FORMAT_ERROR)
+
+
+class _Node:
+    __slots__ = ("key", "next", "width")
+
+    def __init__(self, key, level: int):
+        self.key = key
+        self.next: List[Optional["_Node"]] = [None] * level
+        # width[i]: how many positions further next[i] is (past the end for None)
+        self.width = [1] * level
+
+
+# Sorted set of unique, comparable keys with O(log n) expected insert, remove and rank,
+# and positional slices in O(log n + k)
+class RankedSet:
+    MAX_LEVEL = 32
+
+    def __init__(self, seed=None):
+        self._random = random.Random(seed)
+        self._head = _Node(None, self.MAX_LEVEL)
+        self._level = 1
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def _random_level(self) -> int:
+        level = 1
+        while level < self.MAX_LEVEL and self._random.random() < 0.5:
+            level += 1
+        return level
+
+    def insert(self, key):
+        update = [self._head] * self.MAX_LEVEL
+        position_at = [0] * self.MAX_LEVEL
+        node, position = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+            update[level], position_at[level] = node, position
+
+        new_level = self._random_level()
+        for level in range(self._level, new_level):
+            self._head.width[level] = self._size + 1
+        self._level = max(self._level, new_level)
+
+        new = _Node(key, new_level)
+        for level in range(new_level):
+            prev = update[level]
+            skipped = position - position_at[level]
+            new.next[level] = prev.next[level]
+            new.width[level] = prev.width[level] - skipped
+            prev.next[level] = new
+            prev.width[level] = skipped + 1
+        for level in range(new_level, self._level):
+            update[level].width[level] += 1
+        self._size += 1
+
+    def remove(self, key) -> bool:
+        update = [self._head] * self.MAX_LEVEL
+        node = self._head
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                node = node.next[level]
+            update[level] = node
+        target = node.next[0]
+        if target is None or target.key != key:
+            return False
+        for level in range(self._level):
+            prev = update[level]
+            if prev.next[level] is target:
+                prev.width[level] += target.width[level] - 1
+                prev.next[level] = target.next[level]
+            else:
+                prev.width[level] -= 1
+        while self._level > 1 and self._head.next[self._level - 1] is None:
+            self._level -= 1
+        self._size -= 1
+        return True
+
+    # 0-based position of `key`, or None if it is not in the set
+    def rank(self, key) -> Optional[int]:
+        node, position = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and node.next[level].key < key:
+                position += node.width[level]
+                node = node.next[level]
+        node = node.next[0]
+        return position if node is not None and node.key == key else None
+
+    # Keys at positions [start, stop)
+    def slice(self, start: int, stop: int) -> list:
+        start, stop = max(start, 0), min(stop, self._size)
+        if start >= stop:
+            return []
+        node, position = self._head, 0
+        for level in reversed(range(self._level)):
+            while node.next[level] is not None and position + node.width[level] <= start:
+                position += node.width[level]
+                node = node.next[level]
+        keys = []
+        node = node.next[0]
+        while node is not None and len(keys) < stop - start:
+            keys.append(node.key)
+            node = node.next[0]
+        return keys
+
+
+# Members ranked by a sort key; the member must be the key's last element to break ties
+class Board:
+    def __init__(self):
+        self._keys: Dict[int, tuple] = {}
+        self._ranked = RankedSet()
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def set(self, member: int, key: tuple):
+        old = self._keys.get(member)
+        if old == key:
+            return
+        if old is not None:
+            self._ranked.remove(old)
+        self._keys[member] = key
+        self._ranked.insert(key)
+
+    def remove(self, member: int):
+        old = self._keys.pop(member, None)
+        if old is not None:
+            self._ranked.remove(old)
+
+    def key(self, member: int) -> Optional[tuple]:
+        return self._keys.get(member)
+
+    def rank(self, member: int) -> Optional[int]:
+        key = self._keys.get(member)
+        return self._ranked.rank(key) if key is not None else None
+
+    # (0-based rank, key) of the entries at positions [start, start + count)
+    def page(self, start: int, count: int) -> List[Tuple[int, tuple]]:
+        start = max(start, 0)
+        return list(enumerate(self._ranked.slice(start, start + count), start))
+
+
+def entry_id(user_id: int, challenge_id: int) -> dict:
+    return {"user_id": user_id, "challenge_id": challenge_id}
+
+
+class Leaderboard:
+    # Entries recorded this long before the last sync are read again, so a write by a
+    # process whose clock is slightly behind (or that became visible late) is not missed
+    SYNC_OVERLAP_SECONDS = 10.0
+
+    def __init__(self, entries, wrong_attempt_penalty: float = 1200.0, sync_interval: float = 1.0):
+        self.entries = entries
+        self.wrong_attempt_penalty = wrong_attempt_penalty
+        self.sync_interval = sync_interval
+        self.global_board = Board()
+        self.challenge_boards: Dict[int, Board] = {}
+        # user id -> {challenge id: penalty} of the solves applied so far
+        self._solved: Dict[int, Dict[int, float]] = {}
+        self._watermark = 0.0
+        self._synced_at = None
+        self._syncing: Optional[asyncio.Future] = None
+        self.counters = {"solves": 0, "wrong_attempts": 0, "applied": 0, "rebuilds": 0, "syncs": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "users": len(self.global_board), "challenges": len(self.challenge_boards),
+                "synced_at": self._synced_at}
+
+    async def create_indexes(self):
+        await self.entries.create_index("recorded_at", partialFilterExpression={"recorded_at": {"$exists": True}})
+
+    def penalty(self, entry: dict) -> float:
+        return max(entry["solved_at"] - entry["first_attempt_at"], 0.0) + entry.get("failed", 0) * self.wrong_attempt_penalty
+
+    # Bring the boards in line with one entry: a solve is added, or its penalty updated after a
+    # rebuild, and an entry a rebuild left unsolved is taken off. Applying it again changes nothing.
+    def apply(self, entry: dict):
+        user_id, challenge_id = entry["user_id"], entry["challenge_id"]
+        solved = self._solved.get(user_id, {})
+        penalty = self.penalty(entry) if entry.get("solved_at") is not None else None
+        if solved.get(challenge_id) == penalty:
+            return
+        if penalty is None:
+            del solved[challenge_id]
+            self.challenge_boards[challenge_id].remove(user_id)
+        else:
+            solved[challenge_id] = penalty
+            self._solved[user_id] = solved
+            self.challenge_boards.setdefault(challenge_id, Board()).set(user_id, (penalty, user_id))
+        if solved:
+            self.global_board.set(user_id, (-len(solved), sum(solved.values()), user_id))
+        else:
+            self.global_board.remove(user_id)
+        self.counters["applied"] += 1
+
+    # Count one graded verdict. Only the first accepted submission of a (user, challenge)
+    # solves it; attempts after that are ignored. Returns True if this one was the solve.
+    async def record(self, user_id: int, challenge_id: int, accepted: bool, at: float) -> bool:
+        ident = entry_id(user_id, challenge_id)
+        try:
+            if not accepted:
+                await self.entries.update_one(
+                    {"_id": ident, "solved_at": None},
+                    {"$inc": {"failed": 1}, "$min": {"first_attempt_at": at}, "$setOnInsert": ident},
+                    upsert=True
+                )
+                self.counters["wrong_attempts"] += 1
+                return False
+            entry = await self.entries.find_one_and_update(
+                {"_id": ident, "solved_at": None},
+                {"$set": {"solved_at": at, "recorded_at": time.time()}, "$min": {"first_attempt_at": at},
+                 "$setOnInsert": {**ident, "failed": 0}},
+                upsert=True, return_document=ReturnDocument.AFTER
+            )
+        except DuplicateKeyError:
+            # The entry exists and is already solved, so the upsert tried to insert a second one
+            return False
+        self.counters["solves"] += 1
+        self.apply(entry)
+        return True
+
+    # Recompute a (user, challenge) entry from all of its scored verdicts, (finished_at, accepted)
+    # pairs, by the same rules as record(). Used when a rejudge changed one of them; the entry
+    # gets a new recorded_at so other processes apply it on their next sync.
+    async def rebuild(self, user_id: int, challenge_id: int, verdicts: List[Tuple[float, bool]]):
+        ident = entry_id(user_id, challenge_id)
+        entry = {**ident, "failed": 0, "recorded_at": time.time()}
+        for at, accepted in sorted(verdicts):
+            entry.setdefault("first_attempt_at", at)
+            if accepted:
+                entry["solved_at"] = at
+                break
+            entry["failed"] += 1
+        await self.entries.replace_one({"_id": ident}, entry, upsert=True)
+        self.counters["rebuilds"] += 1
+        self.apply(entry)
+
+    # Apply the entries solved (or rebuilt) since the last sync
+    async def sync(self):
+        started = time.time()
+        cursor = self.entries.find({"recorded_at": {"$gte": self._watermark - self.SYNC_OVERLAP_SECONDS}})
+        async for entry in cursor:
+            self.apply(entry)
+            self._watermark = max(self._watermark, entry["recorded_at"])
+        self._synced_at = started
+        self.counters["syncs"] += 1
+
+    # Sync if the last one is older than sync_interval; concurrent callers share one sync
+    async def refresh(self):
+        if self._synced_at is not None and time.time() - self._synced_at < self.sync_interval:
+            return
+        if self._syncing is None:
+            self._syncing = asyncio.ensure_future(self.sync())
+            self._syncing.add_done_callback(lambda _: setattr(self, "_syncing", None))
+        await asyncio.shield(self._syncing)
+
+    def _global_row(self, rank: int, key: tuple) -> dict:
+        solved, penalty, user_id = key
+        return {"rank": rank + 1, "user_id": user_id, "solved": -solved, "penalty": round(penalty, 3)}
+
+    def _challenge_row(self, rank: int, key: tuple) -> dict:
+        penalty, user_id = key
+        return {"rank": rank + 1, "user_id": user_id, "penalty": round(penalty, 3)}
+
+    def _board(self, challenge_id: Optional[int]):
+        if challenge_id is None:
+            return self.global_board, self._global_row
+        return self.challenge_boards.get(challenge_id) or Board(), self._challenge_row
+
+    # Rows at ranks offset+1 .. offset+limit of the global board, or of one challenge's board
+    def top(self, offset: int, limit: int, challenge_id: Optional[int] = None) -> dict:
+        board, row = self._board(challenge_id)
+        return {"total": len(board), "entries": [row(rank, key) for rank, key in board.page(offset, limit)]}
+
+    # The user's row and the `window` rows above and below it; None if the user has no solve
+    def around(self, user_id: int, window: int, challenge_id: Optional[int] = None) -> Optional[dict]:
+        board, row = self._board(challenge_id)
+        rank = board.rank(user_id)
+        if rank is None:
+            return None
+        start = max(rank - window, 0)
+        return {
+            "total": len(board),
+            "entry": row(rank, board.key(user_id)),
+            "entries": [row(r, key) for r, key in board.page(start, rank + window + 1 - start)],
+        }
+
+
+_leaderboard: Optional[Leaderboard] = None
+
+
+# Process-wide leaderboard configured by the LEADERBOARD_* settings
+def get_leaderboard() -> Leaderboard:
+    global _leaderboard
+    if _leaderboard is None:
+        from database.mongodb import get_mongo_db
+        _leaderboard = Leaderboard(get_mongo_db()["leaderboard_entries"], settings.LEADERBOARD_WRONG_ATTEMPT_PENALTY,
+                                   settings.LEADERBOARD_SYNC_INTERVAL)
+    return _leaderboard
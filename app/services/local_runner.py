@@ -0,0 +1,228 @@
+# Compiles and runs untrusted programs in subprocesses with rlimit-enforced CPU time,
+# memory and output limits. These functions run inside the LocalExecutor's process
+# pool, so they are plain module-level functions that only take picklable arguments.
+# Compilers and programs get an empty environment (SANDBOX_ENV) and, given a `sandbox`
+# (uid, gid), run as that unprivileged user, which cannot read the service's files or the
+# hidden case cache. Without one they run as the service's own user and are not isolated.
+import os
+import pwd
+import resource
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+from typing import Optional
+
+from services import warm_python as zygotes
+from services.comparator import compare_run
+from services.warm_python import SANDBOX_ENV
+
+# Judge0 language ids supported locally
+LANGUAGES = {
+    71: {"source": "main.py", "compile": None, "run": [sys.executable, "-I", "main.py"]},
+    50: {"source": "main.c", "compile": ["gcc", "-O2", "-std=c11", "-o", "main", "main.c", "-lm"], "run": ["./main"]},
+    54: {"source": "main.cpp", "compile": ["g++", "-O2", "-std=c++17", "-o", "main", "main.cpp"], "run": ["./main"]},
+}
+
+# Judge0 status ids/descriptions, so local results look exactly like Judge0's
+STATUSES = {
+    3: "Accepted",
+    4: "Wrong Answer",
+    5: "Time Limit Exceeded",
+    6: "Compilation Error",
+    7: "Runtime Error (SIGSEGV)",
+    8: "Runtime Error (SIGXFSZ)",
+    9: "Runtime Error (SIGFPE)",
+    10: "Runtime Error (SIGABRT)",
+    11: "Runtime Error (NZEC)",
+    12: "Runtime Error (Other)",
+    13: "Internal Error",
+}
+SIGNAL_STATUSES = {signal.SIGSEGV: 7, signal.SIGXFSZ: 8, signal.SIGFPE: 9, signal.SIGABRT: 10}
+
+COMPILE_TIMEOUT = 30
+
+
+def status(status_id: int) -> dict:
+    return {"id": status_id, "description": STATUSES[status_id]}
+
+
+# (uid, gid) of the account `name` that programs run as. Switching to it needs root (or
+# CAP_SETUID, CAP_SETGID and CAP_CHOWN), and it must not be the service's own account.
+def sandbox_ids(name: str) -> tuple:
+    entry = pwd.getpwnam(name)
+    if entry.pw_uid == os.getuid() or entry.pw_uid == 0:
+        raise ValueError(f"LOCAL_EXECUTOR_USER {name} must be an unprivileged account other than the service's")
+    return entry.pw_uid, entry.pw_gid
+
+
+# Popen arguments that start a process as the sandbox user with nothing from our environment
+def _sandboxed(sandbox) -> dict:
+    if sandbox is None:
+        return {"env": SANDBOX_ENV}
+    return {"env": SANDBOX_ENV, "user": sandbox[0], "group": sandbox[1], "extra_groups": []}
+
+
+def _read(path: str, limit: int) -> str:
+    with open(path, "rb") as f:
+        return f.read(limit).decode("utf-8", errors="replace")
+
+
+# Write the source into a fresh working directory (owned by the sandbox user, if any) and
+# compile it if needed. The compiler is sandboxed too: a source can #include any file the
+# compiler can read. Returns {"workdir", "compile_output"}; compile_output is set only on failure.
+def prepare(source_code: str, language_id: int, sandbox: Optional[tuple] = None) -> dict:
+    language = LANGUAGES.get(language_id)
+    if language is None:
+        raise ValueError(f"Language {language_id} is not supported by the local executor")
+
+    workdir = tempfile.mkdtemp(prefix="submission-")
+    source_path = os.path.join(workdir, language["source"])
+    with open(source_path, "w") as f:
+        f.write(source_code)
+    if sandbox is not None:
+        for path in (workdir, source_path):
+            os.chown(path, *sandbox)
+
+    if language["compile"]:
+        try:
+            proc = subprocess.run(language["compile"], cwd=workdir, capture_output=True, text=True,
+                                  timeout=COMPILE_TIMEOUT, **_sandboxed(sandbox))
+        except subprocess.TimeoutExpired:
+            return {"workdir": workdir, "compile_output": "Compilation timed out"}
+        if proc.returncode != 0:
+            return {"workdir": workdir, "compile_output": proc.stdout + proc.stderr}
+    return {"workdir": workdir, "compile_output": None}
+
+
+def cleanup(workdir: str):
+    shutil.rmtree(workdir, ignore_errors=True)
+
+
+# Limits applied in the child between fork and exec
+def _apply_limits(cpu_seconds: int, memory_bytes: int, output_bytes: int):
+    def apply():
+        resource.setrlimit(resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        resource.setrlimit(resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+        resource.setrlimit(resource.RLIMIT_FSIZE, (output_bytes, output_bytes))
+        resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    return apply
+
+
+# A process started directly by this worker. wait() returns (wait status, cpu seconds, max RSS in KB).
+class ColdProcess:
+    def __init__(self, proc: subprocess.Popen):
+        self.proc = proc
+        self.pid = proc.pid
+
+    def wait(self):
+        _, wait_status, usage = os.wait4(self.pid, 0)
+        self.proc.returncode = os.waitstatus_to_exitcode(wait_status)
+        return wait_status, usage.ru_utime + usage.ru_stime, usage.ru_maxrss
+
+
+# Start a fresh process for `command` with the limits applied between fork and exec
+def _launch_cold(command: list, sandbox: Optional[tuple] = None):
+    def launch(workdir, stdin_path, stdout_path, stderr_path, cpu_seconds, memory_bytes, output_bytes):
+        limits = _apply_limits(cpu_seconds, memory_bytes, output_bytes)
+        with open(stdin_path, "rb") as fin, open(stdout_path, "wb") as fout, open(stderr_path, "wb") as ferr:
+            return ColdProcess(subprocess.Popen(command, cwd=workdir, stdin=fin, stdout=fout, stderr=ferr,
+                                                preexec_fn=limits, start_new_session=True, **_sandboxed(sandbox)))
+    return launch
+
+
+# Fork the program from this worker's warm Python zygote
+def _launch_warm(source_path: str, sandbox: Optional[tuple] = None):
+    def launch(workdir, stdin_path, stdout_path, stderr_path, cpu_seconds, memory_bytes, output_bytes):
+        return zygotes.get_zygote().start(source_path, workdir, stdin_path, stdout_path, stderr_path,
+                                          cpu_seconds, memory_bytes, output_bytes, sandbox)
+    return launch
+
+
+# Start the program through `launch` for one run ({"stdin" or "stdin_path", "expected_output"
+# or "expected_output_path", "compare_mode", "float_tolerance"}) and wait for it. Returns a
+# Judge0-shaped result, with the first difference as "mismatch" on a wrong answer.
+def execute(launch, workdir: str, run: dict, time_limit: float,
+            memory_limit_mb: int, output_limit_kb: int) -> dict:
+    run_dir = tempfile.mkdtemp(dir=workdir)
+    stdout_path = os.path.join(run_dir, "stdout")
+    stderr_path = os.path.join(run_dir, "stderr")
+    # The program only ever sees its own copy of the input, never a path into the private
+    # hidden case cache (copyfile uses sendfile, so the copy stays in the kernel). run_dir
+    # belongs to the service, so a sandboxed program only has the files opened for it.
+    stdin_path = os.path.join(run_dir, "stdin")
+    if run.get("stdin_path"):
+        shutil.copyfile(run["stdin_path"], stdin_path)
+    else:
+        with open(stdin_path, "w") as f:
+            f.write(run.get("stdin") or "")
+
+    output_bytes = output_limit_kb * 1024
+    cpu_seconds = max(1, int(-(-time_limit // 1)))  # ceil
+    proc = launch(workdir, stdin_path, stdout_path, stderr_path, cpu_seconds,
+                  memory_limit_mb * 1024 * 1024, output_bytes)
+
+    # RLIMIT_CPU does not catch programs that sleep or block, so also bound wall time
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        try:
+            os.killpg(proc.pid, signal.SIGKILL)
+        except ProcessLookupError:
+            pass
+
+    timer = threading.Timer(time_limit * 2 + 1, kill)
+    timer.start()
+    try:
+        wait_status, cpu_time, max_rss = proc.wait()
+    finally:
+        timer.cancel()
+    returncode = os.waitstatus_to_exitcode(wait_status)
+
+    result = {
+        "stdout": _read(stdout_path, output_bytes),
+        "stderr": _read(stderr_path, output_bytes),
+        "compile_output": None,
+        "message": None,
+        "time": f"{cpu_time:.3f}",
+        "memory": max_rss,  # KB on Linux
+    }
+
+    signum = -returncode if returncode < 0 else None
+    mismatch = None
+    judged = run.get("expected_output_path") or run.get("expected_output") is not None
+    if judged and not timed_out.is_set() and returncode == 0 and cpu_time <= time_limit:
+        # Streamed from the output file, however large either side is
+        mismatch = compare_run(run, stdout_path=stdout_path)
+    shutil.rmtree(run_dir, ignore_errors=True)
+
+    if timed_out.is_set() or signum == signal.SIGXCPU or cpu_time > time_limit:
+        result["status"] = status(5)
+    elif signum is not None:
+        result["status"] = status(SIGNAL_STATUSES.get(signum, 12))
+        result["message"] = f"Exited with signal {signum}"
+    elif returncode != 0:
+        result["status"] = status(11)
+        result["message"] = f"Exited with error status {returncode}"
+    elif mismatch is not None:
+        result["status"] = status(4)
+        result["mismatch"] = mismatch
+    else:
+        result["status"] = status(3)
+    return result
+
+
+# Run a prepared program once for `run`. Python programs are forked from a warm
+# interpreter when `warm_python` is set.
+def run_case(workdir: str, language_id: int, run: dict, time_limit: float,
+             memory_limit_mb: int, output_limit_kb: int, warm_python: bool = False,
+             sandbox: Optional[tuple] = None) -> dict:
+    language = LANGUAGES[language_id]
+    if language_id == 71 and warm_python:
+        launch = _launch_warm(os.path.join(workdir, language["source"]), sandbox)
+    else:
+        launch = _launch_cold(language["run"], sandbox)
+    return execute(launch, workdir, run, time_limit, memory_limit_mb, output_limit_kb)
@@ -0,0 +1,106 @@
+# Password hashing and verification on a dedicated process pool. bcrypt is slow on
+# purpose; running it in worker processes uses every core without holding the event loop
+# or the request threadpool. At most `max_pending` operations are queued or running;
+# beyond that callers get PasswordHasherBusy (429) instead of an ever-growing queue.
+# Hashes made with fewer rounds than BCRYPT_ROUNDS are re-hashed when their owner logs in.
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+from typing import Optional, Tuple
+
+from passlib.context import CryptContext
+
+from core.config import settings
+
+
+class PasswordHasherBusy(Exception):
+    pass
+
+
+@lru_cache(maxsize=None)
+def crypt_context(rounds: int) -> CryptContext:
+    return CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=rounds)
+
+
+# Run in the worker processes
+def _hash(password: str, rounds: int) -> str:
+    return crypt_context(rounds).hash(password)
+
+
+# (valid, new hash or None); a new hash is returned when `hashed` uses outdated settings
+def _verify_and_update(password: str, hashed: str, rounds: int) -> Tuple[bool, Optional[str]]:
+    try:
+        return crypt_context(rounds).verify_and_update(password, hashed)
+    except ValueError:
+        # Not a hash this context recognises
+        return False, None
+
+
+class PasswordHasher:
+    def __init__(self, workers: Optional[int] = None, max_pending: int = 64, rounds: int = 12):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.rounds = rounds
+        self.pending = 0
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.counters = {"hashes": 0, "verifications": 0, "upgrades": 0, "rejected": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "pending": self.pending, "max_pending": self.max_pending,
+                "workers": self.workers, "rounds": self.rounds}
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forkserver: never fork the (multi-threaded) API process itself
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("forkserver"))
+        return self._pool
+
+    async def _run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            self.counters["rejected"] += 1
+            raise PasswordHasherBusy("Too many password operations in progress")
+        self.pending += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_pool(), fn, *args)
+        finally:
+            self.pending -= 1
+
+    async def hash(self, password: str) -> str:
+        hashed = await self._run(_hash, password, self.rounds)
+        self.counters["hashes"] += 1
+        return hashed
+
+    # Returns (valid, new hash or None); store the new hash when one is returned
+    async def verify(self, password: str, hashed: str) -> Tuple[bool, Optional[str]]:
+        valid, new_hash = await self._run(_verify_and_update, password, hashed, self.rounds)
+        self.counters["verifications"] += 1
+        if new_hash:
+            self.counters["upgrades"] += 1
+        return valid, new_hash
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+
+_hasher: Optional[PasswordHasher] = None
+
+
+# Process-wide hasher configured by the PASSWORD_HASH_* / BCRYPT_ROUNDS settings; closed by the app lifespan
+def get_password_hasher() -> PasswordHasher:
+    global _hasher
+    if _hasher is None:
+        _hasher = PasswordHasher(settings.PASSWORD_HASH_WORKERS, settings.PASSWORD_HASH_MAX_PENDING,
+                                 settings.BCRYPT_ROUNDS)
+    return _hasher
+
+
+def close_password_hasher():
+    global _hasher
+    if _hasher is not None:
+        _hasher.close()
+        _hasher = None
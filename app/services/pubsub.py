@@ -0,0 +1,187 @@
+# Publish/subscribe for events that must reach whichever process waits for them: Judge0
+# callbacks (received by any API process, awaited by the process that submitted the program)
+# and submission status changes (pushed to clients connected to any API process).
+# "memory" delivers within this process. "kafka" fans every event out to all processes through
+# KAFKA_EVENTS_TOPIC, and each delivers it to its own subscribers; use it whenever the API
+# runs several uvicorn workers or the kafka submission queue.
+import asyncio
+import json
+import logging
+import uuid
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from typing import Dict, Optional, Set
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+# Messages published to any of `channels` since subscribing, in order. Use as a context
+# manager (or call close()) so the pub/sub stops delivering to it.
+class Subscription:
+    def __init__(self, pubsub: "PubSub", channels, maxsize: int):
+        self.pubsub = pubsub
+        self.channels = tuple(channels)
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize)
+
+    # A subscriber too slow to keep up loses the new messages, not the publisher's time
+    def _put(self, message: dict) -> bool:
+        try:
+            self._queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def get(self) -> dict:
+        return await self._queue.get()
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> dict:
+        return await self.get()
+
+    def close(self):
+        self.pubsub._unsubscribe(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class PubSub(ABC):
+    def __init__(self, subscriber_buffer: int = settings.PUBSUB_SUBSCRIBER_BUFFER):
+        self.subscriber_buffer = subscriber_buffer
+        self._subscribers: Dict[str, Set[Subscription]] = defaultdict(set)
+        self.counters = {"published": 0, "delivered": 0, "dropped": 0}
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    # Send `message` (JSON-serializable) to every subscriber of `channel`, in any process
+    @abstractmethod
+    async def publish(self, channel: str, message: dict) -> None:
+        ...
+
+    # Registered immediately, so nothing published after this call is missed
+    def subscribe(self, *channels: str) -> Subscription:
+        subscription = Subscription(self, channels, self.subscriber_buffer)
+        for channel in channels:
+            self._subscribers[channel].add(subscription)
+        return subscription
+
+    def _unsubscribe(self, subscription: Subscription):
+        for channel in subscription.channels:
+            subscribers = self._subscribers.get(channel)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscribers[channel]
+
+    # Hand a message to this process's subscribers of `channel`
+    def _deliver(self, channel: str, message: dict):
+        for subscription in list(self._subscribers.get(channel, ())):
+            if subscription._put(message):
+                self.counters["delivered"] += 1
+            else:
+                self.counters["dropped"] += 1
+
+    def stats(self) -> dict:
+        return {
+            **self.counters,
+            "channels": len(self._subscribers),
+            "subscriptions": len({s for subscribers in self._subscribers.values() for s in subscribers}),
+        }
+
+
+# Single process: published messages go straight to the local subscribers
+class InMemoryPubSub(PubSub):
+    async def publish(self, channel, message):
+        self.counters["published"] += 1
+        self._deliver(channel, message)
+
+
+# Every process reads the whole topic (no consumer group, from the latest offset) and delivers
+# the messages of the channels it has subscribers for; its own messages come back the same way
+class KafkaPubSub(PubSub):
+    def __init__(self, broker_url: str, topic: str, **kwargs):
+        super().__init__(**kwargs)
+        self.broker_url = broker_url
+        self.topic = topic
+        self._producer = None
+        self._consumer = None
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+        self._producer = AIOKafkaProducer(
+            bootstrap_servers=self.broker_url,
+            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        )
+        await self._producer.start()
+        self._consumer = AIOKafkaConsumer(
+            self.topic,
+            bootstrap_servers=self.broker_url,
+            group_id=None,
+            client_id=f"pubsub-{uuid.uuid4().hex[:8]}",
+            auto_offset_reset="latest",
+            value_deserializer=lambda x: json.loads(x.decode("utf-8")),
+        )
+        await self._consumer.start()
+        self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        async for record in self._consumer:
+            try:
+                self._deliver(record.value["channel"], record.value["message"])
+            except Exception:
+                logger.exception("Dropping malformed pub/sub record %r", record.value)
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._consumer is not None:
+            await self._consumer.stop()
+        if self._producer is not None:
+            await self._producer.stop()
+
+    async def publish(self, channel, message):
+        self.counters["published"] += 1
+        await self._producer.send_and_wait(self.topic, {"channel": channel, "message": message})
+
+
+_pubsub: Optional[PubSub] = None
+
+
+# Build the backend selected by PUBSUB_BACKEND
+def create_pubsub() -> PubSub:
+    backend = settings.PUBSUB_BACKEND
+    if backend == "memory":
+        return InMemoryPubSub()
+    if backend == "kafka":
+        return KafkaPubSub(settings.KAFKA_BROKER_URL, settings.KAFKA_EVENTS_TOPIC)
+    raise ValueError(f"Unknown PUBSUB_BACKEND: {backend}")
+
+
+# Process-wide pub/sub; started and stopped by the app lifespan (and worker.py)
+def get_pubsub() -> PubSub:
+    global _pubsub
+    if _pubsub is None:
+        _pubsub = create_pubsub()
+    return _pubsub
+
+
+async def close_pubsub():
+    global _pubsub
+    if _pubsub is not None:
+        await _pubsub.stop()
+        _pubsub = None
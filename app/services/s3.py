@@ -0,0 +1,102 @@
+# S3 access for test case files. S3_BACKEND=aws uses boto3; S3_BACKEND=local stores
+# objects under S3_LOCAL_ROOT so the platform (and its tests) can run without AWS.
+# Either way every call is timed as an "s3.<operation>" span.
+import hashlib
+import os
+import shutil
+
+import boto3
+from botocore.exceptions import ClientError
+
+from core import metrics
+from core.config import settings
+
+
+def _not_found(operation: str) -> ClientError:
+    return ClientError({"Error": {"Code": "404", "Message": "Not Found"}}, operation)
+
+
+# Filesystem stand-in implementing the subset of the boto3 S3 client the app uses
+class LocalS3Client:
+    def __init__(self, root: str):
+        self.root = root
+
+    def _path(self, bucket: str, key: str) -> str:
+        path = os.path.abspath(os.path.join(self.root, bucket, key))
+        if not path.startswith(os.path.abspath(os.path.join(self.root, bucket)) + os.sep):
+            raise ValueError(f"Invalid key: {key}")
+        return path
+
+    @staticmethod
+    def _etag(path: str) -> str:
+        digest = hashlib.md5()
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        return f'"{digest.hexdigest()}"'
+
+    def upload_fileobj(self, fileobj, bucket: str, key: str, **kwargs):
+        path = self._path(bucket, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path + ".part", "wb") as f:
+            shutil.copyfileobj(fileobj, f, 1024 * 1024)
+        os.replace(path + ".part", path)
+
+    def put_object(self, Bucket: str, Key: str, Body=b"", **kwargs):
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(Body.encode("utf-8") if isinstance(Body, str) else Body)
+        return {"ETag": self._etag(path)}
+
+    def head_object(self, Bucket: str, Key: str, **kwargs):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise _not_found("HeadObject")
+        return {"ETag": self._etag(path), "ContentLength": os.path.getsize(path)}
+
+    def get_object(self, Bucket: str, Key: str, **kwargs):
+        path = self._path(Bucket, Key)
+        if not os.path.exists(path):
+            raise _not_found("GetObject")
+        return {"Body": open(path, "rb"), "ETag": self._etag(path), "ContentLength": os.path.getsize(path)}
+
+    def copy_object(self, Bucket: str, Key: str, CopySource: dict, **kwargs):
+        source = self._path(CopySource["Bucket"], CopySource["Key"])
+        if not os.path.exists(source):
+            raise _not_found("CopyObject")
+        path = self._path(Bucket, Key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        shutil.copyfile(source, path)
+
+    def delete_object(self, Bucket: str, Key: str, **kwargs):
+        try:
+            os.remove(self._path(Bucket, Key))
+        except FileNotFoundError:
+            pass
+
+    def delete_objects(self, Bucket: str, Delete: dict, **kwargs):
+        for obj in Delete.get("Objects", []):
+            self.delete_object(Bucket=Bucket, Key=obj["Key"])
+
+
+# Wraps a client so each method call is timed
+class TimedS3Client:
+    def __init__(self, client):
+        self._client = client
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._client, name)
+        if not callable(attr):
+            return attr
+
+        def timed(*args, **kwargs):
+            with metrics.span(f"s3.{name}"):
+                return attr(*args, **kwargs)
+        return timed
+
+
+def get_s3_client():
+    if settings.S3_BACKEND == "local":
+        return TimedS3Client(LocalS3Client(settings.S3_LOCAL_ROOT))
+    return TimedS3Client(boto3.client("s3"))
@@ -0,0 +1,323 @@
+# Code similarity detection with winnowing (Schleimer, Wilkerson & Aiken, as used by MOSS).
+# Source is tokenized with comments dropped and identifiers, strings and numbers replaced
+# by placeholders, so renaming variables or rewording comments changes nothing. Every
+# k-token window is hashed and winnowing keeps the minimum hash of each run of `window`
+# hashes; any match of at least k + window - 1 tokens shares a fingerprint.
+#
+# Accepted submissions are indexed as one document per submission in `similarity_fingerprints`
+# whose multikey (challenge_id, fingerprints) index is the inverted index: the closest matches
+# of a submission are found by looking up only its own fingerprints. Fingerprints found in
+# more than SIMILARITY_COMMON_RATIO of a challenge's submissions (starter code, the obvious
+# input loop) are ignored, with counts kept in `similarity_fingerprint_counts`.
+#
+# A batch scan rewrites a challenge's documents while workers keep indexing new submissions.
+# Every document carries the time it was written (indexed_at); the scan only deletes the ones
+# written before it started that it did not rewrite, and it corrects the counts by the
+# difference between the documents it read and the ones it wrote, so nothing indexed during
+# a scan is lost or miscounted.
+import asyncio
+import hashlib
+import multiprocessing
+import os
+import re
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import combinations
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+from core.config import settings
+
+# A fingerprint may be shared by this many submissions before it can count as common
+MIN_COMMON_COUNT = 10
+
+# Batch ranking pairs up every submission of a posting list no longer than MAX_PAIR_POSTINGS.
+# In a longer one each submission is only paired with the next LONG_POSTING_NEIGHBOURS, so pair
+# generation stays linear in the number of submissions while a large group of copies of one
+# source, which share no rarer fingerprint, is still found.
+MAX_PAIR_POSTINGS = 50
+LONG_POSTING_NEIGHBOURS = 2
+
+TOKEN_RE = re.compile(r"""
+    (?P<comment>\#[^\n]*|//[^\n]*|/\*.*?\*/)
+  | (?P<string>\"\"\".*?\"\"\"|'''.*?'''|"(?:\\.|[^"\\\n])*"|'(?:\\.|[^'\\\n])*')
+  | (?P<number>\d+(?:\.\d+)?(?:[eE][+-]?\d+)?)
+  | (?P<name>[A-Za-z_]\w*)
+  | (?P<op>==|!=|<=|>=|&&|\|\||<<|>>|\+\+|--|->|::|[-+*/%=<>!&|^~?:;,.(){}\[\]])
+""", re.S | re.X)
+
+# Keywords and common library names of the supported languages keep their identity;
+# every other identifier becomes "V"
+KEEP_NAMES = frozenset("""
+    and as assert break case catch char class const continue def default del do double elif else
+    except false final finally float for from function if import in int is lambda let long new
+    none not null or pass private public raise return self short static string struct switch this
+    throw true try var void while with yield
+    append cin cout endl input len list map max min print printf range scanf sorted split std sum
+""".split())
+
+
+def tokenize(source: str) -> List[str]:
+    tokens = []
+    for match in TOKEN_RE.finditer(source or ""):
+        kind = match.lastgroup
+        if kind == "comment":
+            continue
+        if kind == "string":
+            tokens.append("S")
+        elif kind == "number":
+            tokens.append("N")
+        elif kind == "name":
+            name = match.group().lower()
+            tokens.append(name if name in KEEP_NAMES else "V")
+        else:
+            tokens.append(match.group())
+    return tokens
+
+
+# Stable across processes (unlike hash()) and within Mongo's signed 64-bit integers
+def _hash(gram) -> int:
+    digest = hashlib.blake2b("\x1f".join(gram).encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+# Sorted, distinct winnowed fingerprints of a source file
+def fingerprint(source: str, k: int = 8, window: int = 4) -> List[int]:
+    tokens = tokenize(source)
+    hashes = [_hash(tokens[i:i + k]) for i in range(len(tokens) - k + 1)]
+    if not hashes:
+        return []
+    selected = set()
+    for start in range(max(len(hashes) - window + 1, 1)):
+        selected.add(min(hashes[start:start + window]))
+    return sorted(selected)
+
+
+# Run in the worker processes
+def _fingerprint_batch(sources: List[str], k: int, window: int) -> List[List[int]]:
+    return [fingerprint(source, k, window) for source in sources]
+
+
+def _similarity(shared: int, a: int, b: int) -> float:
+    # Containment of the smaller set, so copying into a longer program still scores high
+    return shared / min(a, b) if a and b else 0.0
+
+
+def _common_limit(documents: int, ratio: float) -> float:
+    return max(ratio * documents, MIN_COMMON_COUNT)
+
+
+# Pairs of submissions by different users sharing fingerprints, most similar first. `docs` are
+# fingerprint documents; one pair of users is reported once, with their most similar submissions.
+def rank_pairs(docs: List[dict], common_ratio: float, min_similarity: float, limit: int) -> List[dict]:
+    postings: Dict[int, List[int]] = defaultdict(list)
+    for i, doc in enumerate(docs):
+        for value in doc["fingerprints"]:
+            postings[value].append(i)
+    common_limit = _common_limit(len(docs), common_ratio)
+    common = {value for value, ids in postings.items() if len(ids) > common_limit}
+
+    candidates = set()
+    for value, ids in postings.items():
+        if value in common:
+            continue
+        if len(ids) <= MAX_PAIR_POSTINGS:
+            candidates.update(combinations(ids, 2))
+        else:
+            for offset, i in enumerate(ids):
+                candidates.update((i, j) for j in ids[offset + 1:offset + 1 + LONG_POSTING_NEIGHBOURS])
+
+    # Candidates are scored on all their shared fingerprints, wherever they were paired up
+    own = [set(doc["fingerprints"]) - common for doc in docs]
+    best: Dict[tuple, dict] = {}
+    for i, j in candidates:
+        a, b = docs[i], docs[j]
+        if a["user_id"] == b["user_id"]:
+            continue
+        count = len(own[i] & own[j])
+        score = _similarity(count, len(own[i]), len(own[j]))
+        if score < min_similarity:
+            continue
+        users = tuple(sorted((a["user_id"], b["user_id"])))
+        if users not in best or score > best[users]["similarity"]:
+            best[users] = {
+                "similarity": round(score, 4), "shared": count,
+                "submissions": [{"submission_id": str(d["_id"]), "user_id": d["user_id"],
+                                 "language_id": d.get("language_id")} for d in (a, b)],
+            }
+    return sorted(best.values(), key=lambda pair: -pair["similarity"])[:limit]
+
+
+class SimilarityIndex:
+    def __init__(self, fingerprints, counts, k: int = 8, window: int = 4, common_ratio: float = 0.5,
+                 workers: Optional[int] = None):
+        self.fingerprints = fingerprints
+        self.counts = counts
+        self.k = k
+        self.window = window
+        self.common_ratio = common_ratio
+        self.workers = workers or os.cpu_count() or 1
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self.counters = {"indexed": 0, "lookups": 0, "candidates": 0, "scans": 0}
+
+    def stats(self) -> dict:
+        return {**self.counters, "k": self.k, "window": self.window, "workers": self.workers}
+
+    async def create_indexes(self):
+        await self.fingerprints.create_index([("challenge_id", ASCENDING), ("fingerprints", ASCENDING)])
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            # forkserver: never fork the (multi-threaded) API process itself
+            self._pool = ProcessPoolExecutor(max_workers=self.workers,
+                                             mp_context=multiprocessing.get_context("forkserver"))
+        return self._pool
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    @staticmethod
+    def _count_id(challenge_id: int, value: int) -> str:
+        return f"{challenge_id}:{value}"
+
+    # Two round trips whatever the number of fingerprints: create the missing counters, then
+    # increment all of them in one update
+    async def _count(self, challenge_id: int, values: Iterable[int], delta: int = 1):
+        ids = [self._count_id(challenge_id, value) for value in values]
+        if not ids:
+            return
+        try:
+            await self.counts.insert_many([{"_id": count_id, "n": 0} for count_id in ids], ordered=False)
+        except BulkWriteError:
+            pass  # counters that already exist
+        await self.counts.update_many({"_id": {"$in": ids}}, {"$inc": {"n": delta}})
+
+    # Index one accepted submission; call once per submission (the worker claims it first). If a
+    # scan already wrote its document, the scan counted its fingerprints too.
+    async def add(self, submission_id, challenge_id: int, user_id: int, language_id: int, source: str):
+        values = await asyncio.to_thread(fingerprint, source, self.k, self.window)
+        result = await self.fingerprints.replace_one({"_id": submission_id}, {
+            "challenge_id": challenge_id, "user_id": user_id, "language_id": language_id, "fingerprints": values,
+            "indexed_at": time.time()
+        }, upsert=True)
+        if result.upserted_id is not None:
+            await self._count(challenge_id, values)
+        self.counters["indexed"] += 1
+
+    # Fingerprints of `values` shared by too many of the challenge's submissions to mean anything
+    async def _common(self, challenge_id: int, values: List[int]) -> set:
+        documents = await self.fingerprints.count_documents({"challenge_id": challenge_id})
+        limit = _common_limit(documents, self.common_ratio)
+        ids = [self._count_id(challenge_id, value) for value in values]
+        return {int(doc["_id"].split(":")[1]) async for doc in self.counts.find({"_id": {"$in": ids}, "n": {"$gt": limit}})}
+
+    # Indexed submissions by other users most similar to an indexed submission. Only
+    # submissions sharing one of its uncommon fingerprints are read.
+    async def matches(self, submission_id, limit: int = 10, min_similarity: float = 0.0) -> Optional[List[dict]]:
+        doc = await self.fingerprints.find_one({"_id": submission_id})
+        if doc is None:
+            return None
+        self.counters["lookups"] += 1
+        challenge_id = doc["challenge_id"]
+        common = await self._common(challenge_id, doc["fingerprints"])
+        own = set(doc["fingerprints"]) - common
+        if not own:
+            return []
+        candidates = self.fingerprints.find({
+            "challenge_id": challenge_id, "fingerprints": {"$in": list(own)},
+            "user_id": {"$ne": doc["user_id"]}
+        })
+        results = []
+        async for other in candidates:
+            self.counters["candidates"] += 1
+            theirs = set(other["fingerprints"]) - common
+            shared = len(own & theirs)
+            score = _similarity(shared, len(own), len(theirs))
+            if score >= min_similarity:
+                results.append({"submission_id": str(other["_id"]), "user_id": other["user_id"],
+                                "language_id": other.get("language_id"), "similarity": round(score, 4),
+                                "shared": shared})
+        results.sort(key=lambda match: -match["similarity"])
+        return results[:limit]
+
+    # Suspicious pairs among a challenge's indexed submissions
+    async def suspicious_pairs(self, challenge_id: int, min_similarity: float = 0.5, limit: int = 50) -> List[dict]:
+        docs = await self.fingerprints.find({"challenge_id": challenge_id}).to_list(None)
+        return await asyncio.to_thread(rank_pairs, docs, self.common_ratio, min_similarity, limit)
+
+    # Batch mode: (re)index every accepted submission of a challenge (read through a
+    # SubmissionRepository), fingerprinting on the process pool, then rank its suspicious pairs
+    async def scan(self, submissions, challenge_id: int, min_similarity: float = 0.5, limit: int = 50,
+                   chunk_size: int = 64) -> dict:
+        started = time.time()
+        previous = await self.fingerprints.find({"challenge_id": challenge_id}, {"fingerprints": 1}).to_list(None)
+        rows = await submissions.accepted_sources(challenge_id)
+        loop = asyncio.get_running_loop()
+        chunks = [rows[i:i + chunk_size] for i in range(0, len(rows), chunk_size)]
+        results = await asyncio.gather(*(
+            loop.run_in_executor(self._get_pool(), _fingerprint_batch,
+                                 [row.get("source_code") or "" for row in chunk], self.k, self.window)
+            for chunk in chunks
+        ))
+        docs = [{"_id": row["_id"], "challenge_id": challenge_id, "user_id": row.get("user_id"),
+                 "language_id": row.get("language_id"), "fingerprints": values, "indexed_at": started}
+                for chunk, values_list in zip(chunks, results) for row, values in zip(chunk, values_list)]
+
+        # Rewrite the scanned documents, then drop the ones from before the scan that it did not
+        # find (no longer accepted); documents added since it started are left alone
+        written = docs
+        if docs:
+            await self.fingerprints.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}})
+            try:
+                await self.fingerprints.insert_many(docs, ordered=False)
+            except BulkWriteError as e:
+                # Inserted by add() in between, which counted them itself
+                failed = {error["index"] for error in e.details.get("writeErrors", [])}
+                written = [doc for i, doc in enumerate(docs) if i not in failed]
+        await self.fingerprints.delete_many({"challenge_id": challenge_id, "indexed_at": {"$not": {"$gte": started}}})
+
+        # Every document read at the start was rewritten or dropped, so the counts change by what
+        # was written minus what was read; add() counts the documents it inserts meanwhile
+        deltas = defaultdict(int)
+        for doc in written:
+            for value in doc["fingerprints"]:
+                deltas[value] += 1
+        for doc in previous:
+            for value in doc["fingerprints"]:
+                deltas[value] -= 1
+        by_delta = defaultdict(list)
+        for value, delta in deltas.items():
+            if delta:
+                by_delta[delta].append(value)
+        for delta, values in by_delta.items():
+            await self._count(challenge_id, values, delta)
+        self.counters["scans"] += 1
+        pairs = await asyncio.to_thread(rank_pairs, docs, self.common_ratio, min_similarity, limit)
+        return {"challenge_id": challenge_id, "indexed": len(docs), "pairs": pairs}
+
+
+_index: Optional[SimilarityIndex] = None
+
+
+# Process-wide index configured by the SIMILARITY_* settings; closed by the app lifespan
+def get_similarity_index() -> SimilarityIndex:
+    global _index
+    if _index is None:
+        from database.mongodb import get_mongo_db
+        db = get_mongo_db()
+        _index = SimilarityIndex(db["similarity_fingerprints"], db["similarity_fingerprint_counts"],
+                                 settings.SIMILARITY_K, settings.SIMILARITY_WINDOW, settings.SIMILARITY_COMMON_RATIO,
+                                 settings.SIMILARITY_WORKERS)
+    return _index
+
+
+def close_similarity_index():
+    global _index
+    if _index is not None:
+        _index.close()
+        _index = None
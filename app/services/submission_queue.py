@@ -0,0 +1,245 @@
+# Queue backends that carry submission jobs from the API to the evaluation workers.
+# A job is a plain JSON-serializable dict; see routers/submissions.py for its fields.
+# Every job has a priority class (SCHEDULER_PRIORITIES) which the memory queue schedules by;
+# the kafka queue delivers jobs in the order they were published.
+import asyncio
+import heapq
+import json
+import math
+import time
+from abc import ABC, abstractmethod
+from collections import deque
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+
+# The class a job is scheduled in; jobs published before classes existed go by their mode
+def priority_class(job: dict) -> str:
+    return job.get("priority") or ("run" if job.get("mode", "run") == "run" else settings.SUBMIT_PRIORITY_CLASS)
+
+
+class SubmissionQueue(ABC):
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    # Publish a job for evaluation
+    @abstractmethod
+    async def put(self, job: dict) -> None:
+        ...
+
+    # Wait for the next job to evaluate
+    @abstractmethod
+    async def get(self) -> dict:
+        ...
+
+    # Mark a job returned by get() as fully processed
+    async def ack(self, job: dict) -> None:
+        pass
+
+    # Number of jobs waiting to be picked up (best effort)
+    def depth(self) -> int:
+        return 0
+
+    # Jobs queued and running per priority class, where the backend knows
+    def stats(self) -> dict:
+        return {}
+
+
+# The jobs of one priority class. Users are served in turns (start-time fair queuing): a job is
+# tagged one past the later of the lane's virtual time and its user's previous tag, and the
+# lowest tag goes first, so a user with many jobs queued cannot hold back the others.
+class FairLane:
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit  # jobs of the class running at once; None: no limit
+        self.running = 0
+        self.virtual_time = 0.0
+        self._heap: list = []  # (tag, seq, job)
+        self._last_tag: Dict[object, float] = {}
+        # (enqueued at, seq) in arrival order; entries of jobs already taken are skipped lazily
+        self._arrivals: deque = deque()
+        self._queued: set = set()
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def push(self, user, job: dict, seq: int, now: float):
+        tag = max(self.virtual_time, self._last_tag.get(user, 0.0)) + 1.0
+        self._last_tag[user] = tag
+        heapq.heappush(self._heap, (tag, seq, user, job))
+        self._arrivals.append((now, seq))
+        self._queued.add(seq)
+
+    def pop(self) -> dict:
+        tag, seq, user, job = heapq.heappop(self._heap)
+        self.virtual_time = tag
+        self._queued.discard(seq)
+        # Users with nothing queued are forgotten; they come back at the virtual time
+        if self._last_tag.get(user) == tag:
+            del self._last_tag[user]
+        return job
+
+    # When the longest waiting job was queued
+    def oldest(self) -> Optional[float]:
+        while self._arrivals and self._arrivals[0][1] not in self._queued:
+            self._arrivals.popleft()
+        return self._arrivals[0][0] if self._arrivals else None
+
+    def available(self) -> bool:
+        return bool(self._heap) and (self.limit is None or self.running < self.limit)
+
+    def stats(self) -> dict:
+        return {"queued": len(self._heap), "running": self.running, "limit": self.limit, "users": len(self._last_tag)}
+
+
+# In-process queue, used for tests and single-node deployments. get() hands out the job of the
+# highest priority class below its concurrency share, taking turns between users within the
+# class; a class starved for `starvation_seconds` is served first.
+class InMemoryQueue(SubmissionQueue):
+    def __init__(self, maxsize: int = 0, slots: int = settings.SUBMISSION_WORKERS,
+                 priorities: Optional[List[str]] = None, shares: Optional[Dict[str, float]] = None,
+                 starvation_seconds: float = settings.SCHEDULER_STARVATION_SECONDS):
+        self.maxsize = maxsize
+        self.starvation_seconds = starvation_seconds
+        shares = settings.SCHEDULER_SHARES if shares is None else shares
+        self._lanes = {
+            name: FairLane(max(1, math.floor(shares[name] * slots)) if name in shares else None)
+            for name in (priorities or settings.SCHEDULER_PRIORITIES)
+        }
+        self._cond = asyncio.Condition()
+        self._size = 0
+        self._unfinished = 0
+        self._seq = 0
+
+    def _lane(self, job: dict) -> FairLane:
+        name = priority_class(job)
+        if name not in self._lanes:
+            raise ValueError(f"Unknown priority class: {name}")
+        return self._lanes[name]
+
+    def _next_lane(self) -> Optional[FairLane]:
+        lanes = [lane for lane in self._lanes.values() if lane.available()]
+        if not lanes:
+            return None
+        if self.starvation_seconds > 0:
+            now = time.monotonic()
+            starved = [lane for lane in lanes if now - lane.oldest() >= self.starvation_seconds]
+            if starved:
+                return min(starved, key=FairLane.oldest)
+        return lanes[0]
+
+    async def put(self, job: dict) -> None:
+        lane = self._lane(job)
+        async with self._cond:
+            if self.maxsize > 0:
+                await self._cond.wait_for(lambda: self._size < self.maxsize)
+            self._seq += 1
+            lane.push(job.get("user_id"), job, self._seq, time.monotonic())
+            self._size += 1
+            self._unfinished += 1
+            self._cond.notify_all()
+
+    async def get(self) -> dict:
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._next_lane() is not None)
+            lane = self._next_lane()
+            job = lane.pop()
+            lane.running += 1
+            self._size -= 1
+            self._cond.notify_all()
+            return job
+
+    async def ack(self, job: dict) -> None:
+        async with self._cond:
+            self._lane(job).running -= 1
+            self._unfinished -= 1
+            self._cond.notify_all()
+
+    def depth(self) -> int:
+        return self._size
+
+    def stats(self) -> dict:
+        return {name: lane.stats() for name, lane in self._lanes.items()}
+
+    # Wait until every job put so far has been acked
+    async def join(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._unfinished == 0)
+
+
+# Kafka-backed queue; the API process only produces, worker processes consume
+class KafkaQueue(SubmissionQueue):
+    def __init__(self, broker_url: str, topic: str, group_id: str, consume: bool = False):
+        self.broker_url = broker_url
+        self.topic = topic
+        self.group_id = group_id
+        self.consume = consume
+        self._producer = None
+        self._consumer = None
+
+    async def start(self):
+        from aiokafka import AIOKafkaConsumer, AIOKafkaProducer
+
+        self._producer = AIOKafkaProducer(
+            bootstrap_servers=self.broker_url,
+            value_serializer=lambda v: json.dumps(v).encode("utf-8"),
+        )
+        await self._producer.start()
+        if self.consume:
+            # Offsets are committed manually in ack() so a crashed worker's jobs are redelivered
+            self._consumer = AIOKafkaConsumer(
+                self.topic,
+                bootstrap_servers=self.broker_url,
+                group_id=self.group_id,
+                enable_auto_commit=False,
+                value_deserializer=lambda x: json.loads(x.decode("utf-8")),
+            )
+            await self._consumer.start()
+
+    async def stop(self):
+        if self._consumer is not None:
+            await self._consumer.stop()
+        if self._producer is not None:
+            await self._producer.stop()
+
+    async def put(self, job: dict) -> None:
+        await self._producer.send_and_wait(self.topic, job)
+
+    async def get(self) -> dict:
+        if self._consumer is None:
+            raise RuntimeError("KafkaQueue was created without consume=True")
+        message = await self._consumer.getone()
+        return message.value
+
+    async def ack(self, job: dict) -> None:
+        if self._consumer is not None:
+            await self._consumer.commit()
+
+
+_queue: Optional[SubmissionQueue] = None
+
+
+# Build the queue backend selected by SUBMISSION_QUEUE_BACKEND
+def create_submission_queue(consume: bool = False) -> SubmissionQueue:
+    backend = settings.SUBMISSION_QUEUE_BACKEND
+    if backend == "memory":
+        return InMemoryQueue(maxsize=settings.SUBMISSION_QUEUE_MAXSIZE, slots=settings.SUBMISSION_WORKERS)
+    if backend == "kafka":
+        return KafkaQueue(
+            settings.KAFKA_BROKER_URL,
+            settings.KAFKA_TOPIC,
+            settings.KAFKA_GROUP_ID,
+            consume=consume,
+        )
+    raise ValueError(f"Unknown SUBMISSION_QUEUE_BACKEND: {backend}")
+
+
+# Dependency to get the process-wide submission queue
+def get_submission_queue() -> SubmissionQueue:
+    global _queue
+    if _queue is None:
+        _queue = create_submission_queue(consume=settings.RUN_WORKERS_IN_APP)
+    return _queue
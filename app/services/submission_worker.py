@@ -0,0 +1,372 @@
+# Evaluation workers: take submission jobs off the queue, run them on the configured
+# executor (Judge0 or local) and write the verdict back to the submission document in Mongo.
+# Every status change is also published for clients following the submission (see
+# GET /submissions/{id}/events).
+import asyncio
+import logging
+import time
+from typing import List, Optional
+
+from bson.objectid import ObjectId
+
+from core import metrics
+from database.mysql_db import SessionLocal
+from database.submissions import STATUS_FIELDS, SubmissionRepository
+from services import judge0
+from services.admission import AdmissionControl, get_admission_control
+from services.analytics import SubmissionAnalytics
+from services.executors import Executor, get_executor
+from services.leaderboard import UNSCORED_STATUSES, Leaderboard
+from services.pubsub import PubSub
+from services.similarity import SimilarityIndex
+from services.submission_queue import SubmissionQueue, priority_class
+from services.testcase_sets import get_test_set_version, load_test_set
+from services.testcase_store import HiddenCaseStore, get_hidden_case_store
+from services.verdict_cache import VerdictCache, get_verdict_cache, verdict_key
+
+logger = logging.getLogger(__name__)
+
+# Result fields copied from the evaluator's result onto the submission document
+RESULT_FIELDS = ("stdout", "stderr", "compile_output", "time", "memory", "passed", "total", "test_results", "cached")
+
+# Pub/sub channels of a submission's status changes, and of all of one user's
+SUBMISSION_CHANNEL = "submission:{}"
+USER_CHANNEL = "user:{}"
+# Statuses a submission leaves again; every other one is final
+ACTIVE_STATUSES = ("Pending", "Processing")
+# Rejudges are not counted in the admission backlog, so they never shed new submissions
+REJUDGE = "rejudge"
+# What a rejudge needs to know about the verdict it replaces
+PREVIOUS_VERDICT_FIELDS = {"status_id": 1, "time": 1, "memory": 1, "finished_at": 1, "analytics_recorded": 1}
+
+
+class EvaluationError(Exception):
+    pass
+
+
+def _as_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+# Where a wrong answer first differs; the expected and actual text is only kept for public cases
+def _mismatch(case: dict, result: dict) -> Optional[dict]:
+    mismatch = result.get("mismatch")
+    if mismatch and case["hidden"]:
+        return {key: value for key, value in mismatch.items() if key not in ("expected", "actual")}
+    return mismatch
+
+
+# Fold per-test Judge0 results into one verdict: the first failing test decides the
+# status, time and memory are the worst observed across all tests.
+def aggregate_results(cases: List[dict], results: List[dict]) -> dict:
+    test_results = []
+    first_failure = None
+    for case, result in zip(cases, results):
+        status = result.get("status") or {}
+        test_results.append({
+            "test_case_id": case["id"],
+            "hidden": case["hidden"],
+            "status": status.get("description"),
+            "status_id": status.get("id"),
+            "time": result.get("time"),
+            "memory": result.get("memory"),
+            "mismatch": _mismatch(case, result)
+        })
+        if first_failure is None and status.get("id") != judge0.STATUS_ACCEPTED:
+            first_failure = (case, result)
+
+    passed = sum(1 for t in test_results if t["status_id"] == judge0.STATUS_ACCEPTED)
+    if first_failure is None:
+        status = {"id": judge0.STATUS_ACCEPTED, "description": "Accepted"}
+        case, result = cases[0], results[0]
+    else:
+        case, result = first_failure
+        status = result.get("status")
+
+    return {
+        "status": status,
+        # Never echo program output produced from a hidden input
+        "stdout": None if case["hidden"] else result.get("stdout"),
+        "stderr": None if case["hidden"] else result.get("stderr"),
+        "compile_output": result.get("compile_output"),
+        "time": str(max(_as_float(r.get("time")) for r in results)),
+        "memory": max(r.get("memory") or 0 for r in results),
+        "passed": passed,
+        "total": len(cases),
+        "test_results": test_results
+    }
+
+
+# Runs jobs on the configured executor. "run" jobs execute once against the submitted
+# stdin, "submit" jobs are judged against every test case of the challenge.
+class Evaluator:
+    def __init__(self, executor: Optional[Executor] = None, session_factory=SessionLocal,
+                 store: Optional[HiddenCaseStore] = None, cache: Optional[VerdictCache] = None,
+                 admission: Optional[AdmissionControl] = None):
+        self._executor = executor
+        self.session_factory = session_factory
+        self._store = store
+        self._cache = cache
+        self._admission = admission
+
+    @property
+    def executor(self) -> Executor:
+        return self._executor or get_executor()
+
+    @property
+    def store(self) -> HiddenCaseStore:
+        return self._store or get_hidden_case_store()
+
+    @property
+    def cache(self) -> VerdictCache:
+        return self._cache or get_verdict_cache()
+
+    @property
+    def admission(self) -> AdmissionControl:
+        return self._admission or get_admission_control()
+
+    def _with_session(self, fn, *args, **kwargs):
+        db = self.session_factory()
+        try:
+            return fn(db, *args, **kwargs)
+        finally:
+            db.close()
+
+    async def __call__(self, job: dict) -> dict:
+        if job.get("mode", "run") == "run":
+            async with self.admission.execution_slot():
+                with metrics.span("execution"):
+                    results = await self.executor.execute(job["source_code"], job["language_id"], [{"stdin": job["stdin"]}])
+            return results[0]
+        return await self.judge(job)
+
+    async def judge(self, job: dict) -> dict:
+        # Blocking MySQL/S3 calls are kept off the event loop
+        version = await metrics.to_thread("test_set.version", self._with_session, get_test_set_version, job["challenge_id"])
+        if version is not None:
+            key = verdict_key(job["source_code"], job["language_id"], job["challenge_id"], version)
+            cached = await self.cache.get(key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        test_set = await metrics.to_thread("test_set.load", self._with_session, load_test_set, job["challenge_id"],
+                                           store=self._store)
+        if test_set is None:
+            raise EvaluationError(f"Challenge {job['challenge_id']} not found")
+        try:
+            cases = test_set["cases"]
+            if not cases:
+                raise EvaluationError(f"Challenge {job['challenge_id']} has no test cases")
+
+            runs = [{
+                "stdin": case.get("input"), "stdin_path": case.get("input_path"),
+                "expected_output": case.get("expected_output"), "expected_output_path": case.get("expected_output_path"),
+                "compare_mode": test_set["compare_mode"], "float_tolerance": test_set["float_tolerance"]
+            } for case in cases]
+            limits = {"time_limit": test_set["time_limit"], "memory_limit": test_set["memory_limit"]}
+            async with self.admission.execution_slot():
+                with metrics.span("execution"):
+                    results = await self.executor.execute(job["source_code"], job["language_id"], runs, limits)
+        finally:
+            # The cached files may be evicted again once the executor is done with them
+            if test_set["pinned"]:
+                self.store.release(test_set["pinned"])
+        result = aggregate_results(cases, results)
+
+        # Stored under the version that was actually judged, even if it changed meanwhile
+        key = verdict_key(job["source_code"], job["language_id"], job["challenge_id"], test_set["test_set_version"])
+        await self.cache.put(key, result)
+        return result
+
+
+class SubmissionWorker:
+    def __init__(self, submissions: SubmissionRepository, runner=None, analytics: Optional[SubmissionAnalytics] = None,
+                 leaderboard: Optional[Leaderboard] = None, similarity: Optional[SimilarityIndex] = None,
+                 pubsub: Optional[PubSub] = None):
+        self.submissions = submissions
+        self.runner = runner or Evaluator()
+        self.analytics = analytics
+        self.leaderboard = leaderboard
+        self.similarity = similarity
+        self.pubsub = pubsub
+
+    # Evaluate a single job and persist its final state; timed per mode and verdict
+    async def process(self, job: dict):
+        started = time.perf_counter()
+        with metrics.tracking():
+            status = await self._process(job)
+        metrics.JOB_SECONDS.observe(time.perf_counter() - started, job.get("mode", "run"), status)
+
+    async def _process(self, job: dict) -> str:
+        submission_id = ObjectId(job["submission_id"])
+        # A rejudge replaces a verdict that is already counted; read it before it is overwritten
+        previous = None
+        if priority_class(job) == REJUDGE:
+            previous = await self.submissions.get(submission_id, PREVIOUS_VERDICT_FIELDS)
+        update = {"status": "Processing", "started_at": time.time()}
+        await self.submissions.update(submission_id, update)
+        await self.notify(job, update)
+        try:
+            result = await self.runner(job)
+        except Exception as e:
+            logger.exception("Evaluation of submission %s failed", job["submission_id"])
+            update = {"status": "Internal Error", "error": str(e), **self._finished(previous)}
+            await self.submissions.update(submission_id, update)
+            await self.notify(job, update)
+            await self.record_verdict(submission_id, job, update, previous)
+            return update["status"]
+
+        status = result.get("status") or {}
+        update = {
+            "status": status.get("description", "Unknown"),
+            "status_id": status.get("id"),
+            **self._finished(previous)
+        }
+        update.update({field: result[field] for field in RESULT_FIELDS if field in result})
+        await self.submissions.update(submission_id, update)
+        await self.notify(job, update)
+        await self.record_verdict(submission_id, job, update, previous)
+        await self.index_similarity(submission_id, job, update)
+        return update["status"]
+
+    # A rejudged submission keeps the finished_at of its first verdict, so it stays in the same
+    # analytics hour and its leaderboard times do not move
+    @staticmethod
+    def _finished(previous: Optional[dict]) -> dict:
+        now = time.time()
+        if previous and previous.get("finished_at"):
+            return {"finished_at": previous["finished_at"], "rejudged_at": now}
+        return {"finished_at": now}
+
+    async def record_verdict(self, submission_id: ObjectId, job: dict, update: dict, previous: Optional[dict]):
+        if previous is None:
+            await self.record_analytics(submission_id, job, update)
+            await self.record_leaderboard(submission_id, job, update)
+        else:
+            await self.revise_analytics(submission_id, job, update, previous)
+            await self.rescore_leaderboard(submission_id, job, update)
+
+    # Publish the status fields of a stored update to the submission's and its user's channels
+    async def notify(self, job: dict, update: dict):
+        if self.pubsub is None:
+            return
+        event = {"submission_id": job["submission_id"], "challenge_id": job.get("challenge_id"),
+                 **{field: update[field] for field in STATUS_FIELDS if field in update}}
+        try:
+            await self.pubsub.publish(SUBMISSION_CHANNEL.format(job["submission_id"]), event)
+            if job.get("user_id") is not None:
+                await self.pubsub.publish(USER_CHANNEL.format(job["user_id"]), event)
+        except Exception:
+            # Clients fall back to GET /submissions/{id}; the verdict is already stored
+            logger.exception("Publishing the status of submission %s failed", job["submission_id"])
+
+    # Count a graded submission's final verdict once, even if the job is delivered again
+    async def record_analytics(self, submission_id: ObjectId, job: dict, update: dict):
+        if self.analytics is None or job.get("mode", "run") != "submit":
+            return
+        try:
+            if await self.submissions.claim_analytics(submission_id):
+                await self.analytics.record(
+                    job["challenge_id"], job["language_id"], job["user_id"], update.get("status_id"),
+                    update.get("time"), update.get("memory"), update["finished_at"]
+                )
+        except Exception:
+            # Analytics never fail a submission
+            logger.exception("Recording analytics for submission %s failed", job["submission_id"])
+
+    # Score a graded verdict on the leaderboard once; compile and internal errors are not attempts
+    async def record_leaderboard(self, submission_id: ObjectId, job: dict, update: dict):
+        status_id = update.get("status_id")
+        if self.leaderboard is None or job.get("mode", "run") != "submit" or status_id in UNSCORED_STATUSES + (None,):
+            return
+        try:
+            if await self.submissions.claim(submission_id, "leaderboard_recorded"):
+                await self.leaderboard.record(
+                    job["user_id"], job["challenge_id"], status_id == judge0.STATUS_ACCEPTED, update["finished_at"]
+                )
+        except Exception:
+            logger.exception("Recording submission %s on the leaderboard failed", job["submission_id"])
+
+    # Swap the counted verdict of a rejudged submission for its new one. A redelivered rejudge
+    # reads the new verdict as the previous one, so revising again changes nothing.
+    async def revise_analytics(self, submission_id: ObjectId, job: dict, update: dict, previous: dict):
+        if self.analytics is None or job.get("mode", "run") != "submit":
+            return
+        if not previous.get("analytics_recorded"):
+            await self.record_analytics(submission_id, job, update)
+            return
+        try:
+            await self.analytics.revise(job["challenge_id"], job["language_id"], previous, update, update["finished_at"])
+        except Exception:
+            logger.exception("Revising analytics for submission %s failed", job["submission_id"])
+
+    # A rejudge can turn a solve into a wrong attempt or the other way round, so instead of counting
+    # the new verdict the user's entry for the challenge is rebuilt from their scored verdicts. The
+    # leaderboard_recorded claim marks which verdicts those are, so it follows the new one.
+    async def rescore_leaderboard(self, submission_id: ObjectId, job: dict, update: dict):
+        if self.leaderboard is None or job.get("mode", "run") != "submit":
+            return
+        try:
+            if update.get("status_id") in UNSCORED_STATUSES + (None,):
+                await self.submissions.release(submission_id, "leaderboard_recorded")
+            else:
+                await self.submissions.claim(submission_id, "leaderboard_recorded")
+            verdicts = await self.submissions.leaderboard_verdicts(job["user_id"], job["challenge_id"])
+            await self.leaderboard.rebuild(job["user_id"], job["challenge_id"], [
+                (verdict["finished_at"], verdict.get("status_id") == judge0.STATUS_ACCEPTED) for verdict in verdicts
+            ])
+        except Exception:
+            logger.exception("Rescoring submission %s on the leaderboard failed", job["submission_id"])
+
+    # Add accepted graded submissions to the similarity index, once
+    async def index_similarity(self, submission_id: ObjectId, job: dict, update: dict):
+        if self.similarity is None or job.get("mode", "run") != "submit" or update.get("status_id") != judge0.STATUS_ACCEPTED:
+            return
+        try:
+            if await self.submissions.claim(submission_id, "similarity_indexed"):
+                await self.similarity.add(
+                    submission_id, job["challenge_id"], job["user_id"], job["language_id"], job["source_code"]
+                )
+        except Exception:
+            logger.exception("Indexing submission %s for similarity failed", job["submission_id"])
+
+
+# A fixed number of concurrent consumers sharing one queue
+class WorkerPool:
+    def __init__(self, queue: SubmissionQueue, worker: SubmissionWorker, concurrency: int,
+                 admission: Optional[AdmissionControl] = None):
+        self.queue = queue
+        self.worker = worker
+        self.concurrency = concurrency
+        self.admission = admission
+        self._tasks = []
+        self.busy = 0
+
+    async def _consume(self):
+        while True:
+            job = await self.queue.get()
+            if job.get("enqueued_at"):
+                metrics.QUEUE_WAIT_SECONDS.observe(max(0.0, time.time() - job["enqueued_at"]), priority_class(job))
+            self.busy += 1
+            try:
+                await self.worker.process(job)
+            except Exception:
+                # Never let one bad job kill the consumer
+                logger.exception("Unhandled error while processing job %s", job)
+            finally:
+                self.busy -= 1
+                await self.queue.ack(job)
+                if self.admission is not None and priority_class(job) != REJUDGE:
+                    await self.admission.finished(job["submission_id"])
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._consume()) for _ in range(self.concurrency)]
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
@@ -0,0 +1,151 @@
+# Bulk import of a challenge's test cases from a zip archive of NN.in / NN.out pairs.
+# An optional manifest.json ({"hidden": ["03", "07"]}) lists the cases that are hidden;
+# their files are streamed from the archive to S3, the rest are stored in MySQL.
+# Either every case is imported or none is: all rows are inserted in one transaction,
+# and on any failure it is rolled back and the objects already uploaded are deleted.
+import asyncio
+import json
+import posixpath
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import BinaryIO, Dict, List, Tuple
+
+from boto3.s3.transfer import TransferConfig
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models import TestCase
+from services.s3 import get_s3_client
+from services.testcase_sets import bump_test_set_version, hidden_output_key
+
+MANIFEST = "manifest.json"
+
+
+class InvalidArchiveError(ValueError):
+    pass
+
+
+# Map case name -> {"in": member, "out": member} for every NN.in / NN.out in the archive
+def _pair_members(archive: zipfile.ZipFile) -> Dict[str, dict]:
+    pairs: Dict[str, dict] = {}
+    for info in archive.infolist():
+        if info.is_dir():
+            continue
+        name = posixpath.basename(info.filename)
+        stem, ext = posixpath.splitext(name)
+        if ext in (".in", ".out") and stem:
+            if ext[1:] in pairs.setdefault(stem, {}):
+                raise InvalidArchiveError(f"Duplicate file {name} in archive")
+            pairs[stem][ext[1:]] = info
+    for stem, pair in pairs.items():
+        if set(pair) != {"in", "out"}:
+            raise InvalidArchiveError(f"Test case {stem} needs both {stem}.in and {stem}.out")
+    if not pairs:
+        raise InvalidArchiveError("Archive contains no NN.in/NN.out test cases")
+    return pairs
+
+
+def _read_manifest(archive: zipfile.ZipFile, names) -> set:
+    try:
+        manifest = json.loads(archive.read(MANIFEST))
+    except KeyError:
+        return set()
+    except ValueError:
+        raise InvalidArchiveError("manifest.json is not valid JSON")
+    hidden = set(str(name) for name in manifest.get("hidden", []))
+    unknown = hidden - set(names)
+    if unknown:
+        raise InvalidArchiveError(f"manifest.json lists unknown test cases: {', '.join(sorted(unknown))}")
+    return hidden
+
+
+# Natural order, so 2.in comes before 10.in
+def _case_order(name: str):
+    return (0, int(name), name) if name.isdigit() else (1, 0, name)
+
+
+# Validate the archive and upload its hidden files. Runs in a worker thread; returns the
+# rows to insert and the uploaded keys, or raises after removing whatever was uploaded.
+def _stage(challenge_id: int, fileobj: BinaryIO, s3) -> Tuple[List[TestCase], int, List[str]]:
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise InvalidArchiveError("Upload is not a zip archive")
+
+    with archive:
+        pairs = _pair_members(archive)
+        hidden = _read_manifest(archive, pairs)
+        names = sorted(pairs, key=_case_order)
+
+        bucket = settings.AWS_BUCKET_NAME
+        # Large files go up in multipart chunks, several parts at a time, read straight
+        # from the archive without holding the whole file in memory
+        transfer = TransferConfig(
+            multipart_threshold=settings.TEST_CASE_IMPORT_PART_SIZE,
+            multipart_chunksize=settings.TEST_CASE_IMPORT_PART_SIZE,
+            max_concurrency=settings.TEST_CASE_IMPORT_PART_CONCURRENCY,
+        )
+        # Visible cases are validated before anything is uploaded
+        rows = []
+        keys = {}
+        for name in names:
+            if name in hidden:
+                keys[name] = f"hidden_cases/{uuid.uuid4()}.txt"
+                rows.append(TestCase(challenge_id=challenge_id, is_hidden=True, s3_key=keys[name]))
+                continue
+            try:
+                input_data = archive.read(pairs[name]["in"]).decode("utf-8")
+                expected_output = archive.read(pairs[name]["out"]).decode("utf-8")
+            except UnicodeDecodeError:
+                raise InvalidArchiveError(f"Test case {name} is not UTF-8 text; mark it hidden instead")
+            rows.append(TestCase(challenge_id=challenge_id, input_data=input_data,
+                                 expected_output=expected_output, is_hidden=False))
+
+        uploads = []
+        for name, key in keys.items():
+            uploads.append((pairs[name]["in"], key))
+            uploads.append((pairs[name]["out"], hidden_output_key(key)))
+
+        def upload(item):
+            member, key = item
+            with archive.open(member) as body:
+                s3.upload_fileobj(body, bucket, key, Config=transfer)
+            return key
+
+        uploaded = []
+        with ThreadPoolExecutor(max_workers=settings.TEST_CASE_IMPORT_UPLOAD_WORKERS) as pool:
+            futures = [pool.submit(upload, item) for item in uploads]
+            errors = []
+            for future in futures:
+                try:
+                    uploaded.append(future.result())
+                except Exception as e:
+                    errors.append(e)
+        if errors:
+            delete_objects(s3, bucket, uploaded)
+            raise errors[0]
+        return rows, len(keys), uploaded
+
+
+# Import every case of `fileobj` (a zip) into the challenge and commit, bumping the
+# test set version once. On failure the session is rolled back and uploaded objects
+# are removed. Returns {"imported", "hidden"} counts.
+async def import_test_cases(db: AsyncSession, challenge_id: int, fileobj: BinaryIO, s3=None) -> dict:
+    s3 = s3 or get_s3_client()
+    rows, hidden, uploaded = await asyncio.to_thread(_stage, challenge_id, fileobj, s3)
+    try:
+        db.add_all(rows)
+        await db.execute(bump_test_set_version(challenge_id))
+        await db.commit()
+    except Exception:
+        await db.rollback()
+        await asyncio.to_thread(delete_objects, s3, settings.AWS_BUCKET_NAME, uploaded)
+        raise
+    return {"imported": len(rows), "hidden": hidden}
+
+
+def delete_objects(s3, bucket: str, keys: List[str]):
+    # DeleteObjects takes at most 1000 keys per request
+    for i in range(0, len(keys), 1000):
+        s3.delete_objects(Bucket=bucket, Delete={"Objects": [{"Key": key} for key in keys[i:i + 1000]]})
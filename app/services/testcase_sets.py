@@ -0,0 +1,80 @@
+# Loads the complete test set of a challenge (public rows from MySQL, hidden
+# inputs/outputs from S3 through the local hidden case cache) in the shape the
+# evaluators need.
+from typing import Optional
+
+from sqlalchemy import Update, update
+
+from models import Challenge, TestCase
+from services.testcase_store import HiddenCaseStore, get_hidden_case_store
+
+
+# Hidden cases keep their input at `s3_key`; the expected output, unless it is stored
+# in the row itself, lives next to it with an .out extension.
+def hidden_output_key(s3_key: str) -> str:
+    return s3_key.rsplit(".", 1)[0] + ".out"
+
+
+# Statement invalidating memoized verdicts of a challenge; execute it in the caller's
+# transaction (sync or async session)
+def bump_test_set_version(challenge_id: int) -> Update:
+    return (
+        update(Challenge).where(Challenge.id == challenge_id)
+        .values(test_set_version=Challenge.test_set_version + 1)
+        .execution_options(synchronize_session=False)
+    )
+
+
+# Current test set version of a challenge, or None if it does not exist
+def get_test_set_version(db, challenge_id: int) -> Optional[int]:
+    row = db.query(Challenge.test_set_version).filter(Challenge.id == challenge_id).first()
+    return row[0] if row else None
+
+
+# Returns {"challenge_id", "test_set_version", "time_limit", "memory_limit", "compare_mode", "float_tolerance",
+# "cases": [...], "pinned": [...]}
+# or None if the challenge does not exist. Each case is {"id", "hidden", "input", "expected_output"}; hidden
+# cases carry "input_path" (and "expected_output_path" unless the row stores the output) instead, pointing
+# at cached files. Those files stay pinned in the cache until the caller passes "pinned" to store.release().
+def load_test_set(db, challenge_id: int, store: Optional[HiddenCaseStore] = None) -> Optional[dict]:
+    challenge = db.query(Challenge).filter(Challenge.id == challenge_id).first()
+    if not challenge:
+        return None
+
+    rows = db.query(TestCase).filter(TestCase.challenge_id == challenge_id).order_by(TestCase.id).all()
+
+    # Every hidden file of the challenge is fetched up front, in parallel on a cold cache
+    keys = []
+    for row in rows:
+        if row.is_hidden and row.s3_key:
+            keys.append(row.s3_key)
+            if row.expected_output is None:
+                keys.append(hidden_output_key(row.s3_key))
+    paths = {}
+    if keys:
+        store = store or get_hidden_case_store()
+        paths = store.get_paths(keys, pin=True)
+
+    cases = []
+    for row in rows:
+        case = {"id": row.id, "hidden": bool(row.is_hidden)}
+        if row.is_hidden and row.s3_key:
+            case["input_path"] = paths[row.s3_key]
+        else:
+            case["input"] = row.input_data or ""
+        if row.expected_output is None and row.is_hidden and row.s3_key:
+            case["expected_output_path"] = paths[hidden_output_key(row.s3_key)]
+        else:
+            case["expected_output"] = row.expected_output or ""
+        cases.append(case)
+
+    return {
+        "challenge_id": challenge.id,
+        "test_set_version": challenge.test_set_version,
+        "time_limit": challenge.time_limit,
+        "memory_limit": challenge.memory_limit,
+        "compare_mode": challenge.compare_mode or "exact",
+        "float_tolerance": challenge.float_tolerance,
+        "cases": cases,
+        "pinned": list(paths)
+    }
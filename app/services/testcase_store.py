@@ -0,0 +1,211 @@
+# Read-through, size-bounded on-disk cache of hidden test case files from S3.
+# Hidden case keys are immutable (every upload gets a fresh uuid key), so a cached
+# file stays valid until evicted; entries are still re-checked against the object's
+# ETag every HIDDEN_CASE_REVALIDATE_SECONDS in case an object is overwritten in place.
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+from core.config import settings
+from services.s3 import get_s3_client
+
+
+# A cached file as text, for executors that must send it (Judge0 takes JSON strings). The
+# local executor and the comparator stream cached files from disk instead of reading them whole.
+def read_text(path: str) -> str:
+    with open(path, encoding="utf-8") as f:
+        return f.read()
+
+
+class HiddenCaseStore:
+    def __init__(self, cache_dir: str, max_bytes: int, s3=None, bucket: str = None,
+                 revalidate_seconds: float = 300, prefetch_workers: int = 8):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.s3 = s3 or get_s3_client()
+        self.bucket = bucket or settings.AWS_BUCKET_NAME
+        self.revalidate_seconds = revalidate_seconds
+        self._fetcher = ThreadPoolExecutor(max_workers=prefetch_workers, thread_name_prefix="hidden-cases")
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()  # s3_key -> {"path", "etag", "size", "validated_at"}
+        self._pins: Dict[str, int] = {}
+        self._inflight: Dict[str, threading.Event] = {}
+        self.total_bytes = 0
+        self.counters = {"hits": 0, "misses": 0, "revalidations": 0, "evictions": 0, "bytes_downloaded": 0}
+        self._make_private_dir()
+        self._load_index()
+
+    def stats(self) -> dict:
+        return {**self.counters, "entries": len(self._entries), "bytes": self.total_bytes, "max_bytes": self.max_bytes}
+
+    # Hidden inputs and expected outputs must only be readable by this service, so the cache
+    # directory is 0700 and must not have been created by anyone else beforehand. Local-mode
+    # programs are kept out by running as another user (LOCAL_EXECUTOR_USER).
+    def _make_private_dir(self):
+        os.makedirs(self.cache_dir, mode=0o700, exist_ok=True)
+        if os.stat(self.cache_dir).st_uid != os.getuid():
+            raise PermissionError(f"Hidden case cache {self.cache_dir} is not owned by this user")
+        os.chmod(self.cache_dir, 0o700)
+
+    def _file_for(self, s3_key: str) -> str:
+        return os.path.join(self.cache_dir, hashlib.sha1(s3_key.encode("utf-8")).hexdigest())
+
+    # Pick up files cached by a previous run of this process
+    def _load_index(self):
+        metas = []
+        for name in os.listdir(self.cache_dir):
+            if not name.endswith(".meta"):
+                continue
+            try:
+                with open(os.path.join(self.cache_dir, name)) as f:
+                    meta = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if os.path.exists(meta["path"]):
+                metas.append(meta)
+        for meta in sorted(metas, key=lambda m: m["validated_at"]):
+            self._entries[meta["key"]] = meta
+            self.total_bytes += meta["size"]
+        self._evict()
+
+    def _download(self, s3_key: str) -> dict:
+        path = self._file_for(s3_key)
+        obj = self.s3.get_object(Bucket=self.bucket, Key=s3_key)
+        size = 0
+        with open(os.open(path + ".part", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "wb") as f:
+            for chunk in iter(lambda: obj["Body"].read(1024 * 1024), b""):
+                f.write(chunk)
+                size += len(chunk)
+        obj["Body"].close()
+        os.chmod(path + ".part", 0o600)
+        os.replace(path + ".part", path)
+        meta = {"key": s3_key, "path": path, "etag": obj.get("ETag"), "size": size, "validated_at": time.time()}
+        with open(os.open(path + ".meta", os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), "w") as f:
+            json.dump(meta, f)
+        self.counters["bytes_downloaded"] += size
+        return meta
+
+    def _is_fresh(self, entry: dict) -> bool:
+        if time.time() - entry["validated_at"] < self.revalidate_seconds:
+            return True
+        self.counters["revalidations"] += 1
+        head = self.s3.head_object(Bucket=self.bucket, Key=entry["key"])
+        if head.get("ETag") != entry["etag"]:
+            return False
+        entry["validated_at"] = time.time()
+        return True
+
+    # Drop least recently used, unpinned files until the cache fits in max_bytes
+    def _evict(self):
+        for key in list(self._entries):
+            if self.total_bytes <= self.max_bytes:
+                break
+            if self._pins.get(key):
+                continue
+            entry = self._entries.pop(key)
+            self.total_bytes -= entry["size"]
+            self.counters["evictions"] += 1
+            for path in (entry["path"], entry["path"] + ".meta"):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    # Local path of an S3 object, downloading it on a miss. With pin=True the file is
+    # protected from eviction until release() is called for it.
+    def get_path(self, s3_key: str, pin: bool = False) -> str:
+        while True:
+            with self._lock:
+                entry = self._entries.get(s3_key)
+                waiter = self._inflight.get(s3_key)
+                if entry is None and waiter is None:
+                    # This thread downloads; concurrent callers wait for it
+                    self._inflight[s3_key] = threading.Event()
+                    break
+            if waiter is not None:
+                waiter.wait()
+                continue
+            if self._is_fresh(entry):
+                with self._lock:
+                    if s3_key in self._entries:
+                        self._entries.move_to_end(s3_key)
+                        if pin:
+                            self._pins[s3_key] = self._pins.get(s3_key, 0) + 1
+                        self.counters["hits"] += 1
+                        return entry["path"]
+                continue
+            with self._lock:
+                if self._entries.get(s3_key) is entry:
+                    self._entries.pop(s3_key)
+                    self.total_bytes -= entry["size"]
+
+        self.counters["misses"] += 1
+        try:
+            meta = self._download(s3_key)
+            with self._lock:
+                self._entries[s3_key] = meta
+                self.total_bytes += meta["size"]
+                if pin:
+                    self._pins[s3_key] = self._pins.get(s3_key, 0) + 1
+                self._evict()
+            return meta["path"]
+        finally:
+            with self._lock:
+                self._inflight.pop(s3_key).set()
+
+    # Fetch several objects in parallel; returns {s3_key: local path}. If any fetch fails, every
+    # pin taken by the others is released before the error is raised.
+    def get_paths(self, s3_keys: Iterable[str], pin: bool = False) -> Dict[str, str]:
+        keys = list(dict.fromkeys(s3_keys))
+        futures = [self._fetcher.submit(self.get_path, key, pin) for key in keys]
+        paths, error = {}, None
+        for key, future in zip(keys, futures):
+            try:
+                paths[key] = future.result()
+            except BaseException as e:
+                error = error or e
+        if error is not None:
+            if pin:
+                self.release(list(paths))
+            raise error
+        return paths
+
+    def release(self, s3_keys: List[str]):
+        with self._lock:
+            for key in s3_keys:
+                count = self._pins.get(key, 0) - 1
+                if count > 0:
+                    self._pins[key] = count
+                else:
+                    self._pins.pop(key, None)
+            self._evict()
+
+    def close(self):
+        self._fetcher.shutdown(wait=False)
+
+
+_store: Optional[HiddenCaseStore] = None
+
+
+def get_hidden_case_store() -> HiddenCaseStore:
+    global _store
+    if _store is None:
+        _store = HiddenCaseStore(
+            settings.HIDDEN_CASE_CACHE_DIR,
+            settings.HIDDEN_CASE_CACHE_MAX_BYTES,
+            revalidate_seconds=settings.HIDDEN_CASE_REVALIDATE_SECONDS,
+            prefetch_workers=settings.HIDDEN_CASE_PREFETCH_WORKERS,
+        )
+    return _store
+
+
+def close_hidden_case_store():
+    global _store
+    if _store is not None:
+        _store.close()
+        _store = None
@@ -0,0 +1,93 @@
+# Memoized verdicts for graded submissions. Identical source code judged against the
+# same version of a challenge's test set gets the same verdict, so it is stored under
+# a content hash and served without running the program again.
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Optional
+
+from core.config import settings
+
+# Verdicts that depend on machine load rather than on the code are never memoized
+UNCACHEABLE_STATUSES = (5, 13)  # Time Limit Exceeded, Internal Error
+
+
+def verdict_key(source_code: str, language_id: int, challenge_id: int, test_set_version: int) -> str:
+    digest = hashlib.sha256()
+    for part in (str(language_id), str(challenge_id), str(test_set_version), source_code):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def is_cacheable(result: dict) -> bool:
+    return (result.get("status") or {}).get("id") not in UNCACHEABLE_STATUSES
+
+
+# Bounded in-memory LRU in front of an optional Mongo collection shared by all workers
+class VerdictCache:
+    def __init__(self, max_entries: int = 10000, collection=None):
+        self.max_entries = max_entries
+        self.collection = collection
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self.counters = {"hits": 0, "mongo_hits": 0, "misses": 0, "stores": 0, "evictions": 0}
+
+    def stats(self) -> dict:
+        lookups = self.counters["hits"] + self.counters["misses"]
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hit_ratio": self.counters["hits"] / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key: str, result: dict):
+        self._entries[key] = result
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get(self, key: str) -> Optional[dict]:
+        result = self._entries.get(key)
+        if result is not None:
+            self._entries.move_to_end(key)
+            self.counters["hits"] += 1
+            return result
+        if self.collection is not None:
+            doc = await self.collection.find_one({"_id": key})
+            if doc is not None:
+                self._remember(key, doc["result"])
+                self.counters["hits"] += 1
+                self.counters["mongo_hits"] += 1
+                return doc["result"]
+        self.counters["misses"] += 1
+        return None
+
+    async def put(self, key: str, result: dict):
+        if not is_cacheable(result):
+            return
+        self._remember(key, result)
+        self.counters["stores"] += 1
+        if self.collection is not None:
+            await self.collection.replace_one(
+                {"_id": key}, {"_id": key, "result": result, "created_at": time.time()}, upsert=True
+            )
+
+    def clear(self):
+        self._entries.clear()
+
+
+_cache: Optional[VerdictCache] = None
+
+
+# Process-wide cache configured by VERDICT_CACHE_SIZE / VERDICT_CACHE_MONGO
+def get_verdict_cache() -> VerdictCache:
+    global _cache
+    if _cache is None:
+        collection = None
+        if settings.VERDICT_CACHE_MONGO:
+            from database.mongodb import get_mongo_db
+            collection = get_mongo_db()["verdict_cache"]
+        _cache = VerdictCache(settings.VERDICT_CACHE_SIZE, collection)
+    return _cache
@@ -0,0 +1,161 @@
+# Warm Python interpreters for the local executor. Starting CPython costs tens of
+# milliseconds, often more than the submission itself. Instead, every local executor
+# worker keeps one already-booted "zygote" interpreter that imports nothing but the
+# few stdlib modules below. Each test case is forked from it: the child applies the
+# run's limits to itself, swaps in the run's stdin/stdout/stderr, executes the program
+# in fresh globals and exits. Nothing a program does can reach the next run, because
+# every run is a new process and the zygote itself never executes user code.
+import atexit
+import json
+import subprocess
+import sys
+from typing import Optional
+
+# The whole environment of compilers, programs and zygotes: nothing of the service's own
+# (secret key, database URLs, cloud credentials) may reach untrusted code
+SANDBOX_ENV = {"PATH": "/usr/local/bin:/usr/bin:/bin", "LANG": "C.UTF-8"}
+
+ZYGOTE = r"""
+import json, os, resource, sys
+
+def run_child(job):
+    os.setsid()
+    os.chdir(job["cwd"])
+    for fd, path, flags in ((0, job["stdin"], os.O_RDONLY),
+                            (1, job["stdout"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC),
+                            (2, job["stderr"], os.O_WRONLY | os.O_CREAT | os.O_TRUNC)):
+        f = os.open(path, flags, 0o600)
+        os.dup2(f, fd)
+        os.close(f)
+    # The files are open; from here on the program has only the sandbox user's rights
+    if job["uid"] is not None:
+        os.setgroups([])
+        os.setgid(job["gid"])
+        os.setuid(job["uid"])
+    resource.setrlimit(resource.RLIMIT_CPU, (job["cpu"], job["cpu"] + 1))
+    resource.setrlimit(resource.RLIMIT_AS, (job["memory"], job["memory"]))
+    resource.setrlimit(resource.RLIMIT_FSIZE, (job["output"], job["output"]))
+    resource.setrlimit(resource.RLIMIT_CORE, (0, 0))
+    sys.stdin = open(0, "r", closefd=False)
+    sys.stdout = open(1, "w", closefd=False)
+    sys.stderr = open(2, "w", closefd=False)
+    sys.argv = ["main.py"]
+    code = 0
+    try:
+        with open(job["source"]) as f:
+            program = compile(f.read(), "main.py", "exec")
+        exec(program, {"__name__": "__main__", "__builtins__": __builtins__})
+    except SystemExit as e:
+        if e.code is None:
+            code = 0
+        elif isinstance(e.code, int):
+            code = e.code
+        else:
+            print(e.code, file=sys.stderr)
+            code = 1
+    except BaseException:
+        import traceback
+        traceback.print_exc()
+        code = 1
+    # Mirror normal interpreter shutdown before leaving without returning to the zygote loop
+    try:
+        if "threading" in sys.modules:
+            sys.modules["threading"]._shutdown()
+        import atexit
+        atexit._run_exitfuncs()
+        sys.stdout.flush()
+        sys.stderr.flush()
+    except BaseException:
+        code = code or 1
+    os._exit(code & 0xFF)
+
+control = sys.stdin.buffer
+reply = os.fdopen(os.dup(1), "w")
+for header in control:
+    job = json.loads(header)
+    pid = os.fork()
+    if pid == 0:
+        try:
+            reply.close()
+            run_child(job)
+        finally:
+            os._exit(1)
+    reply.write(json.dumps({"pid": pid}) + "\n")
+    reply.flush()
+    _, status, usage = os.wait4(pid, 0)
+    reply.write(json.dumps({"status": status, "cpu": usage.ru_utime + usage.ru_stime, "memory": usage.ru_maxrss}) + "\n")
+    reply.flush()
+"""
+
+
+# A program forked from the zygote. wait() returns (wait status, cpu seconds, max RSS in KB).
+class ZygoteChild:
+    def __init__(self, zygote: "PythonZygote", pid: int):
+        self.zygote = zygote
+        self.pid = pid
+
+    def wait(self):
+        reply = self.zygote.read_reply()
+        return reply["status"], reply["cpu"], reply["memory"]
+
+
+class PythonZygote:
+    def __init__(self):
+        self._proc: Optional[subprocess.Popen] = None
+
+    def _ensure_running(self):
+        if self._proc is None or self._proc.poll() is not None:
+            self._proc = subprocess.Popen(
+                [sys.executable, "-I", "-c", ZYGOTE],
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                start_new_session=True, env=SANDBOX_ENV,
+            )
+
+    def read_reply(self) -> dict:
+        line = self._proc.stdout.readline()
+        if not line:
+            self._proc = None
+            raise RuntimeError("Python zygote exited unexpectedly")
+        return json.loads(line)
+
+    # Fork a child running `source` with the given files and limits, as `sandbox` ((uid, gid)) if given
+    def start(self, source: str, cwd: str, stdin: str, stdout: str, stderr: str,
+              cpu_seconds: int, memory_bytes: int, output_bytes: int,
+              sandbox: Optional[tuple] = None) -> ZygoteChild:
+        self._ensure_running()
+        uid, gid = sandbox or (None, None)
+        header = {
+            "source": source, "cwd": cwd, "stdin": stdin, "stdout": stdout, "stderr": stderr,
+            "cpu": cpu_seconds, "memory": memory_bytes, "output": output_bytes, "uid": uid, "gid": gid,
+        }
+        self._proc.stdin.write(json.dumps(header).encode("utf-8") + b"\n")
+        self._proc.stdin.flush()
+        return ZygoteChild(self, self.read_reply()["pid"])
+
+    def close(self):
+        if self._proc is not None and self._proc.poll() is None:
+            self._proc.kill()
+            self._proc.wait()
+        self._proc = None
+
+
+_zygote: Optional[PythonZygote] = None
+
+
+# One zygote per local executor worker process, started on first use. The worker runs
+# one test case at a time, so its zygote never has more than one child alive.
+def get_zygote() -> PythonZygote:
+    global _zygote
+    if _zygote is None:
+        _zygote = PythonZygote()
+    return _zygote
+
+
+# Pool workers may exit without running atexit hooks; the zygote then stops by itself
+# once its control pipe closes
+def _close_on_exit():
+    if _zygote is not None:
+        _zygote.close()
+
+
+atexit.register(_close_on_exit)
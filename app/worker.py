@@ -0,0 +1,56 @@
+# Standalone evaluation worker for the Kafka backend.
+# Run with: python worker.py (with SUBMISSION_QUEUE_BACKEND=kafka)
+import asyncio
+import logging
+
+from core import metrics
+from core.config import settings
+from core.db import database
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.admission import get_admission_control
+from services.analytics import get_submission_analytics
+from services.executors import close_executor
+from services.judge0 import close_judge0_client, get_judge0_client
+from services.leaderboard import get_leaderboard
+from services.pubsub import close_pubsub, get_pubsub
+from services.similarity import close_similarity_index, get_similarity_index
+from services.submission_queue import create_submission_queue
+from services.testcase_store import close_hidden_case_store
+from services.submission_worker import SubmissionWorker, WorkerPool
+
+
+async def main():
+    database.connect()
+    # Judge0 callbacks reach this process, and its status events reach the API, through the pub/sub
+    pubsub = get_pubsub()
+    await pubsub.start()
+    if settings.EXECUTOR_BACKEND == "judge0":
+        await get_judge0_client().start()
+    queue = create_submission_queue(consume=True)
+    await queue.start()
+    worker = SubmissionWorker(SubmissionRepository(get_submissions_collection()), analytics=get_submission_analytics(),
+                              leaderboard=get_leaderboard(), similarity=get_similarity_index(), pubsub=pubsub)
+    admission = get_admission_control()
+    pool = WorkerPool(queue, worker, settings.SUBMISSION_WORKERS, admission)
+    pool.start()
+    metrics.watch_pipeline(queue, pool, admission)
+    server = await metrics.serve(settings.WORKER_METRICS_PORT) if settings.WORKER_METRICS_PORT else None
+    try:
+        await asyncio.Event().wait()
+    finally:
+        if server is not None:
+            server.close()
+        await pool.stop()
+        await queue.stop()
+        await close_executor()
+        await close_judge0_client()
+        await close_pubsub()
+        close_hidden_case_store()
+        close_similarity_index()
+        await database.disconnect()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
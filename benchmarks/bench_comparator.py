@@ -0,0 +1,103 @@
+# Throughput and peak memory of the streaming output comparator per mode and output size,
+# next to the naive approach (read both files, decode, rstrip and ==). Each measurement
+# runs in a fresh process so its peak RSS is its own.
+#
+#   python benchmarks/bench_comparator.py --sizes 1 10 100
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import resource
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+
+from services.comparator import compare  # noqa: E402
+
+MODES = ("naive", "exact", "whitespace", "float", "line_set")
+
+
+# Roughly `megabytes` of output: lines of space-separated integers and floats
+def write_output(path: str, megabytes: int, seed: int):
+    rng = random.Random(seed)
+    target = megabytes * 1024 * 1024
+    written = 0
+    with open(path, "w") as f:
+        while written < target:
+            line = " ".join(str(rng.randrange(10 ** 9)) if i % 2 else f"{rng.random() * 1000:.6f}"
+                            for i in range(10)) + "\n"
+            f.write(line)
+            written += len(line)
+
+
+def naive(actual: str, expected: str) -> bool:
+    with open(actual, "rb") as a, open(expected, "rb") as b:
+        return a.read().decode().rstrip() == b.read().decode().rstrip()
+
+
+def _measure(mode: str, actual: str, expected: str, queue):
+    baseline = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    started = time.perf_counter()
+    if mode == "naive":
+        matched = naive(actual, expected)
+    else:
+        with open(actual, "rb") as a, open(expected, "rb") as b:
+            matched = compare(a, b, mode) is None
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({"matched": matched, "elapsed": elapsed, "peak_kb": peak, "added_kb": peak - baseline})
+
+
+def measure(mode: str, actual: str, expected: str) -> dict:
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_measure, args=(mode, actual, expected, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming comparator throughput and memory")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100], help="output sizes in MB")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=MODES)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in args.sizes:
+            expected = os.path.join(tmp, f"{size}.out")
+            write_output(expected, size, args.seed)
+            actual = expected + ".actual"
+            # Same content in a separate file, so matching outputs are read in full
+            with open(expected, "rb") as src, open(actual, "wb") as dst:
+                while chunk := src.read(1024 * 1024):
+                    dst.write(chunk)
+            for mode in args.modes:
+                measured = measure(mode, actual, expected)
+                assert measured["matched"], (mode, size)
+                result = {
+                    "mode": mode,
+                    "size_mb": size,
+                    "seconds": round(measured["elapsed"], 3),
+                    "mb_per_second": round(size / measured["elapsed"], 1),
+                    "added_rss_mb": round(measured["added_kb"] / 1024, 1),
+                }
+                results.append(result)
+                print(json.dumps(result))
+            os.remove(actual)
+            os.remove(expected)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+# End-to-end load test of a contest: starts the API (app/main.py, one uvicorn process with the
+# in-app submission workers) against local stand-ins and replays contest traffic through HTTP.
+#
+#   Judge0  tests/fake_judge0.py in its own process; submissions report "Processing" for
+#           --judge0-latency seconds, Python programs really run unless --no-execute
+#   SQL     a SQLite file, or --database-url (e.g. a throwaway local MySQL server)
+#   Mongo   mongomock inside the API process, or --mongo-url (e.g. a local mongod)
+#   S3      S3_BACKEND=local under a temporary directory
+#
+# Phases: a login burst of every user, then a submission storm (each user submits wrong
+# answers and then the right one, polling the status until the verdict, or with --push
+# following its server-sent events) while the other contestants poll the catalog and the
+# leaderboard. Reports throughput and p50/p95/p99 per endpoint, and the submit-to-verdict
+# latency; --json files from two commits compare with --compare.
+#
+#   python benchmarks/bench_e2e.py --users 200 --json after.json
+#   python benchmarks/bench_e2e.py --compare before.json after.json
+#
+# Per-IP rate limits are off (all traffic comes from one address); per-user and per-account
+# limits stay on. bcrypt runs at --bcrypt-rounds, by default far below production's cost.
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import defaultdict
+from typing import Optional
+
+import httpx
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(os.path.join(ROOT, "app"))
+
+PASSWORD = "bench-password"
+SOLUTION = "print(sum(map(int, open(0).read().split())))  # {tag}\n"
+WRONG = "print(0)  # {tag}\n"
+PENDING = ("Pending", "Processing")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# Environment of the API process: every backing service points at a stand-in
+def api_env(args, tmp: str, judge0_port: int, api_port: int) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "DATABASE_URL": args.database_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'bench.db')}",
+        "MONGO_URL": args.mongo_url or "mongodb://mongomock",
+        "MONGO_DB_NAME": f"bench_{uuid.uuid4().hex[:8]}",
+        "JUDGE0_URL": f"http://127.0.0.1:{judge0_port}",
+        "EXECUTOR_BACKEND": "judge0",
+        "S3_BACKEND": "local",
+        "S3_LOCAL_ROOT": os.path.join(tmp, "s3"),
+        "AWS_BUCKET_NAME": "bench",
+        "HIDDEN_CASE_CACHE_DIR": os.path.join(tmp, "hidden-cases"),
+        "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+        "LOGIN_RATE_PER_IP": "0",
+        "SUBMIT_RATE_PER_IP": "0",
+        "SECRET_KEY": env.get("SECRET_KEY") or uuid.uuid4().hex,
+        "BENCH_MONGOMOCK": "0" if args.mongo_url else "1",
+    })
+    if args.callbacks:
+        env.update({"JUDGE0_CALLBACK_URL": f"http://127.0.0.1:{api_port}/internal/judge0/callback",
+                    "JUDGE0_CALLBACK_SECRET": uuid.uuid4().hex})
+    return env
+
+
+# Users, challenges and their test cases (hidden ones as files in the local S3 bucket),
+# written directly with a sync engine before the API starts
+def seed(args, env: dict) -> list:
+    os.environ.update(env)
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import Session
+    from core.db import sync_url
+    from database.mysql_db import Base
+    from models import Challenge, TestCase, User
+    from services.passwords import crypt_context
+    from services.testcase_sets import hidden_output_key
+
+    rng = random.Random(args.seed)
+    engine = create_engine(sync_url(env["DATABASE_URL"]))
+    Base.metadata.create_all(engine)
+    password_hash = crypt_context(args.bcrypt_rounds).hash(PASSWORD)
+    bucket = os.path.join(env["S3_LOCAL_ROOT"], env["AWS_BUCKET_NAME"])
+    emails = []
+    with Session(engine) as db:
+        for i in range(args.users):
+            email = f"contestant-{i}-{uuid.uuid4().hex[:6]}@example.com"
+            db.add(User(username=f"contestant{i}", email=email, password_hash=password_hash))
+            emails.append(email)
+        for i in range(args.challenges):
+            challenge = Challenge(title=f"Contest problem {i}", description="x" * 500,
+                                  difficulty=("easy", "medium", "hard")[i % 3], time_limit=2, memory_limit=128)
+            db.add(challenge)
+            db.flush()
+            for case in range(args.test_cases):
+                numbers = [rng.randrange(10 ** 6) for _ in range(rng.randrange(1, 50))]
+                stdin, expected = " ".join(map(str, numbers)), str(sum(numbers))
+                if case < args.test_cases // 2:
+                    db.add(TestCase(challenge_id=challenge.id, input_data=stdin, expected_output=expected))
+                    continue
+                s3_key = f"hidden_cases/{uuid.uuid4()}.txt"
+                os.makedirs(os.path.join(bucket, "hidden_cases"), exist_ok=True)
+                with open(os.path.join(bucket, s3_key), "w") as f:
+                    f.write(stdin)
+                with open(os.path.join(bucket, hidden_output_key(s3_key)), "w") as f:
+                    f.write(expected)
+                db.add(TestCase(challenge_id=challenge.id, is_hidden=True, s3_key=s3_key))
+        db.commit()
+    engine.dispose()
+    return emails
+
+
+# `bench_e2e.py serve PORT`: the API process, with Motor swapped for mongomock unless a mongod is given
+def serve(port: int):
+    import uvicorn
+    import core.db
+    if os.environ.get("BENCH_MONGOMOCK") == "1":
+        from mongomock_motor import AsyncMongoMockClient
+        core.db.AsyncIOMotorClient = AsyncMongoMockClient
+    from main import app
+    # Pooled client connections sit idle between polls; a short keep-alive races with their reuse
+    uvicorn.run(app, host="127.0.0.1", port=port, log_level="warning", timeout_keep_alive=75)
+
+
+def start(command: list, env: dict, cwd: str = ROOT) -> subprocess.Popen:
+    return subprocess.Popen(command, env=env, cwd=cwd)
+
+
+async def wait_ready(url: str, process: subprocess.Popen, path: str, timeout: float = 60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(base_url=url) as client:
+        while time.monotonic() < deadline:
+            if process.poll() is not None:
+                raise SystemExit(f"{url} exited with code {process.returncode}")
+            try:
+                await client.get(path)
+                return
+            except httpx.TransportError:
+                await asyncio.sleep(0.1)
+    raise SystemExit(f"{url} did not start within {timeout}s")
+
+
+# Latencies and status codes per endpoint within one phase. A failed connection counts as an
+# error and gives None instead of a response.
+class Recorder:
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    async def request(self, client: httpx.AsyncClient, endpoint: str, method: str, url: str,
+                      **kwargs) -> Optional[httpx.Response]:
+        started = time.perf_counter()
+        try:
+            response = await client.request(method, url, **kwargs)
+        except httpx.TransportError:
+            self.observe(endpoint, time.perf_counter() - started, True)
+            return None
+        self.observe(endpoint, time.perf_counter() - started, response.status_code >= 400)
+        return response
+
+    def observe(self, endpoint: str, seconds: float, error: bool = False):
+        self.latencies[endpoint].append(seconds)
+        if error:
+            self.errors[endpoint] += 1
+
+    def report(self, phase: str, elapsed: float) -> list:
+        results = []
+        for endpoint, latencies in self.latencies.items():
+            latencies.sort()
+            results.append({
+                "phase": phase,
+                "endpoint": endpoint,
+                "requests": len(latencies),
+                "errors": self.errors[endpoint],
+                "requests_per_second": round(len(latencies) / elapsed, 1),
+                "p50_ms": round(statistics.median(latencies) * 1000, 1),
+                "p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                "p99_ms": round(percentile(latencies, 0.99) * 1000, 1),
+            })
+        return results
+
+
+def percentile(ordered: list, q: float) -> float:
+    return ordered[max(int(len(ordered) * q + 0.5) - 1, 0)]
+
+
+async def login_burst(client, emails: list, concurrency: int) -> tuple:
+    recorder, tokens = Recorder(), {}
+    remaining = iter(emails)
+
+    async def worker():
+        for email in remaining:
+            response = await recorder.request(client, "POST /auth/login", "POST", "/auth/login",
+                                              json={"email": email, "password": PASSWORD})
+            if response is not None and response.status_code == 200:
+                tokens[email] = response.json()["access_token"]
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return recorder.report("login_burst", time.perf_counter() - started), tokens
+
+
+async def contest(client, args, tokens: list, challenge_ids: list) -> list:
+    recorder = Recorder()
+    storm_done = asyncio.Event()
+    slots = asyncio.Semaphore(args.concurrency)
+    rng = random.Random(args.seed)
+
+    # A verdict other than the expected one counts as an error
+    async def submit_and_wait(headers: dict, challenge_id: int, source: str, expected: str):
+        async with slots:
+            submitted = time.perf_counter()
+            response = await recorder.request(client, "POST /submissions/", "POST", "/submissions/", headers=headers, json={
+                "challenge_id": challenge_id, "language_id": 71, "source_code": source, "mode": "submit"
+            })
+        if response is None or response.status_code != 202:
+            return
+        submission_id = response.json()["submission_id"]
+        if args.push:
+            # One server-sent event stream per submission instead of status polls
+            response = await recorder.request(client, "GET /submissions/{id}/events", "GET",
+                                              f"/submissions/{submission_id}/events", headers=headers)
+            final = (events(response) or [None])[-1] if response is not None and response.status_code == 200 else None
+            recorder.observe("verdict (submit to final status)", time.perf_counter() - submitted,
+                             final is None or final["status"] != expected)
+            return
+        while True:
+            await asyncio.sleep(args.poll_interval)
+            async with slots:
+                response = await recorder.request(client, "GET /submissions/{id}/status", "GET",
+                                                  f"/submissions/{submission_id}/status", headers=headers)
+            if response is None or response.status_code != 200 or response.json()["status"] not in PENDING:
+                break
+        recorder.observe("verdict (submit to final status)", time.perf_counter() - submitted,
+                         response is None or response.status_code != 200 or response.json()["status"] != expected)
+
+    # A contestant gets each problem wrong --wrong-attempts times, then solves it
+    async def contestant(token: str, number: int):
+        headers = {"Authorization": f"Bearer {token}"}
+        for challenge_id in rng.sample(challenge_ids, min(args.solves, len(challenge_ids))):
+            for attempt in range(args.wrong_attempts):
+                # Without execution the fake Judge0 accepts everything
+                await submit_and_wait(headers, challenge_id, WRONG.format(tag=f"{number}-{attempt}"),
+                                      "Wrong Answer" if args.execute else "Accepted")
+            await submit_and_wait(headers, challenge_id, SOLUTION.format(tag=number), "Accepted")
+
+    # Everyone else refreshes the problem list, a problem and the standings until the storm ends
+    async def poller(token: str):
+        headers = {"Authorization": f"Bearer {token}"}
+        while not storm_done.is_set():
+            async with slots:
+                await recorder.request(client, "GET /candidate/challenges", "GET", "/candidate/challenges")
+                await recorder.request(client, "GET /candidate/challenges/{id}", "GET",
+                                       f"/candidate/challenges/{rng.choice(challenge_ids)}")
+                await recorder.request(client, "GET /leaderboard/", "GET", "/leaderboard/", headers=headers)
+            await asyncio.sleep(args.poll_interval)
+
+    async def storm():
+        await asyncio.gather(*(contestant(token, i) for i, token in enumerate(tokens)))
+        storm_done.set()
+
+    started = time.perf_counter()
+    await asyncio.gather(storm(), *(poller(token) for token in tokens[:args.pollers]))
+    return recorder.report("contest", time.perf_counter() - started)
+
+
+# Status events of a finished server-sent event stream
+def events(response: httpx.Response) -> list:
+    return [json.loads(line[len("data: "):]) for line in response.text.splitlines() if line.startswith("data: ")]
+
+
+async def bench(args, emails: list, url: str) -> list:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=120) as client:
+        results, tokens = await login_burst(client, emails, args.concurrency)
+        if not tokens:
+            raise SystemExit("No user could log in")
+        response = await client.get("/candidate/challenges", params={"limit": 200})
+        challenge_ids = [challenge["id"] for challenge in response.json()]
+        results += await contest(client, args, list(tokens.values()), challenge_ids)
+        return results
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run(args) -> dict:
+    with tempfile.TemporaryDirectory() as tmp:
+        judge0_port, api_port = free_port(), free_port()
+        env = api_env(args, tmp, judge0_port, api_port)
+        emails = seed(args, env)
+
+        judge0_env = {**os.environ, "FAKE_JUDGE0_LATENCY": str(args.judge0_latency),
+                      "FAKE_JUDGE0_EXECUTE": "1" if args.execute else "0"}
+        processes = [
+            start([sys.executable, "-m", "uvicorn", "fake_judge0:app", "--app-dir", os.path.join(ROOT, "tests"),
+                   "--port", str(judge0_port), "--log-level", "warning"], judge0_env),
+            start([sys.executable, os.path.abspath(__file__), "serve", str(api_port)], env, cwd=tmp),
+        ]
+        try:
+            url = f"http://127.0.0.1:{api_port}"
+            asyncio.run(wait_ready(f"http://127.0.0.1:{judge0_port}", processes[0], "/docs"))
+            asyncio.run(wait_ready(url, processes[1], "/"))
+            results = asyncio.run(bench(args, emails, url))
+        finally:
+            for process in reversed(processes):
+                process.terminate()
+                process.wait()
+
+    options = {key: value for key, value in vars(args).items() if key not in ("command", "json", "compare")}
+    return {"commit": git_commit(), "timestamp": int(time.time()), "options": options, "results": results}
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = json.load(f)
+    with open(after_path) as f:
+        after = json.load(f)
+    old_results = {(r["phase"], r["endpoint"]): r for r in before["results"]}
+    print(f"{before['commit']} -> {after['commit']}")
+    for new in after["results"]:
+        old = old_results.get((new["phase"], new["endpoint"]))
+        if old is None:
+            continue
+        print(f"{new['phase']} {new['endpoint']}: {old['requests_per_second']} -> {new['requests_per_second']} req/s, "
+              f"p50 {old['p50_ms']} -> {new['p50_ms']} ms, p95 {old['p95_ms']} -> {new['p95_ms']} ms, "
+              f"p99 {old['p99_ms']} -> {new['p99_ms']} ms")
+
+
+def main():
+    if len(sys.argv) == 3 and sys.argv[1] == "serve":
+        serve(int(sys.argv[2]))
+        return
+
+    parser = argparse.ArgumentParser(description="End-to-end contest load test against local stand-ins")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--challenges", type=int, default=10)
+    parser.add_argument("--test-cases", type=int, default=6, help="per challenge; half of them hidden")
+    parser.add_argument("--solves", type=int, default=2, help="problems each contestant solves")
+    parser.add_argument("--wrong-attempts", type=int, default=1, help="rejected submissions before each solve")
+    parser.add_argument("--pollers", type=int, default=50, help="contestants also polling catalog and leaderboard")
+    parser.add_argument("--poll-interval", type=float, default=0.2)
+    parser.add_argument("--concurrency", type=int, default=100, help="requests in flight at once")
+    parser.add_argument("--judge0-latency", type=float, default=0.1)
+    parser.add_argument("--callbacks", action="store_true", help="Judge0 calls back instead of being polled")
+    parser.add_argument("--push", action="store_true", help="follow verdicts over server-sent events instead of polling")
+    parser.add_argument("--no-execute", dest="execute", action="store_false",
+                        help="fake Judge0 accepts programs without running them")
+    parser.add_argument("--bcrypt-rounds", type=int, default=6)
+    parser.add_argument("--database-url", help="async SQLAlchemy URL of an empty database instead of SQLite")
+    parser.add_argument("--mongo-url", help="local mongod instead of mongomock")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two --json result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    report = run(args)
+    for result in report["results"]:
+        print(json.dumps(result))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# Compares cold-start and warm-pool throughput of Python submissions on the local executor.
+#
+#   python benchmarks/bench_python_pool.py --submissions 50 --cases 10
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "app")))
+
+from services.executors import LocalExecutor  # noqa: E402
+
+SOURCE = "n = int(input())\nprint(sum(range(n)))\n"
+
+
+async def bench(warm: bool, submissions: int, cases: int, concurrency: int, workers: int) -> dict:
+    executor = LocalExecutor(workers=workers, warm_python=warm)
+    runs = [{"stdin": f"{i * 1000}\n", "expected_output": f"{sum(range(i * 1000))}\n"} for i in range(cases)]
+    try:
+        # Start the process pool (and the warm interpreters) before measuring
+        await executor.execute(SOURCE, 71, runs[:1])
+
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def submit():
+            async with semaphore:
+                started = time.perf_counter()
+                results = await executor.execute(SOURCE, 71, runs)
+                latencies.append(time.perf_counter() - started)
+                assert all(r["status"]["id"] == 3 for r in results), results
+
+        started = time.perf_counter()
+        await asyncio.gather(*(submit() for _ in range(submissions)))
+        elapsed = time.perf_counter() - started
+    finally:
+        await executor.close()
+
+    latencies.sort()
+    return {
+        "mode": "warm" if warm else "cold",
+        "submissions": submissions,
+        "cases_per_submission": cases,
+        "elapsed_seconds": round(elapsed, 3),
+        "cases_per_second": round(submissions * cases / elapsed, 1),
+        "submission_p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "submission_p95_ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start vs warm-pool Python throughput")
+    parser.add_argument("--submissions", type=int, default=30)
+    parser.add_argument("--cases", type=int, default=10)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--json", help="write results to this file")
+    args = parser.parse_args()
+
+    results = []
+    for warm in (False, True):
+        result = asyncio.run(bench(warm, args.submissions, args.cases, args.concurrency, args.workers))
+        results.append(result)
+        print(json.dumps(result))
+
+    cold, warm = results
+    print(f"warm pool speedup: {warm['cases_per_second'] / cold['cases_per_second']:.2f}x")
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
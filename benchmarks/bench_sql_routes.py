@@ -0,0 +1,152 @@
+# Load test of the SQL-backed routes: challenge listing, challenge detail and login.
+# Reports requests per second and p50/p99 latency per route at the given concurrency.
+#
+# Start the API (one uvicorn worker, so the numbers are per process) on each revision
+# to compare, and run the benchmark against it:
+#
+#   uvicorn main:app --workers 1 --port 8000
+#   python benchmarks/bench_sql_routes.py --url http://localhost:8000 --seed --admin-token $TOKEN --json after.json
+#   python benchmarks/bench_sql_routes.py --compare before.json after.json
+#
+# Listing pages and details are requested at random offsets/ids across --challenges
+# challenges, so most requests miss the catalog cache (CATALOG_CACHE_MAX_ENTRIES) and
+# reach MySQL. Login always runs a bcrypt verification.
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+import uuid
+
+import httpx
+
+PASSWORD = "bench-password"
+
+
+async def seed(client: httpx.AsyncClient, challenges: int, admin_token: str) -> tuple:
+    ids = []
+    headers = {"Authorization": f"Bearer {admin_token}"} if admin_token else {}
+    for i in range(challenges):
+        response = await client.post("/admin/challenges", headers=headers, json={
+            "title": f"Bench {i}", "description": "x" * 500,
+            "difficulty": ("easy", "medium", "hard")[i % 3], "time_limit": 1, "memory_limit": 64,
+        })
+        response.raise_for_status()
+        ids.append(response.json()["id"])
+    email = f"bench-{uuid.uuid4().hex[:8]}@example.com"
+    response = await client.post("/auth/register", json={"username": "bench", "email": email, "password": PASSWORD})
+    response.raise_for_status()
+    return ids, email
+
+
+async def existing_ids(client: httpx.AsyncClient) -> list:
+    ids, after = [], None
+    while True:
+        response = await client.get("/candidate/challenges", params={"limit": 200, **({"after": after} if after else {})})
+        response.raise_for_status()
+        ids += [challenge["id"] for challenge in response.json()]
+        after = response.headers.get("x-next-cursor")
+        if after is None:
+            return ids
+
+
+async def run(client: httpx.AsyncClient, name: str, request, total: int, concurrency: int) -> dict:
+    latencies = []
+    errors = 0
+    remaining = iter(range(total))
+
+    async def worker():
+        nonlocal errors
+        for _ in remaining:
+            started = time.perf_counter()
+            response = await request()
+            latencies.append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        "route": name,
+        "requests": total,
+        "concurrency": concurrency,
+        "errors": errors,
+        "requests_per_second": round(total / elapsed, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000, 1),
+    }
+
+
+async def bench(args) -> list:
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=60) as client:
+        if args.seed:
+            ids, email = await seed(client, args.challenges, args.admin_token)
+        else:
+            ids, email = await existing_ids(client), args.email
+        if not ids:
+            raise SystemExit("No challenges; run with --seed")
+
+        def listing():
+            return client.get("/candidate/challenges", params={"after": random.choice(ids), "limit": random.randint(10, 50)})
+
+        def detail():
+            return client.get(f"/candidate/challenges/{random.choice(ids)}")
+
+        def login():
+            return client.post("/auth/login", json={"email": email, "password": PASSWORD})
+
+        results = [
+            await run(client, "GET /candidate/challenges", listing, args.requests, args.concurrency),
+            await run(client, "GET /candidate/challenges/{id}", detail, args.requests, args.concurrency),
+        ]
+        if email:
+            results.append(await run(client, "POST /auth/login", login, args.login_requests, args.concurrency))
+        return results
+
+
+def compare(before_path: str, after_path: str):
+    with open(before_path) as f:
+        before = {result["route"]: result for result in json.load(f)}
+    with open(after_path) as f:
+        after = {result["route"]: result for result in json.load(f)}
+    for route, new in after.items():
+        old = before.get(route)
+        if old is None:
+            continue
+        print(f"{route}: {old['requests_per_second']} -> {new['requests_per_second']} req/s "
+              f"({new['requests_per_second'] / old['requests_per_second']:.2f}x), "
+              f"p99 {old['p99_ms']} -> {new['p99_ms']} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Throughput and tail latency of the SQL-backed routes")
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--login-requests", type=int, default=500)
+    parser.add_argument("--seed", action="store_true", help="create challenges and a user first")
+    parser.add_argument("--admin-token", help="bearer token of an admin, needed by --seed")
+    parser.add_argument("--challenges", type=int, default=3000)
+    parser.add_argument("--email", help="existing user (password bench-password) to log in as, without --seed")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="compare two --json result files")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+    results = asyncio.run(bench(args))
+    for result in results:
+        print(json.dumps(result))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import os
+import shutil
+import tempfile
+from types import SimpleNamespace
+import pytest
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+from main import app
+from core.security import CurrentUser, get_current_admin
+from database.mysql_db import Base, get_db
+from services import catalog_cache
+from services.catalog_cache import CatalogCache, LocalCatalogVersion
+
+# SQLite file per test module, shared by the async sessions the routes use (install
+# `get_db` as the override of database.mysql_db.get_db) and by sync sessions (`Session`)
+# for setup and assertions. `queries` collects the SQL run through the async engine.
+@pytest.fixture(scope="module")
+def sqlite_db():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "test.db")
+    engine = create_engine(f"sqlite:///{path}")
+    Base.metadata.create_all(bind=engine)
+    async_engine = create_async_engine(f"sqlite+aiosqlite:///{path}", poolclass=NullPool)
+    AsyncSessionLocal = async_sessionmaker(async_engine, expire_on_commit=False)
+    queries = []
+    event.listen(async_engine.sync_engine, "before_cursor_execute", lambda *args: queries.append(args[2]))
+
+    async def get_db():
+        async with AsyncSessionLocal() as db:
+            yield db
+
+    yield SimpleNamespace(
+        engine=engine,
+        Session=sessionmaker(autocommit=False, autoflush=False, bind=engine),
+        async_engine=async_engine,
+        AsyncSession=AsyncSessionLocal,
+        get_db=get_db,
+        queries=queries,
+    )
+    engine.dispose()
+    shutil.rmtree(directory, ignore_errors=True)
+
+# The app's dependency overrides, put back as they were after every test so none leak into
+# other modules; tests install theirs in this dict. The challenge catalog cache starts empty.
+@pytest.fixture(autouse=True)
+def overrides():
+    previous = dict(app.dependency_overrides)
+    catalog_cache._cache = CatalogCache(LocalCatalogVersion(), check_interval=0)
+    yield app.dependency_overrides
+    app.dependency_overrides.clear()
+    app.dependency_overrides.update(previous)
+    catalog_cache._cache = None
+
+# Routes backed by `sqlite_db`, called by an admin
+@pytest.fixture
+def admin_api(sqlite_db, overrides):
+    overrides[get_db] = sqlite_db.get_db
+    overrides[get_current_admin] = lambda: CurrentUser(1, "admin", "admin@example.com", True)
+    return sqlite_db
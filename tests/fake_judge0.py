@@ -0,0 +1,129 @@
+# A minimal local stand-in for the Judge0 API, good enough for tests and benchmarks.
+# Python (language 71) submissions are really executed; anything else is accepted as-is.
+# Submissions with a callback_url are PUT there (text fields base64-encoded) once finished.
+# Run standalone (benchmarks/bench_e2e.py does) with FAKE_JUDGE0_LATENCY / FAKE_JUDGE0_EXECUTE:
+#
+#   FAKE_JUDGE0_LATENCY=0.5 uvicorn fake_judge0:app --app-dir tests --port 2358
+import asyncio
+import base64
+import os
+import subprocess
+import sys
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI()
+
+submissions = {}
+stats = {"requests": 0}
+config = {
+    "pending_polls": 0,  # number of polls a submission reports "Processing" for
+    "throttle": 0,  # number of upcoming requests answered with 429
+    "latency": float(os.environ.get("FAKE_JUDGE0_LATENCY", 0)),  # seconds a submission reports "Processing" for
+    "execute": os.environ.get("FAKE_JUDGE0_EXECUTE", "1") != "0",  # accept Python programs without running them
+}
+
+
+def execute(payload: dict) -> dict:
+    result = {"stdout": None, "stderr": None, "compile_output": None, "message": None, "time": "0.001", "memory": 1024}
+    if payload.get("language_id") != 71 or not config["execute"]:
+        stdout = payload.get("expected_output") or ""
+        result.update(stdout=stdout, status={"id": 3, "description": "Accepted"})
+        return result
+    try:
+        proc = subprocess.run(
+            [sys.executable, "-c", payload["source_code"]],
+            input=payload.get("stdin") or "",
+            capture_output=True, text=True,
+            timeout=float(payload.get("cpu_time_limit") or 5)
+        )
+    except subprocess.TimeoutExpired:
+        result["status"] = {"id": 5, "description": "Time Limit Exceeded"}
+        return result
+    result.update(stdout=proc.stdout, stderr=proc.stderr)
+    if proc.returncode != 0:
+        result["status"] = {"id": 11, "description": "Runtime Error (NZEC)"}
+    elif payload.get("expected_output") is not None and proc.stdout.rstrip() != payload["expected_output"].rstrip():
+        result["status"] = {"id": 4, "description": "Wrong Answer"}
+    else:
+        result["status"] = {"id": 3, "description": "Accepted"}
+    return result
+
+
+def create(payload: dict) -> str:
+    token = str(uuid.uuid4())
+    submissions[token] = {"result": execute(payload), "polls": 0, "ready_at": time.monotonic() + config["latency"]}
+    return token
+
+
+callback_client = None
+
+
+# Deliver a finished submission like Judge0 does: one PUT, text fields base64-encoded
+async def call_back(url: str, token: str):
+    entry = submissions[token]
+    await asyncio.sleep(max(0.0, entry["ready_at"] - time.monotonic()))
+    body = {"token": token, **entry["result"]}
+    for field in ("stdout", "stderr", "compile_output", "message"):
+        if body.get(field) is not None:
+            body[field] = base64.b64encode(body[field].encode()).decode()
+    global callback_client
+    if callback_client is None:
+        callback_client = httpx.AsyncClient()
+    try:
+        await callback_client.put(url, json=body)
+    except httpx.HTTPError:
+        pass
+
+
+def schedule_callbacks(payloads: list, tokens: list):
+    for payload, token in zip(payloads, tokens):
+        if payload.get("callback_url"):
+            asyncio.create_task(call_back(payload["callback_url"], token))
+
+
+def poll(token: str) -> dict:
+    entry = submissions[token]
+    entry["polls"] += 1
+    if entry["polls"] <= config["pending_polls"] or time.monotonic() < entry["ready_at"]:
+        return {"token": token, "status": {"id": 2, "description": "Processing"}}
+    return {"token": token, **entry["result"]}
+
+
+@app.middleware("http")
+async def count_requests(request: Request, call_next):
+    stats["requests"] += 1
+    if config["throttle"] > 0:
+        config["throttle"] -= 1
+        return JSONResponse({"error": "Too many requests"}, status_code=429)
+    return await call_next(request)
+
+
+@app.post("/submissions/batch", status_code=201)
+async def create_batch(request: Request):
+    body = await request.json()
+    tokens = await asyncio.gather(*(asyncio.to_thread(create, payload) for payload in body["submissions"]))
+    schedule_callbacks(body["submissions"], tokens)
+    return [{"token": token} for token in tokens]
+
+
+@app.get("/submissions/batch")
+def get_batch(tokens: str):
+    return {"submissions": [poll(token) for token in tokens.split(",")]}
+
+
+@app.post("/submissions", status_code=201)
+async def create_submission(request: Request):
+    payload = await request.json()
+    token = await asyncio.to_thread(create, payload)
+    schedule_callbacks([payload], [token])
+    return {"token": token}
+
+
+@app.get("/submissions/{token}")
+def get_submission(token: str):
+    return poll(token)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.config import settings
+from core.security import CurrentUser, get_current_user
+from database.mongodb import get_submissions_collection
+from services.admission import AdmissionControl, MemoryLimiterStore, MongoLimiterStore, get_admission_control
+from services.submission_queue import InMemoryQueue, get_submission_queue
+
+client = TestClient(app)
+
+@pytest.fixture
+def admission(overrides):
+    admission = AdmissionControl(MemoryLimiterStore(), max_backlog=100)
+    submissions = AsyncMongoMockClient()["test_admission"]["submissions"]
+    queue = InMemoryQueue()
+    overrides.update({
+        get_admission_control: lambda: admission,
+        get_submissions_collection: lambda: submissions,
+        get_submission_queue: lambda: queue,
+        get_current_user: lambda: CurrentUser(7, "mallory", "mallory@example.com"),
+    })
+    return admission
+
+SUBMISSION = {"challenge_id": 1, "language_id": 71, "source_code": "print(1)"}
+
+# Test that a user's burst is admitted and the next submission gets 429 with Retry-After
+def test_submissions_are_rate_limited_per_user(admission, monkeypatch):
+    monkeypatch.setattr(settings, "SUBMIT_BURST_PER_USER", 3)
+    monkeypatch.setattr(settings, "SUBMIT_RATE_PER_USER", 0.1)
+    assert [client.post("/submissions/", json=SUBMISSION).status_code for _ in range(3)] == [202] * 3
+
+    response = client.post("/submissions/", json=SUBMISSION)
+    assert response.status_code == 429
+    assert 1 <= int(response.headers["retry-after"]) <= 10
+    assert admission.counters["rate_limited"] == 1
+
+# Test that new submissions are shed once the backlog is full, and admitted again as it drains
+def test_backlog_sheds_load(admission):
+    admission.max_backlog = 2
+    responses = [client.post("/submissions/", json=SUBMISSION) for _ in range(3)]
+    assert [response.status_code for response in responses] == [202, 202, 429]
+    # Finishing a job twice (a redelivery) frees its place once
+    for _ in range(2):
+        asyncio.run(admission.finished(responses[0].json()["submission_id"]))
+    assert [client.post("/submissions/", json=SUBMISSION).status_code for _ in range(2)] == [202, 429]
+
+# Test that the backlog entry of a job whose process died expires instead of holding capacity forever
+def test_lost_jobs_leave_the_backlog(admission):
+    admission.max_backlog = 1
+    admission.backlog_ttl = 0.05
+    assert [client.post("/submissions/", json=SUBMISSION).status_code for _ in range(2)] == [202, 429]
+    time.sleep(0.06)
+    assert client.post("/submissions/", json=SUBMISSION).status_code == 202
+
+# Test that execution slots cap how many executions run at once
+def test_execution_slots_cap_concurrency():
+    admission = AdmissionControl(MemoryLimiterStore(), max_executions=2)
+    running, peak = 0, 0
+
+    async def execute():
+        nonlocal running, peak
+        async with admission.execution_slot():
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.02)
+            running -= 1
+
+    async def burst():
+        await asyncio.gather(*(execute() for _ in range(6)))
+
+    asyncio.run(burst())
+    assert peak == 2 and admission.counters["slot_waits"] > 0
+
+# Test the shared store: token buckets, expiring backlog entries, and slots reclaimed after their lease
+def test_mongo_store():
+    db = AsyncMongoMockClient()["test_admission"]
+    store = MongoLimiterStore(db["buckets"], db["counters"], db["slots"])
+
+    async def scenario():
+        taken = [await store.take("k", 1.0, 2) for _ in range(3)]
+        await store.add_entry("backlog", "a", 60)
+        await store.add_entry("backlog", "b", 60)
+        await store.add_entry("backlog", "c", 0.01)
+        counts = [await store.count_entries("backlog")]
+        await store.remove_entry("backlog", "a")
+        await store.remove_entry("backlog", "a")
+        await asyncio.sleep(0.02)
+        counts.append(await store.count_entries("backlog"))
+        slots = [await store.acquire_slot("exec", 1, "a", 60), await store.acquire_slot("exec", 1, "b", 60)]
+        await store.release_slot("exec", "a")
+        slots.append(await store.acquire_slot("exec", 1, "b", 0.01))
+        await asyncio.sleep(0.02)
+        # "b" never released its slot; its lease has run out
+        slots.append(await store.acquire_slot("exec", 1, "c", 60))
+        return taken, counts, slots
+
+    started = time.time()
+    taken, counts, slots = asyncio.run(scenario())
+    assert taken[:2] == [0.0, 0.0] and 0 < taken[2] <= 1.0 + (time.time() - started)
+    assert counts == [3, 1]
+    assert slots == [True, False, True, True]
+
+# Test that a take which keeps losing the compare-and-set race is refused, not let through
+def test_mongo_store_fails_closed_under_contention():
+    db = AsyncMongoMockClient()["test_admission"]
+    store = MongoLimiterStore(db["buckets"], db["entries"], db["slots"])
+
+    async def scenario():
+        assert await store.take("k", 0.5, 10) == 0.0
+        update_one = store.buckets.update_one
+
+        # Another request changes the bucket between every read and write
+        async def lose_race(query, update):
+            await update_one({"_id": query["_id"]}, {"$inc": {"updated": 0.001}})
+            return await update_one(query, update)
+        store.buckets.update_one = lose_race
+        return await store.take("k", 0.5, 10)
+
+    assert asyncio.run(scenario()) == 2.0
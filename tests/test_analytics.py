@@ -0,0 +1,70 @@
+import asyncio
+import time
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.security import CurrentUser, get_current_admin
+from services.analytics import SubmissionAnalytics, get_submission_analytics, rebuild_rollups
+from database.submissions import SubmissionRepository
+from services.submission_worker import SubmissionWorker
+
+db = AsyncMongoMockClient()["test_analytics"]
+analytics = SubmissionAnalytics(db["rollups"], db["rollup_users"])
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def admin(overrides):
+    overrides[get_submission_analytics] = lambda: analytics
+    overrides[get_current_admin] = lambda: CurrentUser(1, "admin", "admin@example.com", True)
+
+VERDICTS = {
+    "ok": {"status": {"id": 3, "description": "Accepted"}, "time": "0.020", "memory": 3000},
+    "wa": {"status": {"id": 4, "description": "Wrong Answer"}, "time": "0.300", "memory": 70000},
+}
+
+def judge(jobs):
+    async def fake_runner(job):
+        if job["source_code"] == "crash":
+            raise RuntimeError("executor down")
+        return VERDICTS[job["source_code"]]
+
+    async def run():
+        worker = SubmissionWorker(SubmissionRepository(db["submissions"]), runner=fake_runner, analytics=analytics)
+        for user_id, challenge_id, language_id, source in jobs:
+            result = await db["submissions"].insert_one({
+                "user_id": user_id, "challenge_id": challenge_id, "language_id": language_id,
+                "source_code": source, "mode": "submit", "status": "Pending", "created_at": time.time()
+            })
+            job = {"submission_id": str(result.inserted_id), "user_id": user_id, "challenge_id": challenge_id,
+                   "language_id": language_id, "source_code": source, "stdin": "", "mode": "submit"}
+            await worker.process(job)
+        # A redelivered job is not counted twice
+        await worker.process(job)
+    asyncio.run(run())
+
+# Test that final verdicts are rolled up per challenge, language and hour
+def test_rollups_are_updated_incrementally():
+    judge([(1, 10, 71, "ok"), (1, 10, 71, "wa"), (2, 10, 54, "ok"), (2, 10, 71, "crash"), (3, 11, 71, "wa")])
+
+    totals = client.get("/admin/analytics").json()
+    assert [(t["challenge_id"], t["attempts"]) for t in totals] == [(10, 4), (11, 1)]
+
+    detail = client.get("/admin/analytics/10").json()
+    total = detail["total"]
+    assert total["accepted"] == 2 and total["users"] == 2
+    assert total["statuses"] == {"3": 2, "4": 1, "13": 1}
+    assert total["time_ms"]["le_50ms"] == 2 and total["memory_kb"]["le_131072kb"] == 1
+    assert [(l["language_id"], l["attempts"], l["users"]) for l in detail["by_language"]] == [(54, 1, 1), (71, 3, 2)]
+    assert len(detail["hourly"]) == 1 and detail["hourly"][0]["attempts"] == 4
+
+# Test that the backfill rebuilds the same rollups from raw submissions
+def test_backfill_matches_incremental_rollups():
+    async def snapshot():
+        return sorted([doc async for doc in db["rollups"].find()], key=repr)
+
+    incremental = asyncio.run(snapshot())
+    summary = asyncio.run(rebuild_rollups(db["submissions"], analytics))
+    rebuilt = asyncio.run(snapshot())
+    assert summary["rollups"] == len(incremental)
+    assert rebuilt == incremental
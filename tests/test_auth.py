@@ -1,28 +1,23 @@
 import pytest
 from fastapi.testclient import TestClient
 from main import app
-from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
-from database import Base, get_db
-from models import User
-
-# Create a testing database session
-SQLALCHEMY_DATABASE_URL = "sqlite:///./test.db"  # Using SQLite for testing
-engine = create_engine(SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Dependency override
-def override_get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
-
-app.dependency_overrides[get_db] = override_get_db
+from database.mysql_db import get_db
+from services.admission import AdmissionControl, MemoryLimiterStore, get_admission_control
+from services.passwords import PasswordHasher, get_password_hasher
 
 client = TestClient(app)
 
+# Low bcrypt cost keeps the tests fast
+@pytest.fixture(autouse=True)
+def hasher(sqlite_db, overrides):
+    hasher = PasswordHasher(workers=1, rounds=4)
+    admission = AdmissionControl(MemoryLimiterStore())
+    overrides[get_db] = sqlite_db.get_db
+    overrides[get_password_hasher] = lambda: hasher
+    overrides[get_admission_control] = lambda: admission
+    yield hasher
+    hasher.close()
+
 # Test user registration
 def test_register():
     response = client.post("/auth/register", json={
@@ -30,21 +25,38 @@ def test_register():
         "email": "testuser@example.com",
         "password": "testpassword123"
     })
-    assert response.status_code == 201
-    assert response.json()["username"] == "testuser"
+    assert response.status_code == 200
+    assert response.json()["message"] == "User registered successfully"
+
+    # The same email cannot register twice
+    response = client.post("/auth/register", json={
+        "username": "other",
+        "email": "testuser@example.com",
+        "password": "testpassword123"
+    })
+    assert response.status_code == 400
 
 # Test user login
 def test_login():
     # First, register the user
     client.post("/auth/register", json={
-        "username": "testuser",
-        "email": "testuser@example.com",
+        "username": "loginuser",
+        "email": "loginuser@example.com",
         "password": "testpassword123"
     })
-    
+
     response = client.post("/auth/login", json={
-        "username": "testuser",
+        "email": "loginuser@example.com",
         "password": "testpassword123"
     })
     assert response.status_code == 200
-    assert "access_token" in response.json()
+    token = response.json()["access_token"]
+
+    me = client.get("/auth/me", headers={"Authorization": f"Bearer {token}"})
+    assert me.status_code == 200 and me.json()["username"] == "loginuser"
+
+    response = client.post("/auth/login", json={
+        "email": "loginuser@example.com",
+        "password": "wrong"
+    })
+    assert response.status_code == 401
@@ -0,0 +1,108 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from services.catalog_cache import CatalogCache, LocalCatalogVersion, MongoCatalogVersion
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("admin_api")
+
+def create_challenge(title):
+    response = client.post("/admin/challenges", json={"title": title, "description": "d", "difficulty": "easy"})
+    return response.json()["id"]
+
+# Test that repeated reads are served from the cache and revalidate with 304s
+def test_catalog_is_cached_with_etags(sqlite_db):
+    create_challenge("One")
+    first = client.get("/candidate/challenges")
+    assert first.status_code == 200 and [c["title"] for c in first.json()] == ["One"]
+    etag = first.headers["etag"]
+
+    sqlite_db.queries.clear()
+    assert client.get("/candidate/challenges").content == first.content
+    not_modified = client.get("/candidate/challenges", headers={"If-None-Match": etag})
+    assert not_modified.status_code == 304 and not_modified.content == b""
+    assert sqlite_db.queries == []
+
+# Test that admin changes invalidate the list and the detail payloads
+def test_admin_changes_invalidate():
+    challenge_id = create_challenge("Two")
+    etag = client.get("/candidate/challenges").headers["etag"]
+    detail = client.get(f"/candidate/challenges/{challenge_id}")
+    assert detail.json()["visible_test_cases"] == []
+
+    client.put(f"/admin/challenges/{challenge_id}", json={"title": "Renamed"})
+    response = client.get("/candidate/challenges", headers={"If-None-Match": etag})
+    assert response.status_code == 200 and "Renamed" in response.text
+
+    client.post(f"/admin/challenges/{challenge_id}/testcases",
+                data={"is_hidden": "false", "input_data": "1", "expected_output": "1"})
+    cases = client.get(f"/candidate/challenges/{challenge_id}").json()["visible_test_cases"]
+    assert [c["input_data"] for c in cases] == ["1"]
+
+    assert client.get("/candidate/challenges/9999").status_code == 404
+
+# Test that a bump made by another process is picked up through the shared counter
+def test_shared_version_keeps_processes_coherent():
+    collection = AsyncMongoMockClient()["db"]["catalog_version"]
+    worker_a = CatalogCache(MongoCatalogVersion(collection), check_interval=0)
+    worker_b = CatalogCache(MongoCatalogVersion(collection), check_interval=0)
+    data = {"title": "old"}
+
+    async def build():
+        return dict(data)
+
+    async def scenario():
+        bodies = [(await worker_b.get("challenges", build)).body]
+        data["title"] = "new"
+        bodies.append((await worker_b.get("challenges", build)).body)
+        await worker_a.invalidate()
+        bodies.append((await worker_b.get("challenges", build)).body)
+        return bodies
+
+    assert asyncio.run(scenario()) == [b'{"title":"old"}', b'{"title":"old"}', b'{"title":"new"}']
+
+# Test keyset pagination, difficulty filtering and the summary projection
+def test_listing_pages_by_cursor(sqlite_db):
+    for i in range(5):
+        client.post("/admin/challenges", json={"title": f"P{i}", "description": "long text",
+                                               "difficulty": "hard" if i % 2 else "easy"})
+    sqlite_db.queries.clear()
+    first = client.get("/candidate/challenges", params={"limit": 2})
+    assert len(first.json()) == 2 and "description" not in first.json()[0]
+    assert not any("description" in sql for sql in sqlite_db.queries)
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2, "difficulty": "easy"}
+        if cursor:
+            params["after"] = cursor
+        page = client.get("/candidate/challenges", params=params)
+        seen += page.json()
+        cursor = page.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    titles = [c["title"] for c in seen]
+    assert {"P0", "P2", "P4"} <= set(titles) and all(c["difficulty"] == "easy" for c in seen)
+    assert [c["id"] for c in seen] == sorted(c["id"] for c in seen)
+
+    assert client.get("/candidate/challenges", params={"limit": 500}).status_code == 422
+
+# Test that concurrent misses of one key share a single build
+def test_concurrent_misses_share_one_build():
+    cache = CatalogCache(LocalCatalogVersion(), check_interval=60)
+    builds = []
+
+    async def build():
+        builds.append(1)
+        await asyncio.sleep(0.01)
+        return {"page": 1}
+
+    async def burst():
+        return await asyncio.gather(*(cache.get("challenges", build) for _ in range(20)))
+
+    entries = asyncio.run(burst())
+    assert len(builds) == 1 and len({entry.etag for entry in entries}) == 1
+    assert cache.stats()["misses"] == 1 and cache.stats()["coalesced"] == 19
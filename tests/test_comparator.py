@@ -0,0 +1,59 @@
+import io
+import random
+import pytest
+from services.comparator import compare
+
+def check(actual, expected, mode="exact", tolerance=None, chunk_size=7):
+    # A tiny chunk size puts differences and tokens across chunk boundaries
+    return compare(io.BytesIO(actual.encode()), io.BytesIO(expected.encode()), mode, tolerance, chunk_size)
+
+# Test that exact mode only forgives trailing whitespace and reports where outputs first differ
+def test_exact():
+    assert check("1 2 3\n4 5 6\n", "1 2 3\n4 5 6") is None
+    assert check("1 2 3\n4 5 6 \n\n", "1 2 3\n4 5 6\n") is None
+    assert check("", "\n\n") is None
+
+    mismatch = check("1 2 3\n4 5 7\n8\n", "1 2 3\n4 5 6\n8\n")
+    assert mismatch == {"mode": "exact", "offset": 10, "line": 2, "column": 5, "expected": "6", "actual": "7"}
+    # One output is a prefix of the other
+    assert check("1 2 3\n", "1 2 3\n4\n")["expected"] == "4" and check("1 2 3\n", "1 2 3\n4\n")["actual"] is None
+    assert check("1 2 3 4", "1 2 3")["line"] == 1 and check("1 2  3", "1 2 3") is not None
+
+# Test that exact mode agrees with comparing whole strings, whatever the chunk size
+def test_exact_matches_naive_comparison():
+    rng = random.Random(3)
+    for _ in range(300):
+        expected = "".join(rng.choice("ab \n") for _ in range(rng.randrange(30)))
+        actual = list(expected)
+        for _ in range(rng.randrange(3)):
+            if actual:
+                actual[rng.randrange(len(actual))] = rng.choice("ab \n")
+        actual = "".join(actual)
+        mismatch = check(actual, expected, chunk_size=rng.randrange(1, 9))
+        assert (mismatch is None) == (actual.rstrip() == expected.rstrip()), (actual, expected)
+
+# Test that whitespace mode compares tokens however they are spaced
+def test_whitespace():
+    assert check("1  2\n3\r\n\n", "1 2 3", "whitespace") is None
+    assert check("longtoken another", "longtoken\nanother\n", "whitespace", chunk_size=3) is None
+    assert check("1 2 4", "1 2 3", "whitespace") == {"mode": "whitespace", "token": 3, "expected": "3", "actual": "4"}
+    assert check("1 2", "1 2 3", "whitespace")["actual"] is None
+
+# Test that numbers match within the tolerance in float mode, and everything else exactly
+def test_float():
+    assert check("0.3333333 1e3 yes", "0.333333333 1000.0 yes", "float", 1e-6) is None
+    assert check("0.34", "0.33", "float", 1e-6)["token"] == 1
+    assert check("0.34", "0.33", "float", 0.05) is None
+    assert check("nan", "nan", "float") is None and check("nan", "1", "float") is not None
+    assert check("Yes", "yes", "float") is not None
+
+# Test that line_set mode ignores order and blank lines but counts duplicates
+def test_line_set():
+    assert check("b\na  \n\nc\n", "a\nb\nc", "line_set") is None
+    assert check("a\na\n", "a\nb\n", "line_set") == {"mode": "line_set", "line": 2, "expected": None, "actual": "a"}
+    assert check("a\n", "a\nb\n", "line_set")["expected"] == "b"
+
+# Test that an unknown mode is an error rather than a silent exact comparison
+def test_unknown_mode():
+    with pytest.raises(ValueError):
+        check("", "", "fuzzy")
@@ -0,0 +1,36 @@
+import asyncio
+
+from sqlalchemy import text
+
+from core.config import settings
+from core.db import Database, sync_url
+
+
+# Test the sync engine uses the sync driver of the configured async URL
+def test_sync_url():
+    assert sync_url("mysql+aiomysql://u:p@db:3306/app") == "mysql+pymysql://u:p@db:3306/app"
+    assert sync_url("sqlite+aiosqlite:///tmp/x.db") == "sqlite:///tmp/x.db"
+
+
+# Test connect() opens both engines, pool stats count checkouts, and disconnect() closes everything
+def test_connect_and_pool_stats(monkeypatch, tmp_path):
+    monkeypatch.setattr(settings, "DATABASE_URL", f"sqlite+aiosqlite:///{tmp_path}/app.db")
+    database = Database()
+    assert database.pool_stats() == {"connected": False}
+
+    database.connect()
+    with database.session() as session:
+        assert session.execute(text("SELECT 1")).scalar() == 1
+
+    async def query():
+        async with database.async_session() as session:
+            return (await session.execute(text("SELECT 2"))).scalar()
+
+    assert asyncio.run(query()) == 2
+    stats = database.pool_stats()
+    assert stats["connected"] is True
+    assert stats["sync"]["checkouts"] == 1 and stats["async"]["checkouts"] == 1
+    assert stats["sync"]["checked_out"] == 0
+
+    asyncio.run(database.disconnect())
+    assert not database.connected and database.mongo_client is None
@@ -0,0 +1,170 @@
+import asyncio
+import tempfile
+import httpx
+import boto3
+import pytest
+from moto import mock_aws
+from mongomock_motor import AsyncMongoMockClient
+import fake_judge0
+from models import Challenge, TestCase
+from core.config import settings
+from services.judge0 import Judge0Client, Judge0Error
+from services.executors import Judge0Executor
+from services.submission_worker import Evaluator
+from services.testcase_sets import bump_test_set_version
+from services.testcase_store import HiddenCaseStore
+from services.verdict_cache import VerdictCache, verdict_key
+
+def fake_judge0_client(**kwargs):
+    return Judge0Client(transport=httpx.ASGITransport(app=fake_judge0.app), **kwargs)
+
+def create_challenge(sqlite_db, s3):
+    db = sqlite_db.Session()
+    challenge = Challenge(title="Echo", description="Print the input", difficulty="easy", time_limit=2, memory_limit=128)
+    db.add(challenge)
+    db.commit()
+    for i in range(3):
+        db.add(TestCase(challenge_id=challenge.id, input_data=f"{i}\n", expected_output=f"{i}\n", is_hidden=False))
+    s3.put_object(Bucket=settings.AWS_BUCKET_NAME, Key="hidden_cases/h1.txt", Body=b"secret\n")
+    s3.put_object(Bucket=settings.AWS_BUCKET_NAME, Key="hidden_cases/h1.out", Body=b"secret\n")
+    db.add(TestCase(challenge_id=challenge.id, is_hidden=True, s3_key="hidden_cases/h1.txt"))
+    db.commit()
+    challenge_id = challenge.id
+    db.close()
+    return challenge_id
+
+def judge(sqlite_db, source_code, challenge_id, s3, cache=None):
+    async def run():
+        client = fake_judge0_client()
+        try:
+            store = HiddenCaseStore(tempfile.mkdtemp(), 1024 ** 2, s3=s3)
+            evaluator = Evaluator(executor=Judge0Executor(client), session_factory=sqlite_db.Session, store=store,
+                                  cache=cache or VerdictCache())
+            job = {"challenge_id": challenge_id, "language_id": 71, "source_code": source_code, "stdin": "", "mode": "submit"}
+            return await evaluator(job)
+        finally:
+            await client.close()
+    return asyncio.run(run())
+
+# Test that every public and hidden test case is judged in one batch
+@mock_aws
+def test_batch_judging_accepts_correct_solution(sqlite_db):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=settings.AWS_BUCKET_NAME)
+    challenge_id = create_challenge(sqlite_db, s3)
+
+    fake_judge0.stats["requests"] = 0
+    result = judge(sqlite_db, "print(input())", challenge_id, s3)
+    assert result["status"]["description"] == "Accepted"
+    assert result["passed"] == result["total"] == 4
+    # One batch submit and one batch poll
+    assert fake_judge0.stats["requests"] == 2
+
+# Test that the first failing test case decides the verdict
+@mock_aws
+def test_batch_judging_reports_wrong_answer(sqlite_db):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=settings.AWS_BUCKET_NAME)
+    challenge_id = create_challenge(sqlite_db, s3)
+
+    result = judge(sqlite_db, "x = input()\nprint('0' if x == '0' else 'nope')", challenge_id, s3)
+    assert result["status"]["description"] == "Wrong Answer"
+    assert result["passed"] == 1
+    assert [t["status"] for t in result["test_results"]][:2] == ["Accepted", "Wrong Answer"]
+
+# Test that polling backs off quickly and throttled requests are retried
+def test_client_retries_and_polls_with_backoff():
+    async def run():
+        client = fake_judge0_client(poll_initial=0.01, poll_max=0.05)
+        try:
+            fake_judge0.config.update(pending_polls=3, throttle=1)
+            result = await client.run({"source_code": "print(1)", "language_id": 71, "stdin": ""})
+            return result, client.stats()
+        finally:
+            fake_judge0.config.update(pending_polls=0, throttle=0)
+            await client.close()
+
+    result, stats = asyncio.run(run())
+    assert result["status"]["description"] == "Accepted"
+    assert stats["retries"] == 1
+    assert stats["polls"] == 4
+    assert stats["in_flight"] == 0
+    assert stats["latency_seconds_max"] < 1
+
+# Test that a submission is not retried on a server error, and a failed poll is an error
+def test_client_does_not_repeat_submissions():
+    requests = []
+
+    def handler(request):
+        requests.append(request.method)
+        if request.method == "POST":
+            return httpx.Response(503 if len(requests) == 1 else 201, json={"token": "t1"})
+        return httpx.Response(500)
+
+    async def run():
+        client = Judge0Client(base_url="http://judge0.test", max_retries=2, transport=httpx.MockTransport(handler))
+        try:
+            for _ in range(2):
+                with pytest.raises(Judge0Error):
+                    await client.run({"source_code": "print(1)", "language_id": 71})
+        finally:
+            await client.close()
+
+    asyncio.run(run())
+    assert requests == ["POST", "POST", "GET", "GET", "GET"]
+
+# Test that identical code is served from the verdict cache until the test set changes
+@mock_aws
+def test_verdict_cache_hit_and_invalidation(sqlite_db):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=settings.AWS_BUCKET_NAME)
+    challenge_id = create_challenge(sqlite_db, s3)
+    cache = VerdictCache(max_entries=10)
+
+    first = judge(sqlite_db, "print(input())", challenge_id, s3, cache)
+    fake_judge0.stats["requests"] = 0
+    second = judge(sqlite_db, "print(input())", challenge_id, s3, cache)
+    assert second["cached"] is True
+    assert second["status"] == first["status"]
+    assert fake_judge0.stats["requests"] == 0
+
+    # Same effect as add_test_case/edit_test_case/delete_test_case in admin.py
+    db = sqlite_db.Session()
+    db.execute(bump_test_set_version(challenge_id))
+    db.commit()
+    db.close()
+
+    third = judge(sqlite_db, "print(input())", challenge_id, s3, cache)
+    assert "cached" not in third
+    assert cache.stats()["hits"] == 1
+    assert cache.stats()["misses"] == 2
+
+# Test that verdicts stored by one worker are found by another through Mongo
+def test_verdict_cache_mongo_tier():
+    collection = AsyncMongoMockClient()["test_code_platform"]["verdict_cache"]
+    key = verdict_key("print(1)", 71, 1, 1)
+    asyncio.run(VerdictCache(collection=collection).put(key, {"status": {"id": 3, "description": "Accepted"}}))
+
+    other_worker = VerdictCache(collection=collection)
+    assert asyncio.run(other_worker.get(key))["status"]["id"] == 3
+    assert other_worker.stats()["mongo_hits"] == 1
+
+# Test that the challenge's compare mode is applied to Judge0 results, without leaking hidden outputs
+@mock_aws
+def test_compare_mode_with_judge0(sqlite_db):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=settings.AWS_BUCKET_NAME)
+    challenge_id = create_challenge(sqlite_db, s3)
+    source = "print(' ', input(), ' ')"
+    assert judge(sqlite_db, source, challenge_id, s3)["status"]["description"] == "Wrong Answer"
+
+    db = sqlite_db.Session()
+    db.query(Challenge).filter(Challenge.id == challenge_id).update({Challenge.compare_mode: "whitespace"})
+    db.execute(bump_test_set_version(challenge_id))
+    db.commit()
+    db.close()
+    assert judge(sqlite_db, source, challenge_id, s3)["status"]["description"] == "Accepted"
+
+    result = judge(sqlite_db, "x = input()\nprint(x if x != 'secret' else 'leak')", challenge_id, s3)
+    hidden = next(t for t in result["test_results"] if t["hidden"])
+    assert hidden["mismatch"] == {"mode": "whitespace", "token": 1}
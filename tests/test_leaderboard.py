@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.security import CurrentUser, get_current_user
+from database.mysql_db import get_db
+from database.submissions import SubmissionRepository
+from models import User
+from services.leaderboard import Leaderboard, RankedSet, get_leaderboard
+from services.submission_worker import SubmissionWorker
+
+client = TestClient(app)
+
+@pytest.fixture(scope="module")
+def users(sqlite_db):
+    with sqlite_db.Session() as session:
+        session.add_all([User(id=i, username=f"user{i}", email=f"user{i}@example.com") for i in range(1, 5)])
+        session.commit()
+    return sqlite_db
+
+@pytest.fixture
+def board(users, overrides):
+    mongo = AsyncMongoMockClient()["test_leaderboard"]
+    board = Leaderboard(mongo["entries"], wrong_attempt_penalty=1200, sync_interval=0)
+    overrides[get_leaderboard] = lambda: board
+    overrides[get_db] = users.get_db
+    overrides[get_current_user] = lambda: CurrentUser(3, "user3", "user3@example.com")
+    return board
+
+def record(board, verdicts):
+    async def run():
+        for user_id, challenge_id, accepted, at in verdicts:
+            await board.record(user_id, challenge_id, accepted, at)
+    asyncio.run(run())
+
+# Test rank and slices of the skip list against a sorted list
+def test_ranked_set_matches_sorted_list():
+    rng = random.Random(7)
+    ranked, expected = RankedSet(seed=1), []
+    for _ in range(2000):
+        key = rng.randrange(500)
+        if key in expected:
+            assert ranked.remove(key)
+            expected.remove(key)
+        else:
+            ranked.insert(key)
+            expected.append(key)
+            expected.sort()
+    assert len(ranked) == len(expected)
+    assert ranked.slice(0, len(expected)) == expected
+    assert [ranked.rank(key) for key in expected] == list(range(len(expected)))
+    assert ranked.slice(10, 20) == expected[10:20] and ranked.rank(-1) is None and not ranked.remove(-1)
+
+# Test first-solve scoring with time and wrong-attempt penalties, and the board endpoints
+def test_scores_and_ranks(board):
+    record(board, [
+        (1, 10, False, 1000.0), (1, 10, True, 1100.0), (1, 10, False, 1200.0), (1, 10, True, 1300.0),
+        (2, 10, True, 1000.0), (2, 11, False, 1000.0), (2, 11, True, 1060.0),
+        (3, 11, True, 1000.0), (4, 12, False, 1000.0),
+    ])
+
+    standings = client.get("/leaderboard/").json()
+    assert standings["total"] == 3
+    assert [(e["rank"], e["username"], e["solved"], e["penalty"]) for e in standings["entries"]] == [
+        (1, "user2", 2, 1260.0), (2, "user3", 1, 0.0), (3, "user1", 1, 1300.0)
+    ]
+
+    challenge = client.get("/leaderboard/challenges/10").json()
+    assert [(e["user_id"], e["penalty"]) for e in challenge["entries"]] == [(2, 0.0), (1, 1300.0)]
+
+    me = client.get("/leaderboard/me?window=1").json()
+    assert me["entry"]["rank"] == 2 and [e["user_id"] for e in me["entries"]] == [2, 3, 1]
+    assert client.get("/leaderboard/users/1?window=0").json()["entries"][0]["rank"] == 3
+    assert client.get("/leaderboard/users/4").status_code == 404
+    assert client.get("/leaderboard/?offset=1&limit=1").json()["entries"][0]["user_id"] == 3
+
+# Test that solves recorded by another process are picked up on the next read
+def test_other_processes_are_synced(board):
+    other = Leaderboard(board.entries)
+    asyncio.run(other.record(4, 12, True, time.time()))
+    assert board.global_board.rank(4) is None
+
+    assert client.get("/leaderboard/users/4").json()["entry"]["rank"] == 1
+    assert board.stats()["users"] == 1
+
+# Test that the worker scores graded verdicts once, skipping compile errors and runs
+def test_worker_records_graded_verdicts(board):
+    submissions = AsyncMongoMockClient()["test_leaderboard"]["submissions"]
+    statuses = {"ok": {"id": 3, "description": "Accepted"}, "wa": {"id": 4, "description": "Wrong Answer"},
+                "ce": {"id": 6, "description": "Compilation Error"}}
+
+    async def runner(job):
+        return {"status": statuses[job["source_code"]]}
+
+    async def run():
+        worker = SubmissionWorker(SubmissionRepository(submissions), runner=runner, leaderboard=board)
+        for source, mode in (("wa", "submit"), ("ce", "submit"), ("wa", "run"), ("ok", "submit")):
+            result = await submissions.insert_one({"user_id": 1, "challenge_id": 10})
+            job = {"submission_id": str(result.inserted_id), "user_id": 1, "challenge_id": 10,
+                   "language_id": 71, "source_code": source, "stdin": "", "mode": mode}
+            await worker.process(job)
+            # A redelivered job is not scored twice
+            await worker.process(job)
+        return await board.entries.find_one({"_id": {"user_id": 1, "challenge_id": 10}})
+
+    entry = asyncio.run(run())
+    assert entry["failed"] == 1 and entry["solved_at"] >= entry["first_attempt_at"]
+    assert board.stats()["solves"] == 1 and board.global_board.rank(1) == 0
@@ -0,0 +1,140 @@
+import asyncio
+import os
+import pwd
+import shutil
+import tempfile
+import pytest
+from services import local_runner
+from services.executors import LocalExecutor
+from services.s3 import LocalS3Client
+from services.testcase_store import HiddenCaseStore
+
+LIMITS = {"time_limit": 1, "memory_limit": 128}
+
+def execute(source_code, runs, language_id=71, limits=LIMITS, warm_python=False):
+    async def run():
+        executor = LocalExecutor(workers=2, warm_python=warm_python)
+        try:
+            return await executor.execute(source_code, language_id, runs, limits)
+        finally:
+            await executor.close()
+    return asyncio.run(run())
+
+# Test that every run gets its own verdict, in order
+def test_python_runs_against_each_case():
+    results = execute("print(int(input()) * 2)", [
+        {"stdin": "2\n", "expected_output": "4\n"},
+        {"stdin": "3\n", "expected_output": "7\n"},
+        {"stdin": "x\n", "expected_output": "0\n"},
+    ])
+    assert [r["status"]["description"] for r in results] == ["Accepted", "Wrong Answer", "Runtime Error (NZEC)"]
+    assert results[0]["stdout"] == "4\n"
+
+# Test that CPU time and memory limits are enforced
+def test_limits_are_enforced():
+    results = execute("while True: pass", [{"stdin": ""}])
+    assert results[0]["status"]["description"] == "Time Limit Exceeded"
+
+    results = execute("x = bytearray(512 * 1024 * 1024)", [{"stdin": ""}])
+    assert results[0]["status"]["description"] == "Runtime Error (NZEC)"
+    assert "MemoryError" in results[0]["stderr"]
+
+# Test that C++ compile errors are reported for every case
+@pytest.mark.skipif(shutil.which("g++") is None, reason="g++ not installed")
+def test_cpp_compilation():
+    ok = execute("#include <iostream>\nint main(){int a;std::cin>>a;std::cout<<a+1;}", [{"stdin": "1", "expected_output": "2"}], language_id=54)
+    assert ok[0]["status"]["description"] == "Accepted"
+
+    broken = execute("int main( {", [{"stdin": ""}, {"stdin": ""}], language_id=54)
+    assert [r["status"]["id"] for r in broken] == [6, 6]
+    assert broken[0]["compile_output"]
+
+# Test that warm interpreters run programs with the same results and limits as cold ones
+def test_warm_python():
+    results = execute("import sys\nprint(sys.stdin.read().upper(), end='')", [
+        {"stdin": "abc", "expected_output": "ABC"},
+        {"stdin": "xyz", "expected_output": "XYZ"},
+    ], warm_python=True)
+    assert [r["status"]["description"] for r in results] == ["Accepted", "Accepted"]
+
+    results = execute("while True: pass", [{"stdin": ""}], warm_python=True)
+    assert results[0]["status"]["description"] == "Time Limit Exceeded"
+
+    results = execute("x = bytearray(512 * 1024 * 1024)", [{"stdin": ""}], warm_python=True)
+    assert "MemoryError" in results[0]["stderr"]
+
+    results = execute("import sys\nsys.exit(3)", [{"stdin": ""}], warm_python=True)
+    assert results[0]["status"]["description"] == "Runtime Error (NZEC)"
+
+# Test that nothing a program does survives into the next run
+def test_warm_python_does_not_leak_state():
+    source = "import builtins\nprint(hasattr(builtins, 'leak'))\nbuiltins.leak = 1"
+    results = execute(source, [{"stdin": ""} for _ in range(4)], warm_python=True)
+    assert [r["stdout"] for r in results] == ["False\n"] * 4
+
+# Test that file-backed runs read stdin and the expected output from disk
+def test_file_backed_runs(tmp_path):
+    (tmp_path / "in.txt").write_text("21\n")
+    (tmp_path / "good.out").write_text("42\n\n")
+    (tmp_path / "bad.out").write_text("41\n")
+    results = execute("print(int(input()) * 2)", [
+        {"stdin_path": str(tmp_path / "in.txt"), "expected_output_path": str(tmp_path / "good.out")},
+        {"stdin_path": str(tmp_path / "in.txt"), "expected_output_path": str(tmp_path / "bad.out")},
+    ], warm_python=True)
+    assert [r["status"]["description"] for r in results] == ["Accepted", "Wrong Answer"]
+
+# Test that outputs are compared in the run's compare mode and wrong answers say where they differ
+def test_compare_modes(tmp_path):
+    (tmp_path / "expected.out").write_text("0.333333\n1 2 3\n")
+    source = "print(1 / 3)\nprint('1  2 3')"
+    results = execute(source, [
+        {"stdin": "", "expected_output_path": str(tmp_path / "expected.out"), "compare_mode": "float"},
+        {"stdin": "", "expected_output_path": str(tmp_path / "expected.out")},
+        {"stdin": "", "expected_output": "0.3\n1 2 3", "compare_mode": "float", "float_tolerance": 1e-3},
+    ])
+    assert [r["status"]["description"] for r in results] == ["Accepted", "Wrong Answer", "Wrong Answer"]
+    assert results[1]["mismatch"]["line"] == 1 and results[1]["mismatch"]["column"] == 9
+    assert results[2]["mismatch"] == {"mode": "float", "token": 1, "expected": "0.3", "actual": "0.3333333333333333"}
+
+# Run a program in this process (not the executor's pool), so it starts from this environment
+def run_here(source_code, language_id=71, warm_python=False, sandbox=None):
+    prepared = local_runner.prepare(source_code, language_id, sandbox)
+    try:
+        if prepared["compile_output"] is not None:
+            return {"compile_output": prepared["compile_output"]}
+        return local_runner.run_case(prepared["workdir"], language_id, {"stdin": ""}, 2, 128, 1024,
+                                     warm_python, sandbox)
+    finally:
+        local_runner.cleanup(prepared["workdir"])
+
+# Test that programs see none of the service's environment, cold or forked from a zygote
+def test_programs_get_an_empty_environment(monkeypatch):
+    monkeypatch.setenv("FOO_SECRET", "leak")
+    source = "import os\nprint(os.environ.get('FOO_SECRET'), sorted(os.environ))"
+    for warm_python in (False, True):
+        result = run_here(source, warm_python=warm_python)
+        assert result["status"]["description"] == "Accepted"
+        assert "leak" not in result["stdout"] and "FOO_SECRET" not in result["stdout"]
+
+# Test that with a sandbox user, compilers and programs cannot read the hidden case cache
+@pytest.mark.skipif(os.getuid() != 0 or shutil.which("gcc") is None, reason="needs root and gcc")
+def test_sandbox_user_cannot_read_the_cache(tmp_path):
+    base = tempfile.mkdtemp()
+    os.chmod(base, 0o755)
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    s3.put_object(Bucket="bucket", Key="case.out", Body=b"hidden-answer\n")
+    secret = HiddenCaseStore(os.path.join(base, "cache"), 1024, s3=s3, bucket="bucket").get_path("case.out")
+    sandbox = local_runner.sandbox_ids(pwd.getpwuid(65534).pw_name)
+    try:
+        c_source = ('#include <stdio.h>\n#include <unistd.h>\nint main(){FILE *f = fopen("%s", "r");'
+                    'printf("%%d %%s", (int)getuid(), f ? "read" : "denied");}' % secret)
+        assert run_here(c_source, language_id=50, sandbox=sandbox)["stdout"] == "65534 denied"
+
+        python_source = (f"import os\ntry:\n    open({secret!r}).read()\n    print(os.getuid(), 'read')\n"
+                         f"except PermissionError:\n    print(os.getuid(), 'denied')")
+        assert run_here(python_source, warm_python=True, sandbox=sandbox)["stdout"] == "65534 denied\n"
+
+        included = run_here(f'#include "{secret}"\nint main(){{}}', language_id=50, sandbox=sandbox)
+        assert "hidden-answer" not in included["compile_output"]
+    finally:
+        shutil.rmtree(base, ignore_errors=True)
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from types import SimpleNamespace
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core import metrics
+from core.config import settings
+from database.mysql_db import get_db
+from database.submissions import SubmissionRepository
+from services.submission_worker import SubmissionWorker
+
+client = TestClient(app)
+
+# Value of one series in the rendered metrics (other test modules add to the same registry)
+def sample(series):
+    for line in metrics.registry.render().splitlines():
+        if line.startswith(series + " "):
+            return float(line.rsplit(" ", 1)[1])
+    return 0
+
+# The SQLite database, its queries timed like the ones of core.db's engines
+@pytest.fixture(scope="module")
+def timed_db(sqlite_db):
+    metrics.instrument_engine(sqlite_db.async_engine.sync_engine)
+    return sqlite_db
+
+@pytest.fixture
+def catalog(timed_db, overrides):
+    overrides[get_db] = timed_db.get_db
+
+# Test the text exposition of histograms, counters and gauges
+def test_render():
+    registry = metrics.Registry()
+    histogram = registry.histogram("latency_seconds", "Latency", ("route",), buckets=(0.1, 1.0))
+    histogram.observe(0.05, "/a")
+    histogram.observe(0.5, "/a")
+    histogram.observe(5, "/a")
+    registry.counter("hits_total", "Hits", ("path",)).inc('say "hi"')
+    registry.gauge("depth", "Depth", lambda: 3)
+    registry.gauge("broken", "Broken", lambda: 1 / 0)
+
+    lines = registry.render().splitlines()
+    assert 'latency_seconds_bucket{route="/a",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{route="/a",le="1"} 2' in lines
+    assert 'latency_seconds_bucket{route="/a",le="+Inf"} 3' in lines
+    assert 'latency_seconds_sum{route="/a"} 5.55' in lines and 'latency_seconds_count{route="/a"} 3' in lines
+    assert 'hits_total{path="say \\"hi\\""} 1' in lines
+    assert "# TYPE depth gauge" in lines and "depth 3" in lines
+    assert not any(line.startswith("broken") for line in lines)
+
+# Test that spans, thread pool hops and Mongo commands add up in the enclosing breakdown only
+def test_breakdown():
+    async def scenario():
+        with metrics.tracking() as breakdown:
+            with metrics.span("judge0.poll"):
+                await asyncio.sleep(0.01)
+            assert await metrics.to_thread("s3.read", lambda x: x * 2, 21) == 42
+            metrics.MongoCommandListener().succeeded(SimpleNamespace(command_name="find", duration_micros=1500))
+        metrics.record("judge0.poll", 1.0)
+        return breakdown
+
+    breakdown = asyncio.run(scenario())
+    assert set(breakdown.stages) == {"judge0.poll", "threadpool.wait", "s3.read", "mongo.find"}
+    assert breakdown.count("judge0.poll") == 1 and 0.01 <= breakdown.stages["judge0.poll"][1] < 1.0
+    assert "mongo.find=1x1.5ms" in str(breakdown)
+
+# Test that requests are timed per route template with their SQL queries, and slow ones are logged
+def test_requests_are_timed(catalog, monkeypatch, caplog):
+    route = 'method="GET",route="/candidate/challenges/{challenge_id}"'
+    before = sample(f'http_request_duration_seconds_count{{{route},status="404"}}')
+    monkeypatch.setattr(settings, "SLOW_REQUEST_SECONDS", 1e-9)
+    with caplog.at_level(logging.WARNING, logger="core.metrics"):
+        assert client.get("/candidate/challenges/424242").status_code == 404
+    assert "Slow request GET /candidate/challenges/{challenge_id} -> 404" in caplog.text
+    assert "db.query=1x" in caplog.text
+
+    assert sample(f'http_request_duration_seconds_count{{{route},status="404"}}') == before + 1
+    assert sample(f'http_request_db_queries_bucket{{{route},le="1"}}') >= 1
+    assert sample(f'http_slow_requests_total{{{route}}}') >= 1
+    body = client.get("/metrics").text
+    assert body.startswith("# HELP") and 'app_span_seconds_count{span="db.query"}' in body
+
+    client.get("/no/such/path")
+    assert 'route="unmatched",status="404"' in client.get("/metrics").text
+
+    monkeypatch.setattr(settings, "METRICS_ENABLED", False)
+    assert client.get("/metrics").status_code == 404
+
+# Test that worker jobs are timed per mode and verdict
+def test_jobs_are_timed():
+    series = 'submission_job_duration_seconds_count{mode="submit",status="Wrong Answer"}'
+    before = sample(series)
+    submissions = AsyncMongoMockClient()["test_metrics"]["submissions"]
+
+    async def runner(job):
+        with metrics.span("execution"):
+            await asyncio.sleep(0)
+        return {"status": {"id": 4, "description": "Wrong Answer"}}
+
+    async def run():
+        result = await submissions.insert_one({"user_id": 1, "challenge_id": 1, "status": "Pending"})
+        await SubmissionWorker(SubmissionRepository(submissions), runner=runner).process({
+            "submission_id": str(result.inserted_id), "user_id": 1, "challenge_id": 1, "language_id": 71,
+            "source_code": "print(1)", "stdin": "", "mode": "submit"
+        })
+
+    asyncio.run(run())
+    assert sample(series) == before + 1
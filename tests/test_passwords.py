@@ -0,0 +1,48 @@
+import asyncio
+import pytest
+from services.passwords import PasswordHasher, PasswordHasherBusy, crypt_context
+
+# Low bcrypt cost keeps the tests fast
+@pytest.fixture
+def hasher():
+    hasher = PasswordHasher(workers=2, max_pending=8, rounds=4)
+    yield hasher
+    hasher.close()
+
+# Test that hashes made on the pool verify, and wrong passwords or garbage do not
+def test_hash_and_verify(hasher):
+    async def scenario():
+        hashed = await hasher.hash("hunter2")
+        return hashed, await hasher.verify("hunter2", hashed), await hasher.verify("wrong", hashed), \
+            await hasher.verify("hunter2", "not-a-hash")
+
+    hashed, ok, wrong, garbage = asyncio.run(scenario())
+    assert hashed.startswith("$2b$04$")
+    assert ok == (True, None) and wrong == (False, None) and garbage == (False, None)
+    assert hasher.stats()["hashes"] == 1 and hasher.stats()["verifications"] == 3
+
+# Test that a hash with an outdated cost is re-hashed with the current one on verification
+def test_outdated_cost_is_upgraded():
+    old_hash = crypt_context(4).hash("hunter2")
+    hasher = PasswordHasher(workers=1, rounds=5)
+    try:
+        valid, new_hash = asyncio.run(hasher.verify("hunter2", old_hash))
+    finally:
+        hasher.close()
+    assert valid and new_hash.startswith("$2b$05$")
+    assert crypt_context(5).verify("hunter2", new_hash)
+    assert hasher.stats()["upgrades"] == 1
+
+# Test that operations beyond max_pending are rejected instead of queued
+def test_excess_operations_are_rejected():
+    hasher = PasswordHasher(workers=1, max_pending=2, rounds=4)
+
+    async def burst():
+        return await asyncio.gather(*(hasher.hash("x") for _ in range(5)), return_exceptions=True)
+
+    try:
+        results = asyncio.run(burst())
+    finally:
+        hasher.close()
+    rejected = [r for r in results if isinstance(r, PasswordHasherBusy)]
+    assert len(rejected) == 3 and hasher.stats()["rejected"] == 3 and hasher.stats()["pending"] == 0
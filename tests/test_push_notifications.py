@@ -0,0 +1,132 @@
+import asyncio
+import base64
+import json
+import httpx
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.config import settings
+from core.security import CurrentUser, get_current_user
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.judge0 import Judge0Client
+from services.pubsub import InMemoryPubSub, get_pubsub
+from services.submission_queue import InMemoryQueue, get_submission_queue
+from services.submission_worker import SubmissionWorker, USER_CHANNEL
+
+@pytest.fixture
+def pubsub(monkeypatch, overrides):
+    monkeypatch.setattr(settings, "JUDGE0_CALLBACK_SECRET", "s3cret")
+    pubsub = InMemoryPubSub()
+    db = AsyncMongoMockClient()["test_code_platform"]
+    queue = InMemoryQueue()
+    overrides.update({
+        get_pubsub: lambda: pubsub,
+        get_submissions_collection: lambda: db["submissions"],
+        get_submission_queue: lambda: queue,
+        get_current_user: lambda: CurrentUser(7, "alice", "alice@example.com"),
+    })
+    return pubsub, db, queue
+
+def api():
+    return httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test")
+
+def events(body):
+    return [json.loads(line[len("data: "):]) for line in body.splitlines() if line.startswith("data: ")]
+
+# A Judge0 stand-in that calls back for the tokens in `calls_back` and answers polls for the rest.
+# With `early` the callbacks are made before the submit response is sent.
+def fake_judge0(calls_back, polls, early=False):
+    tokens = iter(["t1", "t2", "t3"])
+
+    async def call_back(url, token):
+        async with api() as client:
+            body = {"token": token, "status": {"id": 3, "description": "Accepted"},
+                    "stdout": base64.b64encode(f"out {token}\n".encode()).decode(), "time": "0.01", "memory": 100}
+            assert (await client.put(url, json=body)).status_code == 200
+
+    async def handler(request):
+        if request.method == "GET":
+            polls.append(request.url.path)
+            return httpx.Response(200, json={"submissions": [
+                {"token": token, "status": {"id": 3, "description": "Accepted"}, "stdout": "polled\n"}
+                for token in request.url.params["tokens"].split(",")
+            ]})
+        payloads = json.loads(request.content)["submissions"]
+        created = [{"token": next(tokens)} for _ in payloads]
+        for payload, item in zip(payloads, created):
+            if item["token"] in calls_back and early:
+                await call_back(payload["callback_url"], item["token"])
+            elif item["token"] in calls_back:
+                asyncio.create_task(call_back(payload["callback_url"], item["token"]))
+        return httpx.Response(201, json=created)
+    return httpx.MockTransport(handler)
+
+# Test that results come from Judge0 callbacks, and only missing ones are polled for
+def test_judge0_callbacks(pubsub):
+    polls = []
+
+    async def scenario():
+        client = Judge0Client(base_url="http://judge0.test", callback_url="http://test/internal/judge0/callback",
+                              callback_secret="s3cret", callback_timeout=0.2, pubsub=pubsub[0],
+                              poll_initial=0.01, transport=fake_judge0({"t1", "t3"}, polls))
+        try:
+            results = await client.run_batch([{"source_code": "x", "language_id": 71}] * 3)
+        finally:
+            await client.close()
+        async with api() as api_client:
+            forged = await api_client.put("/internal/judge0/callback", params={"client": client.client_id, "secret": "no"},
+                                          json={"token": "t1"})
+        return results, client.stats(), forged
+
+    results, stats, forged = asyncio.run(scenario())
+    assert [r["stdout"] for r in results] == ["out t1\n", "polled\n", "out t3\n"]
+    assert stats["callbacks"] == 2 and stats["callback_timeouts"] == 1 and len(polls) == 1
+    assert forged.status_code == 403
+
+# Test that a callback arriving before the submit response is used without waiting for the timeout
+def test_judge0_callback_before_response(pubsub):
+    polls = []
+
+    async def scenario():
+        client = Judge0Client(base_url="http://judge0.test", callback_url="http://test/internal/judge0/callback",
+                              callback_secret="s3cret", callback_timeout=15, pubsub=pubsub[0],
+                              transport=fake_judge0({"t1", "t2"}, polls, early=True))
+        await client.start()
+        try:
+            return await asyncio.wait_for(client.run_batch([{"source_code": "x", "language_id": 71}] * 2), 2)
+        finally:
+            await client.close()
+
+    results = asyncio.run(scenario())
+    assert [r["stdout"] for r in results] == ["out t1\n", "out t2\n"] and polls == []
+
+# Test that a client following a submission gets its status changes until the verdict
+def test_submission_events(pubsub):
+    bus, db, queue = pubsub
+
+    async def runner(job):
+        return {"status": {"id": 3, "description": "Accepted"}, "stdout": "hi\n", "time": "0.01", "memory": 10}
+
+    async def scenario():
+        mine = bus.subscribe(USER_CHANNEL.format(7))
+        async with api() as client:
+            submission_id = (await client.post("/submissions/", json={
+                "challenge_id": 1, "language_id": 71, "source_code": "print('hi')"
+            })).json()["submission_id"]
+            following = asyncio.create_task(client.get(f"/submissions/{submission_id}/events"))
+            while not bus.stats()["channels"] > 1:
+                await asyncio.sleep(0.01)
+            await SubmissionWorker(SubmissionRepository(db["submissions"]), runner=runner, pubsub=bus) \
+                .process(await queue.get())
+            live = await asyncio.wait_for(following, 5)
+            finished = await client.get(f"/submissions/{submission_id}/events")
+        return live, finished, [mine._queue.get_nowait() for _ in range(mine._queue.qsize())]
+
+    live, finished, mine = asyncio.run(scenario())
+    assert live.headers["content-type"].startswith("text/event-stream")
+    assert [e["status"] for e in events(live.text)] == ["Pending", "Processing", "Accepted"]
+    assert [e["status"] for e in events(finished.text)] == ["Accepted"]
+    assert [e["status"] for e in mine] == ["Processing", "Accepted"] and mine[1]["challenge_id"] == 1
+    # Only the user channel subscribed above is left
+    assert bus.stats()["channels"] == 1
@@ -0,0 +1,158 @@
+import asyncio
+import time
+import pytest
+from bson.objectid import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.security import CurrentUser, get_current_admin
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.analytics import SubmissionAnalytics
+from services.leaderboard import Leaderboard
+from services.submission_queue import InMemoryQueue, get_submission_queue
+from services.submission_worker import ACTIVE_STATUSES, REJUDGE, SubmissionWorker
+
+client = TestClient(app)
+
+ACCEPTED = {"id": 3, "description": "Accepted"}
+WRONG = {"id": 4, "description": "Wrong Answer"}
+
+def job(user_id, priority, number):
+    return {"submission_id": f"{priority}-{user_id}-{number}", "user_id": user_id, "priority": priority}
+
+async def take(queue, n):
+    return [(await asyncio.wait_for(queue.get(), 1))["submission_id"] for _ in range(n)]
+
+# Test that runs go first, users take turns within a class and rejudges come last
+def test_priorities_and_fair_turns():
+    async def scenario():
+        queue = InMemoryQueue(slots=8, shares={}, starvation_seconds=0)
+        for number in range(4):
+            await queue.put(job(1, "contest", number))
+        await queue.put(job(1, "rejudge", 0))
+        await queue.put(job(2, "contest", 0))
+        await queue.put(job(3, "run", 0))
+        await queue.put(job(2, "contest", 1))
+        return await take(queue, 8)
+
+    assert asyncio.run(scenario()) == [
+        "run-3-0", "contest-1-0", "contest-2-0", "contest-1-1", "contest-2-1", "contest-1-2", "contest-1-3",
+        "rejudge-1-0",
+    ]
+
+# Test that a class never runs on more than its share of the workers
+def test_concurrency_share():
+    async def scenario():
+        queue = InMemoryQueue(slots=4, shares={"rejudge": 0.5}, starvation_seconds=0)
+        for number in range(3):
+            await queue.put(job(1, "rejudge", number))
+        first = await take(queue, 2)
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(queue.get(), 0.05)
+        stats = queue.stats()["rejudge"]
+        await queue.ack(job(1, "rejudge", 0))
+        return first + await take(queue, 1), stats
+
+    taken, stats = asyncio.run(scenario())
+    assert taken == ["rejudge-1-0", "rejudge-1-1", "rejudge-1-2"]
+    assert stats == {"queued": 1, "running": 2, "limit": 2, "users": 1}
+
+# Test that a class kept waiting too long is served ahead of higher ones
+def test_starvation_protection():
+    async def scenario():
+        queue = InMemoryQueue(slots=4, shares={}, starvation_seconds=0.05)
+        await queue.put(job(1, "practice", 0))
+        await asyncio.sleep(0.06)
+        await queue.put(job(2, "contest", 0))
+        return await take(queue, 2)
+
+    assert asyncio.run(scenario()) == ["practice-1-0", "contest-2-0"]
+
+# Test that a rejudge queues every finished graded submission of the challenge in the rejudge class
+def test_rejudge_challenge(overrides):
+    db = AsyncMongoMockClient()["test_scheduler"]
+    queue = InMemoryQueue(shares={})
+    overrides.update({
+        get_submissions_collection: lambda: db["submissions"],
+        get_submission_queue: lambda: queue,
+        get_current_admin: lambda: CurrentUser(1, "admin", "admin@example.com", True),
+    })
+    repository = SubmissionRepository(db["submissions"])
+
+    async def seed():
+        for user_id, status, mode in [(2, "Accepted", "submit"), (3, "Wrong Answer", "submit"),
+                                      (4, "Pending", "submit"), (5, "Accepted", "run")]:
+            await repository.insert({"user_id": user_id, "challenge_id": 9, "language_id": 71, "mode": mode,
+                                     "status": status, "source_code": f"print({user_id})"})
+    asyncio.run(seed())
+
+    started = time.time()
+    response = client.post("/admin/challenges/9/rejudge")
+    assert response.status_code == 202 and response.json() == {"challenge_id": 9, "queued": 2}
+    jobs = [asyncio.run(asyncio.wait_for(queue.get(), 1)) for _ in range(2)]
+    assert [(j["user_id"], j["source_code"], j["priority"]) for j in jobs] == [
+        (2, "print(2)", "rejudge"), (3, "print(3)", "rejudge")
+    ]
+    assert all(j["enqueued_at"] >= started for j in jobs)
+    stats = client.get("/admin/stats/queue").json()
+    assert stats["depth"] == 0 and stats["classes"]["rejudge"]["running"] == 2
+    assert client.get("/admin/stats").json()["queue"] == stats
+    assert client.get("/admin/stats/nothing").status_code == 404
+
+    # The jobs are read one page at a time
+    async def pages():
+        return [[doc["user_id"] for doc in page]
+                async for page in repository.graded_source_pages(9, excluded=ACTIVE_STATUSES, page_size=1)]
+    assert asyncio.run(pages()) == [[2], [3]]
+
+# Test that a rejudge which changes a verdict corrects the leaderboard and the analytics instead of
+# skipping them or counting the submission twice
+def test_rejudge_corrects_leaderboard_and_analytics():
+    mongo = AsyncMongoMockClient()["test_rejudge"]
+    repository = SubmissionRepository(mongo["submissions"])
+    board = Leaderboard(mongo["entries"], wrong_attempt_penalty=100, sync_interval=0)
+    analytics = SubmissionAnalytics(mongo["rollups"], mongo["rollup_users"])
+    verdicts = {}
+
+    async def runner(job):
+        return {"status": verdicts[job["source_code"]], "time": "0.01", "memory": 1024}
+
+    async def run():
+        worker = SubmissionWorker(repository, runner=runner, analytics=analytics, leaderboard=board)
+        jobs = []
+        for source in ("first", "second"):
+            submission_id = await repository.insert({"user_id": 1, "challenge_id": 9, "language_id": 71,
+                                                     "mode": "submit", "source_code": source})
+            jobs.append({"submission_id": str(submission_id), "user_id": 1, "challenge_id": 9, "language_id": 71,
+                         "source_code": source, "stdin": "", "mode": "submit"})
+        verdicts.update(first=ACCEPTED, second=WRONG)
+        for job in jobs:
+            await worker.process(job)
+        solved_at = (await board.entries.find_one())["solved_at"]
+
+        # The test cases change: the first submission is now wrong and the second one right
+        verdicts.update(first=WRONG, second=ACCEPTED)
+        for job in jobs:
+            await worker.process({**job, "priority": REJUDGE})
+            # A redelivered rejudge changes nothing
+            await worker.process({**job, "priority": REJUDGE})
+        entry = await board.entries.find_one()
+        rescored = board.top(0, 10)
+        total = (await analytics.challenge(9))["total"]
+        first = await repository.get(ObjectId(jobs[0]["submission_id"]))
+
+        # A rejudge that turns the only solve into a compile error takes the user off the board
+        verdicts["second"] = {"id": 6, "description": "Compilation Error"}
+        await worker.process({**jobs[1], "priority": REJUDGE})
+        return solved_at, entry, rescored, total, first, board.top(0, 10)
+
+    solved_at, entry, rescored, total, first, top = asyncio.run(run())
+    # The second submission is the solve now, after one wrong attempt; neither moved in time
+    assert entry["failed"] == 1 and entry["solved_at"] > solved_at
+    assert first["finished_at"] == solved_at and first["rejudged_at"] > solved_at
+    penalty = round(entry["solved_at"] - solved_at + 100, 3)
+    assert rescored["entries"] == [{"rank": 1, "user_id": 1, "solved": 1, "penalty": penalty}]
+    assert total["attempts"] == 2 and total["accepted"] == 1 and total["users"] == 1
+    assert total["statuses"] == {"3": 1, "4": 1}
+    assert top == {"total": 0, "entries": []}
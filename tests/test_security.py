@@ -0,0 +1,81 @@
+import time
+import pytest
+from fastapi.testclient import TestClient
+from jose import jwt
+from main import app
+from core import security
+from core.config import settings
+from database.mysql_db import get_db
+from models import User
+from services.passwords import crypt_context
+
+client = TestClient(app)
+
+@pytest.fixture(autouse=True)
+def fresh_caches(sqlite_db, overrides):
+    overrides[get_db] = sqlite_db.get_db
+    security.token_cache.clear()
+    security.user_cache.clear()
+
+def register_and_login(sqlite_db, email, is_admin=False):
+    client.post("/auth/register", json={"username": email.split("@")[0], "email": email, "password": "secret"})
+    if is_admin:
+        db = sqlite_db.Session()
+        db.query(User).filter(User.email == email).update({User.is_admin: True})
+        db.commit()
+        db.close()
+    token = client.post("/auth/login", json={"email": email, "password": "secret"}).json()["access_token"]
+    return {"Authorization": f"Bearer {token}"}
+
+# Test that repeated requests with the same token are authenticated without queries
+def test_token_and_user_are_cached(sqlite_db):
+    headers = register_and_login(sqlite_db, "carol@example.com")
+    me = client.get("/auth/me", headers=headers)
+    assert me.status_code == 200 and me.json()["email"] == "carol@example.com"
+
+    sqlite_db.queries.clear()
+    for _ in range(5):
+        assert client.get("/auth/me", headers=headers).status_code == 200
+    assert sqlite_db.queries == []
+    assert security.token_cache.stats()["hits"] >= 5
+
+# Test that missing, forged and expired tokens are rejected
+def test_invalid_tokens_are_rejected():
+    assert client.get("/auth/me").status_code == 401
+    assert client.get("/auth/me", headers={"Authorization": "Bearer not-a-jwt"}).status_code == 401
+    forged = jwt.encode({"sub": "1", "exp": time.time() + 60}, "wrong-key", algorithm=settings.ALGORITHM)
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {forged}"}).status_code == 401
+    expired = jwt.encode({"sub": "1", "exp": time.time() - 1}, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    assert client.get("/auth/me", headers={"Authorization": f"Bearer {expired}"}).status_code == 401
+
+    # A cached token stops working once its exp passes
+    security.token_cache.put("cached", 1, time.time() - 1)
+    assert security.token_cache.get("cached") is None
+
+# Test that admin routes need an admin, and that role changes apply to the next request
+def test_admin_role_changes_invalidate_cache(sqlite_db):
+    admin = register_and_login(sqlite_db, "root@example.com", is_admin=True)
+    user = register_and_login(sqlite_db, "dave@example.com")
+    user_id = client.get("/auth/me", headers=user).json()["id"]
+
+    assert client.get("/admin/stats/db").status_code == 401
+    assert client.get("/admin/stats/db", headers=user).status_code == 403
+    assert client.get("/admin/stats/db", headers=admin).status_code == 200
+
+    assert client.put(f"/admin/users/{user_id}", json={"is_admin": True}, headers=admin).status_code == 200
+    assert client.get("/admin/stats/db", headers=user).status_code == 200
+    assert security.user_cache.stats()["invalidations"] >= 1
+
+# Test that logging in with a hash made at an outdated bcrypt cost stores a current one
+def test_login_upgrades_outdated_hash(sqlite_db):
+    db = sqlite_db.Session()
+    db.add(User(username="erin", email="erin@example.com", password_hash=crypt_context(4).hash("secret")))
+    db.commit()
+    db.close()
+
+    assert client.post("/auth/login", json={"email": "erin@example.com", "password": "secret"}).status_code == 200
+    db = sqlite_db.Session()
+    stored = db.query(User).filter(User.email == "erin@example.com").one().password_hash
+    db.close()
+    assert stored.startswith(f"$2b${settings.BCRYPT_ROUNDS:02d}$")
+    assert client.post("/auth/login", json={"email": "erin@example.com", "password": "secret"}).status_code == 200
@@ -0,0 +1,169 @@
+import asyncio
+from collections import defaultdict
+import pytest
+from bson.objectid import ObjectId
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.security import CurrentUser, get_current_admin
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.similarity import MAX_PAIR_POSTINGS, SimilarityIndex, fingerprint, get_similarity_index, rank_pairs
+from services.submission_worker import SubmissionWorker
+
+client = TestClient(app)
+
+ORIGINAL = """
+def solve(numbers):
+    # running best subarray sum
+    best, current = numbers[0], 0
+    for value in numbers:
+        current = max(value, current + value)
+        best = max(best, current)
+    return best
+
+n = int(input())
+print(solve(list(map(int, input().split()))))
+"""
+
+# Same program with renamed identifiers, different comments and spacing
+DISGUISED = """
+def kadane(arr):
+    ans, run = arr[0], 0  # two trackers
+    for x in arr:
+        run = max(x, run + x)
+        ans = max(ans, run)
+    return ans
+
+count = int(input())
+print(kadane(list(map(int, input().split()))))
+"""
+
+UNRELATED = """
+import sys
+data = sys.stdin.read().split()
+total = 0
+while data:
+    item = data.pop()
+    if item.isdigit():
+        total += int(item) * 2
+    else:
+        total -= 1
+print("total:", total)
+"""
+
+@pytest.fixture
+def similarity(overrides):
+    db = AsyncMongoMockClient()["test_similarity"]
+    index = SimilarityIndex(db["fingerprints"], db["counts"], k=5, window=4, workers=2)
+    overrides[get_similarity_index] = lambda: index
+    overrides[get_submissions_collection] = lambda: db["submissions"]
+    overrides[get_current_admin] = lambda: CurrentUser(1, "admin", "admin@example.com", True)
+    yield index, db["submissions"]
+    index.close()
+
+# (user id, source) of accepted submissions to challenge 5, judged by a worker
+def accept(index, submissions, sources):
+    async def runner(job):
+        return {"status": {"id": 3, "description": "Accepted"}}
+
+    async def run():
+        worker = SubmissionWorker(SubmissionRepository(submissions), runner=runner, similarity=index)
+        ids = []
+        for user_id, source in sources:
+            result = await submissions.insert_one({"user_id": user_id, "challenge_id": 5, "language_id": 71,
+                                                   "source_code": source, "mode": "submit"})
+            job = {"submission_id": str(result.inserted_id), "user_id": user_id, "challenge_id": 5,
+                   "language_id": 71, "source_code": source, "stdin": "", "mode": "submit"}
+            await worker.process(job)
+            await worker.process(job)
+            ids.append(str(result.inserted_id))
+        return ids
+    return asyncio.run(run())
+
+# Test that renaming identifiers and rewriting comments does not change the fingerprints
+def test_fingerprints_ignore_names_and_comments():
+    original = set(fingerprint(ORIGINAL, 5, 4))
+    assert original and original == set(fingerprint(DISGUISED, 5, 4))
+    assert len(original & set(fingerprint(UNRELATED, 5, 4))) / len(original) < 0.2
+
+# Test that the closest match of an indexed submission is the disguised copy, never the user's own code
+def test_matches_from_index(similarity):
+    index, submissions = similarity
+    original, own_resubmission, copy, unrelated = accept(index, submissions, [
+        (1, ORIGINAL), (1, ORIGINAL), (2, DISGUISED), (3, UNRELATED)
+    ])
+    assert index.stats()["indexed"] == 4
+
+    matches = client.get(f"/admin/similarity/submissions/{original}").json()
+    assert matches[0]["submission_id"] == copy and matches[0]["similarity"] == 1.0
+    assert own_resubmission not in [match["submission_id"] for match in matches]
+    assert client.get("/admin/similarity/submissions/not-an-id").status_code == 404
+
+    pairs = client.get("/admin/similarity/challenges/5").json()
+    assert [sorted(s["user_id"] for s in pair["submissions"]) for pair in pairs] == [[1, 2]]
+
+# Test the batch scan on the process pool against the raw submissions
+def test_scan_ranks_suspicious_pairs(similarity):
+    index, submissions = similarity
+
+    async def seed():
+        await submissions.insert_many([
+            {"user_id": user_id, "challenge_id": 5, "language_id": 71, "source_code": source,
+             "mode": "submit", "status": status}
+            for user_id, source, status in [(1, ORIGINAL, "Accepted"), (2, DISGUISED, "Accepted"),
+                                            (3, UNRELATED, "Accepted"), (4, ORIGINAL, "Wrong Answer")]
+        ])
+    asyncio.run(seed())
+
+    report = client.post("/admin/similarity/challenges/5/scan?min_similarity=0.5").json()
+    assert report["indexed"] == 3
+    assert len(report["pairs"]) == 1 and report["pairs"][0]["similarity"] == 1.0
+    assert client.get("/admin/similarity/challenges/5").json() == report["pairs"]
+
+# Test that a submission indexed while a scan runs survives it, stale documents are dropped and
+# the fingerprint counts still match the index
+def test_scan_keeps_submissions_indexed_meanwhile(similarity):
+    index, submissions = similarity
+    _, stale = accept(index, submissions, [(1, ORIGINAL), (2, UNRELATED)])
+    repository = SubmissionRepository(submissions)
+
+    async def scenario():
+        # The second submission is no longer accepted
+        await submissions.update_one({"_id": ObjectId(stale)}, {"$set": {"status": "Wrong Answer"}})
+        accepted_sources = repository.accepted_sources
+
+        # A worker indexes a new submission after the scan read the accepted ones
+        async def read_then_index(challenge_id):
+            rows = await accepted_sources(challenge_id)
+            await index.add(ObjectId(), challenge_id, 3, 71, DISGUISED)
+            return rows
+        repository.accepted_sources = read_then_index
+        report = await index.scan(repository, 5)
+
+        docs = await index.fingerprints.find({"challenge_id": 5}).to_list(None)
+        expected = defaultdict(int)
+        for doc in docs:
+            for value in doc["fingerprints"]:
+                expected[index._count_id(5, value)] += 1
+        counts = {doc["_id"]: doc["n"] async for doc in index.counts.find({"n": {"$ne": 0}})}
+        return report, docs, counts, dict(expected)
+
+    report, docs, counts, expected = asyncio.run(scenario())
+    assert report["indexed"] == 1
+    assert sorted(doc["user_id"] for doc in docs) == [1, 3]
+    assert counts == expected
+
+# Test that copies sharing only fingerprints of long posting lists are still paired, and pair
+# generation does not grow with the square of those lists
+def test_rank_pairs_with_long_postings():
+    boilerplate = list(range(30))
+    docs = [{"_id": i, "user_id": i, "fingerprints": boilerplate[i % 3::3] + [1000 + i, 2000 + i]}
+            for i in range(40 * MAX_PAIR_POSTINGS)]
+    leaked = [5000 + k for k in range(20)]
+    for doc in docs[:2 * MAX_PAIR_POSTINGS]:
+        doc["fingerprints"] = leaked
+
+    pairs = rank_pairs(docs, 0.5, 0.9, 1000)
+    assert pairs and all(pair["similarity"] == 1.0 and pair["shared"] == 20 for pair in pairs)
+    assert {s["user_id"] for pair in pairs for s in pair["submissions"]} == set(range(2 * MAX_PAIR_POSTINGS))
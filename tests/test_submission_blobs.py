@@ -0,0 +1,90 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.config import settings
+from core.security import CurrentUser, get_current_user
+from database import blobs as blob_module
+from database.blobs import BlobStore
+from database.mongodb import get_submissions_collection
+from database.submissions import SubmissionRepository
+from services.s3 import LocalS3Client
+from services.submission_queue import InMemoryQueue, get_submission_queue
+
+client = TestClient(app)
+
+LONG_SOURCE = "def solve(n):\n" + "    n = n * 2 + 1  # step\n" * 200 + "print(solve(int(input())))\n"
+
+@pytest.fixture
+def submissions(overrides):
+    db = AsyncMongoMockClient()["test_code_platform"]
+    overrides.update({
+        get_submissions_collection: lambda: db["submissions"],
+        get_submission_queue: lambda: InMemoryQueue(),
+        get_current_user: lambda: CurrentUser(1, "alice", "alice@example.com"),
+    })
+    return db
+
+# Test that identical long sources are stored once, compressed, and come back whole
+def test_identical_sources_share_one_blob(submissions):
+    ids = [client.post("/submissions/", json={"challenge_id": 1, "language_id": 71, "source_code": LONG_SOURCE})
+           .json()["submission_id"] for _ in range(3)]
+
+    async def stored():
+        return (await submissions["submission_blobs"].find().to_list(None),
+                await submissions["submissions"].find().to_list(None))
+    blobs, docs = asyncio.run(stored())
+    assert len(blobs) == 1 and blobs[0]["codec"] == "zlib"
+    assert blobs[0]["stored_size"] < blobs[0]["size"] == len(LONG_SOURCE.encode())
+    assert all("source_code" not in doc and doc["blobs"]["source_code"] == blobs[0]["_id"] for doc in docs)
+    assert docs[0]["previews"]["source_code"] == LONG_SOURCE[:settings.SUBMISSION_PREVIEW_CHARS]
+
+    response = client.get(f"/submissions/{ids[0]}").json()
+    assert response["source_code"] == LONG_SOURCE
+    assert "blobs" not in response and "previews" not in response
+
+    # History pages carry the preview unless the body is included
+    page = client.get("/candidate/submissions").json()
+    assert "source_code" not in page[0] and page[0]["previews"]["source_code"].startswith("def solve")
+    full = client.get("/candidate/submissions", params={"include": "source_code"}).json()
+    assert all(item["source_code"] == LONG_SOURCE and "previews" not in item for item in full)
+
+# Test that an update moves a body between a blob and the document, and old documents still read
+def test_update_and_legacy_documents(submissions):
+    repository = SubmissionRepository(submissions["submissions"])
+
+    async def scenario():
+        submission_id = await repository.insert({"user_id": 1, "source_code": "print(1)"})
+        await repository.update(submission_id, {"stdout": "x" * 1000, "status": "Accepted"})
+        with_blob = await submissions["submissions"].find_one({"_id": submission_id})
+        await repository.update(submission_id, {"stdout": "short"})
+        inline = await submissions["submissions"].find_one({"_id": submission_id})
+        legacy = (await submissions["submissions"].insert_one({"user_id": 1, "source_code": LONG_SOURCE})).inserted_id
+        return (with_blob, inline, await repository.get(submission_id),
+                await repository.get(submission_id, {"stdout": 1}), await repository.get(legacy))
+
+    with_blob, inline, full, projected, legacy = asyncio.run(scenario())
+    assert "stdout" not in with_blob and "stdout" in with_blob["blobs"]
+    assert inline["stdout"] == "short" and not inline.get("blobs") and not inline.get("previews")
+    assert full["stdout"] == "short" and full["source_code"] == "print(1)" and full["status"] == "Accepted"
+    assert projected["stdout"] == "short" and "source_code" not in projected
+    assert legacy["source_code"] == LONG_SOURCE
+
+# Test that large blobs go to S3 and only their metadata stays in Mongo
+def test_large_blobs_go_to_s3(submissions, tmp_path):
+    store = BlobStore(submissions["submission_blobs"], s3=LocalS3Client(str(tmp_path)), bucket="bucket",
+                      s3_min_bytes=16)
+    text = "".join(chr(65 + (i * 7919) % 26) for i in range(5000))
+    before = dict(blob_module.counters)
+
+    async def scenario():
+        first = await store.put(text)
+        second = await store.put(text)
+        return first, second, await submissions["submission_blobs"].find_one({"_id": first}), await store.get(first)
+
+    first, second, doc, read = asyncio.run(scenario())
+    assert first == second and read == text
+    assert doc["location"] == "s3" and "data" not in doc
+    assert blob_module.counters["s3_objects"] - before["s3_objects"] == 1
+    assert blob_module.counters["deduplicated"] - before["deduplicated"] == 1
@@ -0,0 +1,109 @@
+import asyncio
+import pytest
+from fastapi.testclient import TestClient
+from mongomock_motor import AsyncMongoMockClient
+from main import app
+from core.security import CurrentUser, get_current_user
+from database.mongodb import get_submissions_collection
+from services.submission_queue import InMemoryQueue, get_submission_queue
+from database.submissions import SubmissionRepository
+from services.submission_worker import SubmissionWorker
+
+# In-memory stand-ins for Mongo and the submission queue
+submissions = AsyncMongoMockClient()["test_code_platform"]["submissions"]
+queue = InMemoryQueue()
+
+client = TestClient(app)
+
+# The user requests are authenticated as; see test_security.py for the real dependency
+current = {"user": CurrentUser(1, "alice", "alice@example.com")}
+
+def login_as(user_id, is_admin=False):
+    current["user"] = CurrentUser(user_id, f"user{user_id}", f"user{user_id}@example.com", is_admin)
+
+@pytest.fixture(autouse=True)
+def authenticated(overrides):
+    login_as(1)
+    overrides[get_submissions_collection] = lambda: submissions
+    overrides[get_submission_queue] = lambda: queue
+    overrides[get_current_user] = lambda: current["user"]
+
+SUBMISSION = {
+    "challenge_id": 1,
+    "language_id": 71,
+    "source_code": "print(input())",
+    "stdin": "hello"
+}
+
+# Test that a submission is accepted immediately and queued for evaluation
+def test_submit_returns_pending():
+    response = client.post("/submissions/", json=SUBMISSION)
+    assert response.status_code == 202
+    submission_id = response.json()["submission_id"]
+    assert response.json()["status"] == "Pending"
+    assert queue.depth() >= 1
+
+    status = client.get(f"/submissions/{submission_id}/status")
+    assert status.status_code == 200
+    assert status.json()["status"] == "Pending"
+
+# Test that a worker writes the verdict back to the submission document
+def test_worker_updates_submission():
+    submission_id = client.post("/submissions/", json=SUBMISSION).json()["submission_id"]
+
+    async def fake_runner(job):
+        return {"status": {"id": 3, "description": "Accepted"}, "stdout": job["stdin"] + "\n", "time": "0.01", "memory": 3000}
+
+    async def drain():
+        worker = SubmissionWorker(SubmissionRepository(submissions), runner=fake_runner)
+        while queue.depth():
+            job = await queue.get()
+            await worker.process(job)
+            await queue.ack(job)
+
+    asyncio.run(drain())
+
+    response = client.get(f"/submissions/{submission_id}")
+    assert response.status_code == 200
+    assert response.json()["status"] == "Accepted"
+    assert response.json()["stdout"] == "hello\n"
+
+# Test that unknown submission ids return 404
+def test_unknown_submission():
+    assert client.get("/submissions/not-an-id/status").status_code == 404
+
+# Test that history is paginated by cursor and leaves out heavy fields by default
+def test_submission_history():
+    login_as(43)
+    other = client.post("/submissions/", json={**SUBMISSION, "challenge_id": 7}).json()["submission_id"]
+    login_as(42)
+    ids = [client.post("/submissions/", json={**SUBMISSION, "challenge_id": 7}).json()["submission_id"]
+           for _ in range(5)]
+
+    seen, cursor = [], None
+    while True:
+        params = {"limit": 2}
+        if cursor:
+            params["cursor"] = cursor
+        response = client.get("/candidate/submissions", params=params)
+        assert response.status_code == 200
+        seen += response.json()
+        cursor = response.headers.get("x-next-cursor")
+        if cursor is None:
+            break
+    assert [s["submission_id"] for s in seen] == ids[::-1]
+    assert "source_code" not in seen[0] and seen[0]["status"] == "Pending"
+
+    full = client.get("/candidate/submissions", params={"limit": 1, "include": "source_code"}).json()
+    assert full[0]["source_code"] == SUBMISSION["source_code"]
+    assert client.get("/candidate/submissions", params={"include": "password"}).status_code == 400
+    assert client.get("/candidate/submissions", params={"cursor": "bogus"}).status_code == 400
+
+    # Other users' submissions are invisible to candidates, but not to admins
+    assert client.get(f"/submissions/{other}/status").status_code == 404
+    assert client.get(f"/submissions/{other}").status_code == 404
+    login_as(1, is_admin=True)
+    assert client.get(f"/submissions/{other}/status").status_code == 200
+    pending = client.get("/admin/challenges/7/submissions", params={"status": "Pending", "limit": 100}).json()
+    assert len(pending) == 6
+    assert client.get("/admin/challenges/7/submissions", params={"status": "Accepted"}).json() == []
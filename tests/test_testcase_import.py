@@ -0,0 +1,111 @@
+import asyncio
+import io
+import json
+import zipfile
+import pytest
+from fastapi.testclient import TestClient
+from main import app
+from core.config import settings
+from models import Challenge, TestCase
+from services.s3 import LocalS3Client
+from services.testcase_import import import_test_cases
+
+client = TestClient(app)
+
+pytestmark = pytest.mark.usefixtures("admin_api")
+
+def make_archive(cases, hidden=()):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, (stdin, stdout) in cases.items():
+            archive.writestr(f"{name}.in", stdin)
+            archive.writestr(f"{name}.out", stdout)
+        if hidden:
+            archive.writestr("manifest.json", json.dumps({"hidden": list(hidden)}))
+    buffer.seek(0)
+    return buffer
+
+def create_challenge(sqlite_db):
+    db = sqlite_db.Session()
+    challenge = Challenge(title="Sum", description="Add", difficulty="easy", time_limit=1, memory_limit=64)
+    db.add(challenge)
+    db.commit()
+    challenge_id = challenge.id
+    db.close()
+    return challenge_id
+
+@pytest.fixture
+def local_s3(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "S3_BACKEND", "local")
+    monkeypatch.setattr(settings, "S3_LOCAL_ROOT", str(tmp_path))
+    return LocalS3Client(str(tmp_path))
+
+# Test that all cases are imported in one go, hidden files going to S3
+def test_import_archive(sqlite_db, local_s3, tmp_path):
+    challenge_id = create_challenge(sqlite_db)
+    cases = {str(i): (f"{i}\n", f"{i * 2}\n") for i in range(1, 12)}
+    archive = make_archive(cases, hidden=["10", "11"])
+
+    response = client.post(f"/admin/challenges/{challenge_id}/testcases/import",
+                           files={"archive": ("cases.zip", archive, "application/zip")})
+    assert response.status_code == 200
+    assert response.json()["imported"] == 11 and response.json()["hidden"] == 2
+
+    db = sqlite_db.Session()
+    rows = db.query(TestCase).filter(TestCase.challenge_id == challenge_id).order_by(TestCase.id).all()
+    assert [row.input_data for row in rows[:3]] == ["1\n", "2\n", "3\n"]
+    hidden = [row for row in rows if row.is_hidden]
+    assert len(hidden) == 2 and hidden[0].input_data is None
+    body = local_s3.get_object(Bucket=settings.AWS_BUCKET_NAME, Key=hidden[0].s3_key)["Body"]
+    assert body.read() == b"10\n"
+    assert db.get(Challenge, challenge_id).test_set_version == 2
+    db.close()
+
+# Test that a failing upload leaves neither rows nor S3 objects behind
+def test_import_rolls_back_on_failure(sqlite_db, local_s3, tmp_path):
+    challenge_id = create_challenge(sqlite_db)
+
+    class FailingS3(LocalS3Client):
+        uploads = 0
+
+        def upload_fileobj(self, fileobj, bucket, key, **kwargs):
+            FailingS3.uploads += 1
+            if FailingS3.uploads == 3:
+                raise RuntimeError("connection reset")
+            super().upload_fileobj(fileobj, bucket, key, **kwargs)
+
+    archive = make_archive({str(i): ("x", "y") for i in range(4)}, hidden=["0", "1", "2"])
+
+    async def run_import():
+        async with sqlite_db.AsyncSession() as db:
+            await import_test_cases(db, challenge_id, archive, s3=FailingS3(str(tmp_path)))
+
+    with pytest.raises(RuntimeError):
+        asyncio.run(run_import())
+    db = sqlite_db.Session()
+    assert db.query(TestCase).filter(TestCase.challenge_id == challenge_id).count() == 0
+    db.close()
+    bucket_dir = tmp_path / settings.AWS_BUCKET_NAME / "hidden_cases"
+    assert not bucket_dir.exists() or not any(bucket_dir.iterdir())
+
+# Test that malformed archives are rejected
+def test_import_rejects_bad_archives(sqlite_db, local_s3):
+    challenge_id = create_challenge(sqlite_db)
+    url = f"/admin/challenges/{challenge_id}/testcases/import"
+
+    response = client.post(url, files={"archive": ("cases.zip", io.BytesIO(b"not a zip"), "application/zip")})
+    assert response.status_code == 400
+
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        archive.writestr("01.in", "1")
+    buffer.seek(0)
+    response = client.post(url, files={"archive": ("cases.zip", buffer, "application/zip")})
+    assert response.status_code == 400 and "01.out" in response.json()["detail"]
+
+    response = client.post(url, files={"archive": ("cases.zip", make_archive({"1": ("a", "b")}, hidden=["2"]), "application/zip")})
+    assert response.status_code == 400
+
+    response = client.post("/admin/challenges/9999/testcases/import",
+                           files={"archive": ("cases.zip", make_archive({"1": ("a", "b")}), "application/zip")})
+    assert response.status_code == 404
@@ -0,0 +1,89 @@
+import os
+import stat
+import boto3
+import pytest
+from botocore.exceptions import ClientError
+from moto import mock_aws
+from services.s3 import LocalS3Client
+from services.testcase_store import HiddenCaseStore
+
+BUCKET = "test-cases"
+
+def read_bytes(path):
+    with open(path, "rb") as f:
+        return f.read()
+
+# Test that a cached file is served from disk until it has to be revalidated
+def test_read_through_and_etag_revalidation(tmp_path):
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    s3.put_object(Bucket=BUCKET, Key="hidden_cases/a.txt", Body=b"first\n")
+    store = HiddenCaseStore(str(tmp_path / "cache"), 1024, s3=s3, bucket=BUCKET, revalidate_seconds=3600)
+
+    path = store.get_path("hidden_cases/a.txt")
+    assert read_bytes(path) == b"first\n"
+    assert stat.S_IMODE(os.stat(tmp_path / "cache").st_mode) == 0o700
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert store.get_path("hidden_cases/a.txt") == path
+    assert store.stats()["misses"] == 1 and store.stats()["hits"] == 1
+
+    # Overwritten in place: picked up only once the entry is revalidated
+    s3.put_object(Bucket=BUCKET, Key="hidden_cases/a.txt", Body=b"second\n")
+    assert read_bytes(store.get_path("hidden_cases/a.txt")) == b"first\n"
+    store.revalidate_seconds = 0
+    assert read_bytes(store.get_path("hidden_cases/a.txt")) == b"second\n"
+    assert store.stats()["misses"] == 2 and store.stats()["revalidations"] == 1
+
+# Test that the least recently used, unpinned files are evicted to stay under max_bytes
+def test_lru_eviction_skips_pinned_files(tmp_path):
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    for name in "abcd":
+        s3.put_object(Bucket=BUCKET, Key=f"{name}.txt", Body=b"x" * 100)
+    store = HiddenCaseStore(str(tmp_path / "cache"), 250, s3=s3, bucket=BUCKET)
+
+    pinned = store.get_path("a.txt", pin=True)
+    store.get_path("b.txt")
+    store.get_path("c.txt")
+    assert os.path.exists(pinned)
+    assert store.stats()["evictions"] == 1 and store.stats()["bytes"] == 200
+
+    store.release(["a.txt"])
+    store.get_path("d.txt")
+    assert not os.path.exists(pinned)
+    assert store.stats()["bytes"] <= 250
+
+# Test that a restarted store reuses the files already on disk
+def test_cache_survives_restart(tmp_path):
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    s3.put_object(Bucket=BUCKET, Key="a.txt", Body=b"data")
+    HiddenCaseStore(str(tmp_path / "cache"), 1024, s3=s3, bucket=BUCKET).get_path("a.txt")
+
+    store = HiddenCaseStore(str(tmp_path / "cache"), 1024, s3=s3, bucket=BUCKET)
+    store.get_path("a.txt")
+    assert store.stats()["hits"] == 1 and store.stats()["bytes_downloaded"] == 0
+
+# Test that get_paths fetches a challenge's files in parallel from (moto) S3
+@mock_aws
+def test_prefetch_from_s3(tmp_path):
+    s3 = boto3.client("s3", region_name="us-east-1")
+    s3.create_bucket(Bucket=BUCKET)
+    keys = [f"hidden_cases/{i}.txt" for i in range(10)]
+    for i, key in enumerate(keys):
+        s3.put_object(Bucket=BUCKET, Key=key, Body=str(i).encode() * (2 * 1024 ** 2 if i == 0 else 1))
+    store = HiddenCaseStore(str(tmp_path / "cache"), 64 * 1024 ** 2, s3=s3, bucket=BUCKET)
+
+    paths = store.get_paths(keys + keys[:3])
+    assert list(paths) == keys
+    assert read_bytes(paths[keys[0]]) == b"0" * 2 * 1024 ** 2
+    assert read_bytes(paths[keys[5]]) == b"5"
+    assert store.stats()["misses"] == 10
+
+# Test that a failed fetch releases the pins the other fetches of the same call took
+def test_failed_prefetch_releases_pins(tmp_path):
+    s3 = LocalS3Client(str(tmp_path / "s3"))
+    for name in "abc":
+        s3.put_object(Bucket=BUCKET, Key=f"{name}.txt", Body=b"x" * 100)
+    store = HiddenCaseStore(str(tmp_path / "cache"), 1024, s3=s3, bucket=BUCKET)
+
+    with pytest.raises(ClientError):
+        store.get_paths(["a.txt", "missing.txt", "b.txt", "c.txt"], pin=True)
+    assert store._pins == {}